@@ -1,19 +1,28 @@
-import boto3
 import json
-from typing import Optional
+import asyncio
+from typing import AsyncIterator, Optional
 import os
 
+from aws.runtime import call_with_retry, get_runtime_client, run_blocking
+from metrics import GENERATION_TOKENS, TOKENS, span
+
+# Start of the text returned in place of an answer when Bedrock fails
+ERROR_RESPONSE_PREFIX = "I apologize, but I encountered an error while processing your request: "
+
+class GenerationError(RuntimeError):
+    """Bedrock failed while streaming a response, possibly after some text was yielded"""
+
 class BedrockClient:
     def __init__(self, model_id: str = "anthropic.claude-3-sonnet-20240229-v1:0", mock_mode: bool = False):
         self.model_id = model_id
         self.mock_mode = mock_mode
         
+        self.max_retries = int(os.getenv('BEDROCK_MAX_RETRIES', '3'))
+        
         if not mock_mode:
-            # Initialize Bedrock client
-            self.client = boto3.client(
-                service_name='bedrock-runtime',
-                region_name=os.getenv('AWS_REGION', 'us-east-1')
-            )
+            # Shared bedrock-runtime client; blocking calls run on the shared
+            # Bedrock executor so they never stall the event loop
+            self.client = get_runtime_client()
     
     async def generate_response(self, prompt: str, max_tokens: int = 1000) -> str:
         """
@@ -23,7 +32,59 @@ class BedrockClient:
             return self._generate_mock_response(prompt)
         
         try:
-            # Prepare request body for Claude
+            with span("generation"):
+                return await run_blocking(call_with_retry, self._invoke, prompt, max_tokens, max_retries=self.max_retries)
+        
+        except Exception as e:
+            print(f"Error calling Bedrock: {str(e)}")
+            return f"{ERROR_RESPONSE_PREFIX}{str(e)}"
+    
+    def _invoke(self, prompt: str, max_tokens: int) -> str:
+        """
+        Blocking invoke_model call for Claude, raising on any error
+        """
+        # Prepare request body for Claude
+        request_body = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        }
+        
+        # Make API call
+        response = self.client.invoke_model(
+            modelId=self.model_id,
+            body=json.dumps(request_body)
+        )
+        
+        # Parse response
+        response_body = json.loads(response['body'].read())
+        usage = response_body.get('usage', {})
+        self._count_tokens(usage.get('input_tokens'), usage.get('output_tokens'))
+        content = response_body['content'][0]['text']
+        
+        return content.strip()
+    
+    async def generate_response_stream(self, prompt: str, max_tokens: int = 1000) -> AsyncIterator[str]:
+        """
+        Generate a response with invoke_model_with_response_stream, yielding
+        text deltas as soon as Bedrock emits them
+        
+        Raises GenerationError if the call fails, so a partial answer is
+        never mistaken for a complete one.
+        """
+        if self.mock_mode:
+            # Emit the mock answer word by word so clients exercise the stream path
+            for i, word in enumerate(self._generate_mock_response(prompt).split(" ")):
+                yield word if i == 0 else " " + word
+                await asyncio.sleep(0)
+            return
+        
+        try:
             request_body = {
                 "anthropic_version": "bedrock-2023-05-31",
                 "max_tokens": max_tokens,
@@ -35,21 +96,50 @@ class BedrockClient:
                 ]
             }
             
-            # Make API call
-            response = self.client.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(request_body)
-            )
-            
-            # Parse response
-            response_body = json.loads(response['body'].read())
-            content = response_body['content'][0]['text']
-            
-            return content.strip()
-            
+            with span("generation"):
+                response = await run_blocking(
+                    call_with_retry,
+                    self.client.invoke_model_with_response_stream,
+                    max_retries=self.max_retries,
+                    modelId=self.model_id,
+                    body=json.dumps(request_body)
+                )
+                
+                # The event stream is a blocking iterator; pull each event off the event loop
+                events = iter(response['body'])
+                while True:
+                    event = await run_blocking(next, events, None)
+                    if event is None:
+                        break
+                    if 'chunk' not in event:
+                        continue
+                    payload = json.loads(event['chunk']['bytes'])
+                    if payload.get('type') == 'content_block_delta' and payload['delta'].get('type') == 'text_delta':
+                        yield payload['delta']['text']
+                    elif payload.get('type') == 'message_start':
+                        self._count_tokens(input_tokens=payload['message'].get('usage', {}).get('input_tokens'))
+                    elif payload.get('type') == 'message_delta':
+                        self._count_tokens(output_tokens=payload.get('usage', {}).get('output_tokens'))
+        
         except Exception as e:
-            print(f"Error calling Bedrock: {str(e)}")
-            return f"I apologize, but I encountered an error while processing your request: {str(e)}"
+            print(f"Error calling Bedrock stream: {str(e)}")
+            raise GenerationError(str(e)) from e
+    
+    def _count_tokens(self, input_tokens: Optional[int] = None, output_tokens: Optional[int] = None):
+        """Record the token usage Claude reports for one call"""
+        if input_tokens is not None:
+            TOKENS.labels(self.model_id, "input").inc(input_tokens)
+            GENERATION_TOKENS.labels("input").observe(input_tokens)
+        if output_tokens is not None:
+            TOKENS.labels(self.model_id, "output").inc(output_tokens)
+            GENERATION_TOKENS.labels("output").observe(output_tokens)
+    
+    @staticmethod
+    def is_error_response(response: str) -> bool:
+        """
+        Whether a generated response is the apology returned on a Bedrock error
+        """
+        return response.startswith(ERROR_RESPONSE_PREFIX)
     
     def _generate_mock_response(self, prompt: str) -> str:
         """
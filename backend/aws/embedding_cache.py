@@ -0,0 +1,106 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Tuple
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """Content-addressed embedding cache
+    
+    Entries are keyed by a SHA-256 of the model id and the exact embedded
+    text, so the same "key_path: content" string is never sent to Bedrock
+    twice. A bounded in-memory LRU tier sits in front of an optional
+    persistent SQLite tier that survives restarts.
+    """
+    
+    def __init__(self, max_entries: int = 10000, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+            logger.info(f"Embedding cache persisted to {disk_path}")
+    
+    @staticmethod
+    def make_key(model_id: str, text: str) -> bytes:
+        """Cache key for a text embedded by a given model"""
+        return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).digest()
+    
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Return the cached float32 vector for key, or None on a miss"""
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+            
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+            
+            self.misses += 1
+            return None
+    
+    def put(self, key: bytes, vector):
+        """Store a single embedding"""
+        self.put_many([(key, vector)])
+    
+    def put_many(self, items: Iterable[Tuple[bytes, Any]]):
+        """Store several embeddings, writing the disk tier in one transaction"""
+        rows = []
+        with self._lock:
+            for key, vector in items:
+                vector = np.array(vector, dtype=np.float32)
+                vector.setflags(write=False)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes()))
+            if self._db is not None and rows:
+                self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                self._db.commit()
+    
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None
+            }
+    
+    def clear(self):
+        """Drop every cached embedding from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
@@ -1,34 +1,245 @@
-import boto3
+import hashlib
 import json
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from aws.embedding_cache import EmbeddingCache
+from aws.runtime import call_with_retry, get_runtime_client, run_blocking
+from metrics import COALESCED_CALLS, TOKENS, span
+
+logger = logging.getLogger(__name__)
+
+_COALESCED_EMBEDDINGS = COALESCED_CALLS.labels("embedding")
+
+class EmbeddingError(RuntimeError):
+    """Some texts of a batch could not be embedded, even after retries"""
 
 class AWSBedrockEmbeddings:
-    def __init__(self, model_id: str = "amazon.titan-embed-text-v1", mock_mode: bool = False):
+    def __init__(self, model_id: str = "amazon.titan-embed-text-v1", mock_mode: bool = False,
+                 max_workers: Optional[int] = None, max_retries: Optional[int] = None,
+                 cache: Optional[EmbeddingCache] = None):
         self.model_id = model_id
         self.mock_mode = mock_mode
+        self.max_workers = max_workers or int(os.getenv('EMBEDDING_MAX_WORKERS', '8'))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('EMBEDDING_MAX_RETRIES', '5'))
+        
+        # Embedding cache in front of Bedrock; EMBEDDING_CACHE_SIZE=0 disables it
+        cache_size = int(os.getenv('EMBEDDING_CACHE_SIZE', '10000'))
+        if cache is None and cache_size > 0:
+            cache = EmbeddingCache(max_entries=cache_size, disk_path=os.getenv('EMBEDDING_CACHE_PATH') or None)
+        self.cache = cache
+        
+        # Texts being embedded right now, with how many other callers wait for
+        # each; their results are parked in _landed until those callers take them
+        self._inflight: Dict[str, int] = {}
+        self._landed: Dict[str, list] = {}
+        self._flight = threading.Condition()
         
         if not mock_mode:
-            # Initialize Bedrock client for embeddings
-            self.client = boto3.client(
-                service_name='bedrock-runtime',
-                region_name=os.getenv('AWS_REGION', 'us-east-1')
-            )
+            # Shared bedrock-runtime client (one connection pool per process)
+            self.client = get_runtime_client()
     
     def embed_text(self, text: str) -> List[float]:
         """
         Generate embeddings for a single text using AWS Titan
         """
-        if self.mock_mode:
-            return self._generate_mock_embedding(text)
+        key = self._cache_key(text)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached.tolist()
+        return self._embed_uncached(text, key)
+    
+    async def aembed_text(self, text: str) -> List[float]:
+        """
+        Non-blocking embed_text for async callers: cache hits are answered
+        inline, everything else runs on the shared Bedrock executor
+        """
+        key = self._cache_key(text)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached.tolist()
+        return await run_blocking(self._embed_uncached, text, key)
+    
+    def embed_batch(self, texts: List[str], progress_callback: Optional[Callable[[int, int], None]] = None) -> np.ndarray:
+        """
+        Generate embeddings for multiple texts (batch processing)
+        
+        Cached texts are served from the embedding cache and duplicate texts
+        are embedded once. Texts another caller is already embedding (a
+        concurrent upload of the same document, say) are waited for rather
+        than embedded again. The rest are embedded by a pool of at most
+        max_workers threads. Throttled calls are retried with exponential
+        backoff; if any text still fails, EmbeddingError is raised once the
+        rest have finished. Unlike embed_text there is no mock fallback
+        outside mock_mode, since ingested vectors are saved to the index and
+        an unchanged chunk is never embedded again.
+        Returns a (len(texts), dim) float32 matrix in input order.
+        progress_callback, if given, is called as progress_callback(done, total).
+        """
+        total = len(texts)
+        embeddings = np.empty((total, self.get_embedding_dimension()), dtype=np.float32)
+        if total == 0:
+            return embeddings
+        
+        # Serve what we can from the cache; group the remaining rows by text
+        pending: Dict[str, List[int]] = {}
+        keys: Dict[str, bytes] = {}
+        done = 0
+        for i, text in enumerate(texts):
+            if text in pending:
+                pending[text].append(i)
+                continue
+            key = self._cache_key(text)
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                embeddings[i] = cached
+                done += 1
+            else:
+                pending[text] = [i]
+                if key is not None:
+                    keys[text] = key
+        
+        if done and progress_callback:
+            progress_callback(done, total)
+        if not pending:
+            return embeddings
+        
+        owned = self._claim(pending)
+        shared = [text for text in pending if text not in owned]
+        fresh, failed = [], []
+        
+        def store(text: str, embedding: Optional[List[float]]):
+            nonlocal done
+            if embedding is None:
+                failed.append(text)
+                return
+            if text in keys and text in owned:
+                fresh.append((keys[text], embedding))
+            rows = pending[text]
+            embeddings[rows] = embedding
+            done += len(rows)
+            if progress_callback:
+                progress_callback(done, total)
+        
+        try:
+            if self.mock_mode:
+                for text in owned:
+                    embedding = self._generate_mock_embedding(text)
+                    self._land([text], embedding)
+                    owned[text] = True
+                    store(text, embedding)
+            elif owned:
+                with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed") as executor:
+                    futures = {executor.submit(self._embed_with_retry, text): text for text in owned}
+                    for future in as_completed(futures):
+                        text, embedding = futures[future], future.result()
+                        self._land([text], embedding)
+                        owned[text] = True
+                        store(text, embedding)
+        finally:
+            # Never leave a waiter hanging: texts not embedded land as failures
+            unlanded = [text for text, landed in owned.items() if not landed]
+            if unlanded:
+                self._land(unlanded, None)
+        
+        for text in shared:
+            store(text, self._wait(text))
         
+        if fresh:
+            self.cache.put_many(fresh)
+        if failed:
+            raise EmbeddingError(f"Failed to embed {len(failed)} of {len(pending)} distinct texts")
+        return embeddings
+    
+    def _embed_uncached(self, text: str, key: Optional[bytes]) -> List[float]:
+        if not self._claim([text]):
+            embedding = self._wait(text)
+            return embedding if embedding is not None else self._generate_mock_embedding(text)
+        
+        embedding = None
         try:
-            # Prepare request body for Titan embeddings
-            request_body = {
-                "inputText": text
-            }
+            if self.mock_mode:
+                embedding = self._generate_mock_embedding(text)
+            else:
+                try:
+                    embedding = self._invoke(text)
+                
+                except Exception as e:
+                    print(f"Error calling AWS Bedrock for embeddings: {str(e)}")
+                    # Return mock embedding as fallback (never cached)
+                    return self._generate_mock_embedding(text)
             
-            # Make API call
+            if key is not None:
+                self.cache.put(key, embedding)
+            return embedding
+        finally:
+            self._land([text], embedding)
+    
+    def _claim(self, texts) -> Dict[str, bool]:
+        """Register texts as being embedded by this caller
+        
+        Returns the texts nobody else was embedding, which the caller must
+        embed and then _land (mapped to False, for the caller to track which
+        have landed). For the others it must _wait.
+        """
+        owned = {}
+        with self._flight:
+            for text in texts:
+                if text in self._inflight:
+                    self._inflight[text] += 1
+                    _COALESCED_EMBEDDINGS.inc()
+                else:
+                    self._inflight[text] = 0
+                    owned[text] = False
+        return owned
+    
+    def _land(self, texts: List[str], embedding: Optional[List[float]]):
+        """Finish claimed texts, handing embedding (None if it failed) to their waiters"""
+        with self._flight:
+            waiting = False
+            for text in texts:
+                waiters = self._inflight.pop(text)
+                if waiters:
+                    landed = self._landed.setdefault(text, [embedding, 0])
+                    landed[0] = embedding
+                    landed[1] += waiters
+                    waiting = True
+            if waiting:
+                self._flight.notify_all()
+    
+    def _wait(self, text: str) -> Optional[List[float]]:
+        """Embedding of a text claimed by another caller, once it lands"""
+        with self._flight:
+            self._flight.wait_for(lambda: text in self._landed)
+            landed = self._landed[text]
+            landed[1] -= 1
+            if landed[1] == 0:
+                del self._landed[text]
+            return landed[0]
+    
+    def _cache_key(self, text: str) -> Optional[bytes]:
+        if self.cache is None:
+            return None
+        return EmbeddingCache.make_key(self.model_id, text)
+    
+    def _invoke(self, text: str) -> List[float]:
+        """
+        Call Titan for a single text, raising on any error
+        """
+        # Prepare request body for Titan embeddings
+        request_body = {
+            "inputText": text
+        }
+        
+        # Make API call
+        with span("embedding"):
             response = self.client.invoke_model(
                 modelId=self.model_id,
                 body=json.dumps(request_body)
@@ -36,49 +247,40 @@ class AWSBedrockEmbeddings:
             
             # Parse response
             response_body = json.loads(response['body'].read())
-            embedding = response_body['embedding']
-            
-            return embedding
-            
-        except Exception as e:
-            print(f"Error calling AWS Bedrock for embeddings: {str(e)}")
-            # Return mock embedding as fallback
-            return self._generate_mock_embedding(text)
+        TOKENS.labels(self.model_id, "input").inc(response_body.get('inputTextTokenCount', 0))
+        return response_body['embedding']
     
-    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+    def _embed_with_retry(self, text: str) -> Optional[List[float]]:
         """
-        Generate embeddings for multiple texts (batch processing)
+        Call Titan, backing off exponentially on throttling
+        
+        Returns None once the call has failed for good.
         """
-        embeddings = []
-        for text in texts:
-            embedding = self.embed_text(text)
-            embeddings.append(embedding)
-        return embeddings
+        try:
+            return call_with_retry(self._invoke, text, max_retries=self.max_retries)
+        except Exception as e:
+            print(f"Error calling AWS Bedrock for embeddings: {str(e)}")
+            return None
     
     def _generate_mock_embedding(self, text: str) -> List[float]:
         """
         Generate mock embeddings for testing without AWS
-        Returns a 1536-dimensional vector (same as Titan)
+        Returns a 1536-dimensional unit vector (same as Titan), drawn with
+        numpy so mock-mode indexing and benchmarks are not dominated by it
         """
-        import hashlib
-        import random
-        
         # Use text hash as seed for consistent mock embeddings
-        text_hash = hashlib.md5(text.encode()).hexdigest()
-        seed = int(text_hash[:8], 16)
-        random.seed(seed)
-        
-        # Generate 1536-dimensional mock embedding
-        embedding = [random.uniform(-1, 1) for _ in range(1536)]
-        
-        # Normalize the embedding
-        magnitude = sum(x * x for x in embedding) ** 0.5
-        normalized_embedding = [x / magnitude for x in embedding]
-        
-        return normalized_embedding
+        seed = int.from_bytes(hashlib.md5(text.encode()).digest()[:8], "little")
+        embedding = np.random.default_rng(seed).uniform(-1.0, 1.0, self.get_embedding_dimension())
+        return (embedding / np.linalg.norm(embedding)).tolist()
+    
+    def get_cache_stats(self) -> Optional[Dict]:
+        """
+        Hit/miss counters of the embedding cache, or None when caching is off
+        """
+        return self.cache.get_stats() if self.cache is not None else None
     
     def get_embedding_dimension(self) -> int:
         """
         Get the dimension of the embedding vectors
         """
-        return 1536  # Titan embedding dimension 
\ No newline at end of file
+        return 1536  # Titan embedding dimension
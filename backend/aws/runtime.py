@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Bedrock error codes that mean "slow down and try again"
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+_lock = threading.Lock()
+_client = None
+_executor = None
+
+def get_max_concurrency() -> int:
+    """Maximum number of Bedrock calls in flight from request handlers"""
+    return int(os.getenv('BEDROCK_MAX_CONCURRENCY', '32'))
+
+def get_runtime_client():
+    """Process-wide bedrock-runtime client
+    
+    boto3 clients are thread-safe, so every component shares one client and
+    with it one HTTP connection pool, sized for the request executor plus
+    the ingestion workers of embed_batch. Retries are done by
+    call_with_retry, so botocore is told not to retry on its own.
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            pool_size = get_max_concurrency() + int(os.getenv('EMBEDDING_MAX_WORKERS', '8'))
+            _client = boto3.client(
+                service_name='bedrock-runtime',
+                region_name=os.getenv('AWS_REGION', 'us-east-1'),
+                endpoint_url=os.getenv('BEDROCK_ENDPOINT_URL') or None,
+                config=Config(
+                    max_pool_connections=pool_size,
+                    retries={"max_attempts": 1, "mode": "standard"}
+                )
+            )
+        return _client
+
+def get_executor() -> ThreadPoolExecutor:
+    """Dedicated executor for blocking Bedrock calls made from async code
+    
+    Its size is the concurrency limit: extra calls queue here instead of
+    stalling the event loop or exhausting the default executor.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_max_concurrency(), thread_name_prefix="bedrock")
+        return _executor
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking call on the Bedrock executor without blocking the event loop
+    
+    The call runs in a copy of the caller's context, so spans it records
+    land in the caller's request trace.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed Bedrock call is worth retrying after a backoff"""
+    if isinstance(error, (EndpointConnectionError, ReadTimeoutError)):
+        return True
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES
+
+def call_with_retry(func: Callable, *args, max_retries: int = 5, **kwargs) -> Any:
+    """Call func, backing off exponentially (with full jitter) on throttling"""
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e) or attempt >= max_retries:
+                raise
+            delay = random.uniform(0, min(20.0, 0.25 * (2 ** attempt)))
+            logger.warning(f"Bedrock call throttled ({e}), retry {attempt + 1}/{max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
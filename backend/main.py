@@ -1,30 +1,33 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+from contextlib import nullcontext
 import json
 import os
+import shutil
+import tempfile
 import logging
 from dotenv import load_dotenv
 
 from rag.document_processor import DocumentProcessor
-from rag.vector_store import VectorStore
-from rag.retrieval import RAGPipeline
+from rag.collection_manager import Collection, CollectionManager, CollectionNotFoundError, DEFAULT_COLLECTION
+from rag.indexing_jobs import IndexingJob, JobManager
+from rag.response_cache import normalize_query
+from rag.session_store import ChatSession, SessionNotFoundError, SessionStore, with_conversation
+from rag.single_flight import SingleFlight
 from aws.bedrock_client import BedrockClient
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('chatbot.log')
-    ]
-)
-logger = logging.getLogger(__name__)
+from logging_config import configure_logging, sample_request
+import metrics
 
 load_dotenv()
 
+# LOG_MODE=production logs through a background thread and samples request logs
+configure_logging()
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Chatbot", version="1.0.0")
 
 # CORS middleware
@@ -39,109 +42,470 @@ app.add_middleware(
 # Initialize components
 logger.info("Initializing chatbot components...")
 document_processor = DocumentProcessor()
-vector_store = VectorStore(mock_mode=False)  # Use AWS Titan embeddings
-bedrock_client = BedrockClient(mock_mode=False)  # Use real AWS Bedrock
-rag_pipeline = RAGPipeline(vector_store, bedrock_client)
+# MOCK_MODE=true serves hash-seeded mock embeddings and keyword-matched answers without AWS
+MOCK_MODE = os.getenv('MOCK_MODE', 'false').lower() in ("1", "true", "yes")
+bedrock_client = BedrockClient(mock_mode=MOCK_MODE)  # Real AWS Bedrock unless MOCK_MODE
+
+# Named knowledge bases, each persisted to its own index directory and loaded on
+# first use (AWS Titan embeddings). The unnamed endpoints serve the default
+# collection, which reuses the single-tenant index at INDEX_PATH.
+INDEX_PATH = os.getenv('INDEX_PATH', 'vector_index')
+collections = CollectionManager(
+    root=os.getenv('COLLECTIONS_PATH', 'collections'),
+    bedrock_client=bedrock_client,
+    default_path=INDEX_PATH,
+    memory_budget=int(float(os.getenv('COLLECTION_MEMORY_BUDGET_MB', '1024')) * 1024 * 1024),
+    max_loaded=int(os.getenv('MAX_LOADED_COLLECTIONS', '256')),
+    # Every collection has its own response cache, so the per-collection default is small
+    response_cache_size=int(os.getenv('RESPONSE_CACHE_SIZE', '100')),
+    refresh_interval=float(os.getenv('INDEX_REFRESH_SECONDS', '1.0')),
+    mock_mode=MOCK_MODE
+)
+# Uploads are indexed by background jobs; INDEXING_MAX_JOBS of them run at once. Job
+# records and the per-collection job lock live in the collection directories, so
+# they are shared by every worker process
+jobs = JobManager(
+    max_concurrent=int(os.getenv('INDEXING_MAX_JOBS', '2')),
+    directory=collections.path,
+    collections=collections.directory_names
+)
+# Multi-turn chat sessions: the last SESSION_RECENT_TURNS turns verbatim, older ones
+# rolled into a summary of at most SESSION_SUMMARY_TOKENS tokens. Stored in SQLite at
+# SESSION_DB_PATH so every worker process serves them; empty keeps them in process memory
+sessions = SessionStore(
+    bedrock_client=bedrock_client,
+    max_sessions=int(os.getenv('MAX_SESSIONS', '10000')),
+    idle_seconds=float(os.getenv('SESSION_IDLE_SECONDS', '1800')),
+    recent_turns=int(os.getenv('SESSION_RECENT_TURNS', '4')),
+    summary_tokens=int(os.getenv('SESSION_SUMMARY_TOKENS', '300')),
+    db_path=os.getenv('SESSION_DB_PATH', os.path.join(collections.root, 'sessions.db'))
+)
+# Identical stateless /chat requests in flight at once share one answer
+CHAT_COALESCING = os.getenv('CHAT_COALESCING', 'true').lower() in ("1", "true", "yes")
+chat_flights = SingleFlight("chat")
+# Index sizes and cache hit rates are read from the collections when /metrics is scraped
+metrics.REGISTRY.add_collector(collections.collect_metrics)
+metrics.REGISTRY.add_collector(sessions.collect_metrics)
 logger.info("Chatbot components initialized successfully")
 
+def _log_progress(label: str, every_percent: int = 10, every_chunks: int = 10000):
+    """Build a (done, total) progress callback that logs every few percent
+    
+    When the total is not known up front (total is None), it logs every
+    every_chunks chunks instead.
+    """
+    state = {"next": 0}
+    
+    def callback(done: int, total: Optional[int]):
+        if total is None:
+            if done >= state["next"]:
+                logger.info(f"{label} progress: {done} chunks")
+                state["next"] = done + every_chunks
+            return
+        percent = done * 100 // total
+        if percent >= state["next"] or done == total:
+            logger.info(f"{label} progress: {done}/{total} chunks ({percent}%)")
+            state["next"] = percent + every_percent
+    
+    return callback
+
+def _job_progress(job: IndexingJob):
+    """Progress callback that updates a job and logs like _log_progress"""
+    log = _log_progress(f"Job {job.id[:8]} embedding")
+    
+    def callback(done: int, total: Optional[int]):
+        job.progress(done, total)
+        log(done, total)
+    
+    return callback
+
+def _spool_upload(upload) -> tuple:
+    """Copy an upload to a temporary file that outlives the request; returns (path, size)"""
+    with tempfile.NamedTemporaryFile(prefix="upload-", suffix=".json", delete=False) as spool:
+        shutil.copyfileobj(upload, spool, 1 << 20)
+        return spool.name, spool.tell()
+
 class ChatRequest(BaseModel):
     message: str
     use_rag: bool = True
+    # From POST /sessions; the turn then sees the conversation so far
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
     sources: List[dict]
     confidence: float
     processing_time: float
+    session_id: Optional[str] = None
+    # Milliseconds spent per stage (retrieval, query_embedding, generation, ...)
+    timings: Optional[Dict[str, float]] = None
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    logger.info("Health check requested")
+    logger.debug("Health check requested")
     return {"status": "healthy", "message": "Chatbot API is running"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics of this process: stage latency histograms, token counts, cache hit rates and index sizes"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+async def _acquire(name: str, create: bool = False):
+    """Collection for one request (pair with collections.release); 400 for a bad name, 404 for an unknown one"""
+    try:
+        return await collections.acquire(name, create=create)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CollectionNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Collection '{name}' not found")
+    except Exception as e:
+        logger.error(f"Error loading collection '{name}': {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error loading collection: {str(e)}")
+
 @app.post("/upload-knowledge-base")
 async def upload_knowledge_base(file: UploadFile = File(...)):
-    """Upload and process JSON knowledge base"""
-    logger.info(f"Knowledge base upload started: {file.filename}")
+    """Upload a JSON knowledge base; it is indexed by a background job (see /jobs/{job_id})"""
+    return await _upload(DEFAULT_COLLECTION, file)
+
+@app.post("/collections/{name}/upload")
+async def upload_collection(name: str, file: UploadFile = File(...)):
+    """Upload a JSON knowledge base into a named collection, replacing its contents"""
+    return await _upload(name, file)
+
+async def _upload(name: str, file: UploadFile):
+    logger.info(f"Knowledge base upload started: {file.filename} (collection '{name}')")
     try:
-        # Read file content
-        content = await file.read()
-        json_data = json.loads(content.decode('utf-8'))
-        logger.info(f"JSON file loaded successfully, size: {len(content)} bytes")
-        
-        # Process JSON into chunks
-        logger.info("Processing JSON into chunks...")
-        chunks = document_processor.process_json(json_data)
-        logger.info(f"JSON processed into {len(chunks)} chunks")
-        
-        # Log each chunk being indexed
-        for i, chunk in enumerate(chunks):
-            logger.info(f"Indexing chunk {i+1}/{len(chunks)}: {chunk['key_path']} - Content: {chunk['content'][:100]}{'...' if len(chunk['content']) > 100 else ''}")
-        
-        # Add to vector store
-        logger.info("Adding chunks to vector store...")
-        vector_store.add_documents(chunks)
-        logger.info(f"Successfully indexed {len(chunks)} chunks in vector store")
-        
-        return {
-            "message": f"Knowledge base uploaded successfully",
-            "chunks_processed": len(chunks),
-            "status": "success"
-        }
-        
-    except Exception as e:
-        logger.error(f"Error processing file: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+        collections.path(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    upload_path, size = await run_in_threadpool(_spool_upload, file.file)
+    
+    async def run(job: IndexingJob):
+        try:
+            # Built off to the side: queries keep using the current index until install()
+            collection = collections.new_collection(name)
+            with open(upload_path, "rb") as upload:
+                # Parse the upload incrementally and feed leaf chunks straight into
+                # batched embedding; the JSON tree and chunk list are never built
+                chunks_processed = await run_in_threadpool(
+                    collection.vector_store.add_documents_stream,
+                    document_processor.iter_json_chunks(job.track(upload)),
+                    progress_callback=_job_progress(job)
+                )
+            logger.info(f"Successfully indexed {chunks_processed} chunks in vector store")
+            await run_in_threadpool(collection.vector_store.prepare)
+            await run_in_threadpool(collections.save, collection)
+            collections.install(collection)
+            return {"chunks_processed": chunks_processed}
+        finally:
+            os.remove(upload_path)
+    
+    job = jobs.submit(name, "upload", run, bytes_total=size)
+    return JSONResponse(status_code=202, content={
+        "message": "Knowledge base upload accepted; indexing in the background",
+        "collection": name,
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "status": job.state
+    })
+
+@app.patch("/update-knowledge-base")
+async def update_knowledge_base(file: UploadFile = File(...)):
+    """Apply a new version of the JSON knowledge base incrementally
+    
+    Only leaves whose key path is new or whose value changed are embedded;
+    leaves missing from the new file are removed. Runs as a background job.
+    """
+    return await _update(DEFAULT_COLLECTION, file)
+
+@app.patch("/collections/{name}/update")
+async def update_collection(name: str, file: UploadFile = File(...)):
+    """Apply a new version of a named collection's knowledge base incrementally"""
+    return await _update(name, file)
+
+async def _update(name: str, file: UploadFile):
+    logger.info(f"Incremental knowledge base update started: {file.filename} (collection '{name}')")
+    try:
+        collections.path(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    upload_path, size = await run_in_threadpool(_spool_upload, file.file)
+    
+    async def run(job: IndexingJob):
+        try:
+            def parse():
+                with open(upload_path, "rb") as upload:
+                    return list(document_processor.iter_json_chunks(job.track(upload)))
+            chunks = await run_in_threadpool(parse)
+            logger.info(f"JSON processed into {len(chunks)} chunks")
+            
+            # Applied to a private copy of the published index, then swapped in
+            collection = await run_in_threadpool(collections.load_copy, name)
+            summary = await run_in_threadpool(collection.vector_store.update_documents, chunks, _job_progress(job))
+            await run_in_threadpool(collection.vector_store.prepare)
+            await run_in_threadpool(collections.save, collection)
+            collections.install(collection)
+            return {"chunks_processed": len(chunks), **summary}
+        finally:
+            os.remove(upload_path)
+    
+    job = jobs.submit(name, "update", run, bytes_total=size)
+    return JSONResponse(status_code=202, content={
+        "message": "Knowledge base update accepted; indexing in the background",
+        "collection": name,
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "status": job.state
+    })
 
 @app.get("/knowledge-base-status")
 async def get_knowledge_base_status():
     """Get current knowledge base status"""
     logger.info("Knowledge base status requested")
-    status = vector_store.get_status()
+    collection = await _acquire(DEFAULT_COLLECTION, create=True)
+    try:
+        status = collection.get_status()
+    finally:
+        collections.release(collection)
     logger.info(f"Knowledge base status: {status}")
     return status
 
+@app.get("/jobs")
+async def list_jobs(collection: Optional[str] = None):
+    """Recent indexing jobs, newest first, optionally for one collection"""
+    try:
+        return {"jobs": await run_in_threadpool(jobs.list_jobs, collection)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """State, progress, chunks/sec and ETA of an indexing job"""
+    status = await run_in_threadpool(jobs.get_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return status
+
+@app.get("/collections")
+async def list_collections():
+    """List collections with their load state, plus loaded-memory statistics"""
+    return {"collections": collections.list_collections(), "stats": collections.get_stats()}
+
+@app.get("/collections/{name}/status")
+async def get_collection_status(name: str):
+    """Get the status of a named collection (loading it if needed)"""
+    collection = await _acquire(name)
+    try:
+        return collection.get_status()
+    finally:
+        collections.release(collection)
+
+@app.delete("/collections/{name}")
+async def delete_collection(name: str):
+    """Unload a collection and delete its index from disk"""
+    try:
+        deleted = await collections.delete(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Collection '{name}' not found")
+    return {"message": f"Collection '{name}' deleted", "status": "success"}
+
+@app.post("/sessions")
+async def create_session():
+    """Start a chat session; pass its session_id with each message of the conversation"""
+    return sessions.create().get_status()
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """Summary and recent turns of a chat session"""
+    return _session(session_id).get_status()
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """End a chat session and forget its history"""
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+    return {"message": f"Session '{session_id}' deleted", "status": "success"}
+
+def _session(session_id: Optional[str]) -> Optional[ChatSession]:
+    """Live session for a request (None without an ID); 404 if it was never created or has expired"""
+    if session_id is None:
+        return None
+    try:
+        return sessions.get(session_id)
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found or expired")
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Process chat message with optional RAG"""
-    logger.info(f"Chat request received: '{request.message[:50]}{'...' if len(request.message) > 50 else ''}' (RAG: {request.use_rag})")
+    return await _chat(DEFAULT_COLLECTION, request, create=True)
+
+@app.post("/collections/{name}/chat", response_model=ChatResponse)
+async def chat_collection(name: str, request: ChatRequest):
+    """Process chat message against a named collection"""
+    return await _chat(name, request)
+
+async def _chat(name: str, request: ChatRequest, create: bool = False) -> ChatResponse:
+    sample_request()
+    logger.info("Chat request received: %r (RAG: %s, collection '%s')", request.message[:50], request.use_rag, name)
+    session = _session(request.session_id)
+    collection = await _acquire(name, create=create)
     try:
         import time
         start_time = time.time()
         
-        if request.use_rag:
-            # Use RAG pipeline
-            logger.info("Processing query with RAG pipeline...")
-            response, sources, confidence = await rag_pipeline.process_query(request.message)
-            logger.info(f"RAG processing complete. Retrieved {len(sources)} sources, confidence: {confidence:.3f}")
-            
-            # Log retrieved chunks
-            for i, source in enumerate(sources):
-                logger.info(f"Retrieved source {i+1}/{len(sources)}: {source['key_path']} - Content: {source['content'][:100]}{'...' if len(source['content']) > 100 else ''}")
-        else:
-            # Direct Bedrock call
-            logger.info("Processing query with direct Bedrock call...")
-            response = await bedrock_client.generate_response(request.message)
-            sources = []
-            confidence = 1.0
-            logger.info("Direct Bedrock call complete")
+        with metrics.trace("chat") as trace:
+            # Turns of one session run one at a time, each seeing the previous answer
+            async with session.lock if session is not None else nullcontext():
+                if session is None and CHAT_COALESCING:
+                    # Keyed on the collection object and its index version, so a
+                    # swapped-in or updated index never shares an older answer
+                    key = (collection, collection.vector_store.version, request.use_rag, normalize_query(request.message))
+                    response, sources, confidence = await chat_flights.run(key, lambda: _shared_answer(collection, request))
+                else:
+                    response, sources, confidence = await _answer(collection, request, session)
+                
+                # Log retrieved chunks
+                if logger.isEnabledFor(logging.DEBUG):
+                    for i, source in enumerate(sources):
+                        logger.debug("Retrieved source %d/%d: %s - Content: %r", i + 1, len(sources), source['key_path'], source['content'][:100])
+                
+                if session is not None and not bedrock_client.is_error_response(response):
+                    sessions.record_turn(session, request.message, response)
         
         processing_time = time.time() - start_time
-        logger.info(f"Chat processing completed in {processing_time:.3f} seconds")
+        logger.info("Chat processing completed in %.3f seconds", processing_time)
+        # The trace is only serialized if the record is written
+        logger.info("Request trace: %s", trace)
         
         return ChatResponse(
             response=response,
             sources=sources,
             confidence=confidence,
-            processing_time=processing_time
+            processing_time=processing_time,
+            session_id=request.session_id,
+            timings=trace.timings()
         )
     
     except Exception as e:
         logger.error(f"Error processing chat: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
+    finally:
+        collections.release(collection)
+
+async def _answer(collection: Collection, request: ChatRequest, session: Optional[ChatSession]) -> Tuple[str, List[dict], float]:
+    """(response, sources, confidence) for one message, as the next turn of session if given"""
+    if request.use_rag:
+        # Use RAG pipeline
+        return await collection.rag_pipeline.process_query(request.message, session)
+    
+    # Direct Bedrock call
+    logger.debug("Processing query with direct Bedrock call...")
+    conversation = session.conversation() if session is not None else ""
+    response = await bedrock_client.generate_response(with_conversation(request.message, conversation))
+    return response, [], 1.0
+
+def _shared_answer(collection: Collection, request: ChatRequest):
+    """_answer for a coalesced task, which holds its own pin on the collection
+    
+    The task outlives the request that started it if that client
+    disconnects, so it must not rely on the request's pin. The pin is
+    taken here, while that request still holds the collection, and
+    released when the task finishes.
+    """
+    collections.pin(collection)
+    
+    async def answer():
+        try:
+            return await _answer(collection, request, None)
+        finally:
+            collections.release(collection)
+    
+    return answer()
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Process chat message with optional RAG, streaming the answer as server-sent events
+    
+    Emits a "sources" event first, then "token" events as Bedrock generates
+    text, and a final "done" event with timings (or an "error" event).
+    """
+    return await _chat_stream(DEFAULT_COLLECTION, request, create=True)
+
+@app.post("/collections/{name}/chat/stream")
+async def chat_stream_collection(name: str, request: ChatRequest):
+    """Stream a chat answer against a named collection as server-sent events"""
+    return await _chat_stream(name, request)
+
+async def _chat_stream(name: str, request: ChatRequest, create: bool = False) -> StreamingResponse:
+    sample_request()
+    logger.info("Streaming chat request received: %r (RAG: %s, collection '%s')", request.message[:50], request.use_rag, name)
+    # Resolved before the response starts so an unknown session or collection
+    # is a 404; the collection is released when the stream ends
+    session = _session(request.session_id)
+    collection = await _acquire(name, create=create)
+    
+    async def event_stream():
+        import time
+        start_time = time.time()
+        first_token_time = None
+        try:
+            with metrics.trace("chat_stream") as trace:
+                async with session.lock if session is not None else nullcontext():
+                    if request.use_rag:
+                        events = collection.rag_pipeline.process_query_stream(request.message, session)
+                    else:
+                        conversation = session.conversation() if session is not None else ""
+                        events = _direct_stream(with_conversation(request.message, conversation))
+                    
+                    parts = []
+                    async for event in events:
+                        if event["type"] == "token":
+                            parts.append(event["text"])
+                            if first_token_time is None:
+                                first_token_time = time.time() - start_time
+                                metrics.TIME_TO_FIRST_TOKEN.labels().observe(first_token_time)
+                                logger.info("Time to first token: %.3f seconds", first_token_time)
+                        yield f"data: {json.dumps(event)}\n\n"
+                    
+                    # A failed generation raises before this, so only complete answers are recorded
+                    if session is not None:
+                        sessions.record_turn(session, request.message, "".join(parts))
+            
+            processing_time = time.time() - start_time
+            logger.info("Streaming chat completed in %.3f seconds", processing_time)
+            logger.info("Request trace: %s", trace)
+            yield f"data: {json.dumps({'type': 'done', 'processing_time': processing_time, 'time_to_first_token': first_token_time, 'timings': trace.timings()})}\n\n"
+        
+        except Exception as e:
+            logger.error(f"Error streaming chat: {str(e)}", exc_info=True)
+            yield f"data: {json.dumps({'type': 'error', 'detail': f'Error processing chat: {str(e)}'})}\n\n"
+        finally:
+            collections.release(collection)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _direct_stream(message: str):
+    """Event stream for a direct Bedrock call without retrieval"""
+    yield {"type": "sources", "sources": [], "confidence": 1.0}
+    async for text in bedrock_client.generate_response_stream(message):
+        yield {"type": "token", "text": text}
 
 if __name__ == "__main__":
     import uvicorn
-    logger.info("Starting FastAPI server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # WEB_CONCURRENCY > 1 runs that many worker processes. Indexes are published
+    # to disk and memory-mapped read-only, so workers share one copy and re-attach
+    # to a new version within INDEX_REFRESH_SECONDS of an upload to any of them.
+    workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+    logger.info(f"Starting FastAPI server with {workers} worker(s)...")
+    if workers > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
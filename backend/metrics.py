@@ -0,0 +1,250 @@
+import abc
+import bisect
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from an in-memory lookup to a long generation
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Token-count buckets, from a one-line lookup to a long document
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+# A collector returns (name, type, help, [(labels, value), ...]) families at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        i = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+class _Metric(abc.ABC):
+    """Base of labelled metrics: one child per combination of label values
+    
+    Bind the children used on hot paths once (labels(...)) so recording a
+    value is a lock and an addition.
+    """
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+    
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+    
+    @abc.abstractmethod
+    def _new_child(self):
+        """Fresh child for a new combination of label values"""
+    
+    @abc.abstractmethod
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        """Exposition lines of one child"""
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+    
+    def _new_child(self):
+        return _CounterChild()
+    
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child._value)}"]
+
+class Histogram(_Metric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def _render_child(self, values, child) -> List[str]:
+        with child._lock:
+            counts, total = list(child._counts), child._sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    """Metrics of this process, rendered in the Prometheus text format
+    
+    Counters and histograms are updated as work happens; state that already
+    lives elsewhere (cache counters, index sizes) is read by collectors at
+    scrape time instead of being mirrored on every request.
+    """
+    
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+    
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+    
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+    
+    def _register(self, metric: _Metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def add_collector(self, collector: Callable[[], Iterable[Family]]):
+        self._collectors.append(collector)
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "chatbot_stage_duration_seconds", "Latency of each request stage", ["stage"])
+STAGE_ERRORS = REGISTRY.counter(
+    "chatbot_stage_errors_total", "Stages that ended with an exception", ["stage"])
+TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "chatbot_time_to_first_token_seconds", "Time from a streaming request to its first generated token")
+TOKENS = REGISTRY.counter(
+    "chatbot_tokens_total", "Tokens reported by Bedrock", ["model", "direction"])
+GENERATION_TOKENS = REGISTRY.histogram(
+    "chatbot_generation_tokens", "Tokens per generation call as reported by Bedrock", ["direction"], TOKEN_BUCKETS)
+CONTEXT_TOKENS = REGISTRY.histogram(
+    "chatbot_context_tokens", "Estimated tokens of the packed prompt context", buckets=TOKEN_BUCKETS)
+CONVERSATION_TOKENS = REGISTRY.histogram(
+    "chatbot_conversation_tokens", "Estimated tokens of session history added to a prompt", buckets=TOKEN_BUCKETS)
+SESSION_EMBEDDING_REUSES = REGISTRY.counter(
+    "chatbot_session_embedding_reuses_total", "Session queries whose embedding was reused from an earlier turn")
+COALESCED_CALLS = REGISTRY.counter(
+    "chatbot_coalesced_calls_total", "Calls that waited on an identical one already in flight instead of their own", ["kind"])
+
+class Trace:
+    """Spans recorded while serving one request
+    
+    Each span is (stage, start offset, duration) in seconds relative to the
+    start of the request; stages nest in time but are recorded flat.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+    
+    def timings(self) -> Dict[str, float]:
+        """Total milliseconds per stage"""
+        totals: Dict[str, float] = {}
+        for stage, _, duration in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + duration * 1000.0
+        return {stage: round(ms, 3) for stage, ms in totals.items()}
+    
+    def __str__(self) -> str:
+        return json.dumps(self.to_dict())
+    
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "trace": self.name,
+            "spans": [{"stage": stage, "start_ms": round(offset * 1000.0, 3), "duration_ms": round(duration * 1000.0, 3)}
+                      for stage, offset, duration in self.spans]
+        }
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def trace(name: str) -> Iterator[Trace]:
+    """Collect the spans of one request; the request itself is the span `name`"""
+    current = Trace(name)
+    token = _current_trace.set(current)
+    try:
+        with span(name):
+            yield current
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # An async generator closed from another context (client disconnect)
+            pass
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block into the stage histogram and, within a trace, into the trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(duration)
+        current = _current_trace.get()
+        if current is not None:
+            current.spans.append((stage, start - current.start, duration))
@@ -0,0 +1,292 @@
+from typing import List, Dict, Any, Optional, Tuple
+import os
+import threading
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per matrix product when assigning vectors to lists
+ASSIGN_BLOCK_ROWS = 65536
+# Rows upcast per block when scoring a reduced-precision matrix; small enough
+# for the float32 block to stay in cache between the copy and the product
+SCORE_BLOCK_ROWS = 256
+# Rows scored per matrix-matrix product when searching a batch of queries
+BATCH_BLOCK_ROWS = 2048
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first (partial selection)"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+def score(embeddings: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Dot product of every row with a float32 query
+    
+    float16 and int8 matrices are upcast a block at a time into one reused
+    buffer (BLAS has no half precision or integer products), so no float32
+    copy of the whole matrix is ever made.
+    """
+    if embeddings.dtype == np.float32:
+        return embeddings @ query
+    query = np.asarray(query, dtype=np.float32)
+    scores = np.empty(len(embeddings), dtype=np.float32)
+    buffer = np.empty((SCORE_BLOCK_ROWS, embeddings.shape[1]), dtype=np.float32)
+    for start in range(0, len(embeddings), SCORE_BLOCK_ROWS):
+        rows = embeddings[start:start + SCORE_BLOCK_ROWS]
+        block = buffer[:len(rows)]
+        block[...] = rows
+        np.dot(block, query, out=scores[start:start + len(rows)])
+    return scores
+
+def top_k_batch(embeddings: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact top k of every query in a (b, dim) batch: (rows, scores), each (b, k), best first
+    
+    One matrix-matrix product per block of rows streams the matrix once for
+    the whole batch instead of once per query; only each block's k best
+    candidates per query are kept, so memory stays O(b * k) beyond the block.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    n = len(embeddings)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+    buffer = None if embeddings.dtype == np.float32 else np.empty((BATCH_BLOCK_ROWS, embeddings.shape[1]), dtype=np.float32)
+    candidate_rows, candidate_scores = [], []
+    for start in range(0, n, BATCH_BLOCK_ROWS):
+        block = embeddings[start:start + BATCH_BLOCK_ROWS]
+        if buffer is not None:
+            buffer[:len(block)] = block
+            block = buffer[:len(block)]
+        scores = queries @ block.T
+        kept = min(k, scores.shape[1])
+        top = np.argpartition(-scores, kept - 1, axis=1)[:, :kept]
+        candidate_rows.append(top + start)
+        candidate_scores.append(np.take_along_axis(scores, top, axis=1))
+    rows = np.concatenate(candidate_rows, axis=1)
+    scores = np.concatenate(candidate_scores, axis=1)
+    best = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(rows, best, axis=1), np.take_along_axis(scores, best, axis=1)
+
+class FlatIndex:
+    """Exact search: one matrix-vector product over every row
+    
+    Also defines the hooks VectorStore calls to keep an index in step with
+    its rows; the exact index needs none of them.
+    """
+    
+    name = "flat"
+    
+    def invalidate(self):
+        """Forget everything; the next search rebuilds from scratch"""
+    
+    def update(self, embeddings: np.ndarray, rows: np.ndarray):
+        """Rows of embeddings were added or overwritten"""
+    
+    def move(self, src: int, dst: int):
+        """Row src was moved to row dst"""
+    
+    def truncate(self, size: int):
+        """Rows from size onwards were dropped"""
+    
+    def prepare(self, embeddings: np.ndarray):
+        """Build now what the first search would otherwise build lazily"""
+    
+    def search(self, embeddings: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (rows, similarities) of the k best rows for a normalized query"""
+        scores = score(embeddings, query)
+        rows = top_k(scores, k)
+        return rows, scores[rows]
+    
+    def search_batch(self, embeddings: np.ndarray, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """search() for each row of a (b, dim) query batch, with one pass over the matrix"""
+        rows, scores = top_k_batch(embeddings, queries, k)
+        return list(zip(rows, scores))
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {"type": self.name}
+
+class IVFIndex(FlatIndex):
+    """Inverted-file index with a spherical k-means coarse quantizer
+    
+    Rows are assigned to the nearest of n_lists centroids. A query scores
+    the centroids, then only the rows of its n_probe best lists, so the
+    cost per query is roughly n_probe / n_lists of a full scan. Raising
+    n_probe trades speed for recall.
+    
+    The quantizer is trained lazily on the first search, on a sample of at
+    most train_size rows. Incremental updates are assigned to the existing
+    centroids; the index retrains once the store has grown retrain_growth
+    times past its training size. Below min_rows rows it searches exactly.
+    
+    Training and list building run under a lock on locals, and the list
+    arrays are set last: of several first searches on executor threads,
+    one builds and the others wait, and none sees a half-trained index.
+    """
+    
+    name = "ivf"
+    
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8, train_size: int = 100000,
+                 iterations: int = 10, min_rows: int = 10000, retrain_growth: float = 4.0, seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_size = train_size
+        self.iterations = iterations
+        self.min_rows = min_rows
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+        self._build_lock = threading.Lock()
+        self.invalidate()
+    
+    def invalidate(self):
+        self._list_rows = None
+        self._list_offsets = None
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int16)
+        self._trained_rows = 0
+        self._size = 0
+    
+    def update(self, embeddings: np.ndarray, rows: np.ndarray):
+        if self.centroids is None:
+            return
+        size = max(self._size, int(rows.max()) + 1) if len(rows) else self._size
+        if size > self.retrain_growth * self._trained_rows:
+            self.invalidate()
+            return
+        if size > len(self.assignments):
+            grown = np.empty(max(size, len(self.assignments) * 3 // 2), dtype=self.assignments.dtype)
+            grown[:self._size] = self.assignments[:self._size]
+            self.assignments = grown
+        self._size = size
+        self.assignments[rows] = self._assign(embeddings[rows])
+        self._list_rows = None
+    
+    def move(self, src: int, dst: int):
+        if self.centroids is None:
+            return
+        self.assignments[dst] = self.assignments[src]
+        self._list_rows = None
+    
+    def truncate(self, size: int):
+        if self.centroids is None:
+            return
+        self._size = min(self._size, size)
+        self._list_rows = None
+    
+    def prepare(self, embeddings: np.ndarray):
+        """Train and build the lists if out of step with embeddings; safe from several threads"""
+        if len(embeddings) < self.min_rows or self._ready(embeddings):
+            return
+        with self._build_lock:
+            if self.centroids is None or self._size != len(embeddings):
+                self.train(embeddings)
+            if self._list_rows is None:
+                self._build_lists()
+    
+    def _ready(self, embeddings: np.ndarray) -> bool:
+        # _list_rows is cleared before and set after every rebuild
+        return self._list_rows is not None and self._size == len(embeddings)
+    
+    def search_batch(self, embeddings: np.ndarray, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # Each query probes its own lists, so there is no shared scan to batch
+        return [self.search(embeddings, query, k) for query in queries]
+    
+    def search(self, embeddings: np.ndarray, query: np.ndarray, k: int, n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if len(embeddings) < self.min_rows:
+            return super().search(embeddings, query, k)
+        self.prepare(embeddings)
+        centroids, list_rows, list_offsets = self.centroids, self._list_rows, self._list_offsets
+        
+        n_probe = min(n_probe or self.n_probe, len(centroids))
+        probed = top_k(centroids @ query, n_probe)
+        candidates = np.concatenate([
+            list_rows[list_offsets[l]:list_offsets[l + 1]] for l in probed
+        ])
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = embeddings[candidates].astype(np.float32, copy=False) @ query
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+    
+    def train(self, embeddings: np.ndarray):
+        """Fit the coarse quantizer on a sample and assign every row
+        
+        Call through prepare() once the index serves searches.
+        """
+        n = len(embeddings)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(n)))
+        n_lists = min(n_lists, n, np.iinfo(np.int16).max)
+        rng = np.random.default_rng(self.seed)
+        sample_rows = np.sort(rng.choice(n, size=min(n, max(self.train_size, n_lists)), replace=False))
+        sample = np.ascontiguousarray(embeddings[sample_rows], dtype=np.float32)
+        logger.info(f"Training IVF quantizer: {n_lists} lists on {len(sample)} of {n} rows")
+        
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(labels, minlength=n_lists)
+            # Per-list sums: sort rows by list, then add up each contiguous run
+            order = np.argsort(labels, kind="stable")
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+            # Re-seed empty lists with random sample points
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+        
+        centroids = centroids.astype(np.float32)
+        assignments = np.empty(n, dtype=np.int16)
+        for start in range(0, n, ASSIGN_BLOCK_ROWS):
+            assignments[start:start + ASSIGN_BLOCK_ROWS] = _nearest(embeddings[start:start + ASSIGN_BLOCK_ROWS], centroids)
+        self._list_rows = None
+        self.centroids = centroids
+        self.assignments = assignments
+        self._trained_rows = n
+        self._size = n
+    
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return _nearest(vectors, self.centroids)
+    
+    def _build_lists(self):
+        # int16 keys make the stable sort a linear-time radix sort
+        assignments = self.assignments[:self._size]
+        list_rows = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=len(self.centroids))
+        self._list_offsets = np.concatenate(([0], np.cumsum(counts)))
+        self._list_rows = list_rows
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "type": self.name,
+            "trained": self.centroids is not None,
+            "n_lists": len(self.centroids) if self.centroids is not None else self.n_lists,
+            "n_probe": self.n_probe
+        }
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid of each row"""
+    return np.argmax(vectors.astype(np.float32, copy=False) @ centroids.T, axis=1).astype(np.int16)
+
+def create_index(index_type: Optional[str] = None) -> FlatIndex:
+    """Build the search index named by index_type or the VECTOR_INDEX env var"""
+    index_type = (index_type or os.getenv("VECTOR_INDEX", "flat")).lower()
+    if index_type == "flat":
+        return FlatIndex()
+    if index_type == "ivf":
+        n_lists = os.getenv("IVF_N_LISTS")
+        return IVFIndex(
+            n_lists=int(n_lists) if n_lists else None,
+            n_probe=int(os.getenv("IVF_N_PROBE", "8"))
+        )
+    if index_type in ("int8", "pq"):
+        from rag.quantization import Int8Index, PQIndex
+        rerank = int(os.getenv("QUANT_RERANK", "200"))
+        if index_type == "int8":
+            return Int8Index(rerank=rerank)
+        return PQIndex(n_subspaces=int(os.getenv("PQ_SUBSPACES", "96")), rerank=rerank)
+    raise ValueError(f"Unknown vector index type: {index_type}")
@@ -0,0 +1,282 @@
+from typing import List, Dict, Any, Optional
+import logging
+import numpy as np
+from rag.document_processor import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_DTYPES = ("float32", "float16")
+# Smallest growth step, for arrays extended a row at a time
+MIN_GROW_ROWS = 16
+
+def _grow(array: np.ndarray, used: int, size: int, max_rows: Optional[int] = None) -> np.ndarray:
+    """Return array with room for at least size rows, keeping its first used rows
+    
+    Grows by half its length, or to exactly size if that is more, so a
+    store filled by one bulk append holds no spare rows. max_rows caps the
+    growth of arrays with a known bound.
+    """
+    if len(array) >= size and array.flags.writeable:
+        return array
+    rows = max(size, len(array) * 3 // 2, MIN_GROW_ROWS)
+    if max_rows is not None:
+        rows = max(size, min(rows, max_rows))
+    grown = np.empty((rows,) + array.shape[1:], dtype=array.dtype)
+    grown[:used] = array[:used]
+    return grown
+
+def _gather_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Positions covered by the ranges [start, start + length), back to back"""
+    total = int(lengths.sum())
+    new_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+    return np.repeat(starts - new_starts, lengths) + np.arange(total, dtype=np.int64)
+
+class ChunkStore:
+    """Columnar storage for indexed leaf chunks and their embeddings
+    
+    Instead of one dict per chunk, every field lives in a flat array:
+    - key paths are split on "." into int32 segment IDs; object keys are
+      interned in a shared segment table and array indices are stored
+      inline as -(index + 1);
+    - content strings are UTF-8 bytes in one buffer, addressed by a
+      per-row start and length;
+    - types are uint8 codes into a small table of type names;
+    - embeddings are one (rows, dimension) float32 or float16 matrix.
+    
+    Rows are addressed by position. Overwriting or dropping a row leaves
+    its old path IDs and bytes behind as garbage, which is compacted away
+    once it outweighs the live data. A store opened from disk may be
+    backed by read-only memory maps; it is copied on the first edit.
+    """
+    
+    def __init__(self, dimension: int, dtype: str = "float32"):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported embedding storage dtype: {dtype}")
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self._size = 0
+        self._segments: List[str] = []
+        self._segment_ids: Optional[Dict[str, int]] = {}
+        self._type_names: List[str] = []
+        
+        self._path_pool = np.empty(0, dtype=np.int32)
+        self._path_used = 0
+        self._path_starts = np.empty(0, dtype=np.int64)
+        self._path_lengths = np.empty(0, dtype=np.int32)
+        self._content_pool = bytearray()
+        self._content_starts = np.empty(0, dtype=np.int64)
+        self._content_lengths = np.empty(0, dtype=np.int32)
+        self._types = np.empty(0, dtype=np.uint8)
+        self._embeddings = np.empty((0, dimension), dtype=self.dtype)
+        
+        # Pool entries no longer referenced by any row
+        self._garbage_path_ids = 0
+        self._garbage_bytes = 0
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def embeddings(self) -> np.ndarray:
+        """(rows, dimension) view of the live embedding rows"""
+        return self._embeddings[:self._size]
+    
+    def key_path(self, row: int) -> str:
+        start = int(self._path_starts[row])
+        ids = self._path_pool[start:start + int(self._path_lengths[row])].tolist()
+        return ".".join(self._segments[i] if i >= 0 else str(-i - 1) for i in ids)
+    
+    def content(self, row: int) -> str:
+        start = int(self._content_starts[row])
+        return bytes(self._content_pool[start:start + int(self._content_lengths[row])]).decode("utf-8")
+    
+    def type_name(self, row: int) -> str:
+        return self._type_names[self._types[row]]
+    
+    def chunk_id(self, row: int) -> str:
+        return DocumentProcessor.chunk_id(self.key_path(row))
+    
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        """Document dict for a row, decoded on access"""
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError("chunk row out of range")
+        key_path = self.key_path(row)
+        return {
+            "id": DocumentProcessor.chunk_id(key_path),
+            "key_path": key_path,
+            "content": self.content(row),
+            "type": self.type_name(row)
+        }
+    
+    def append(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray) -> np.ndarray:
+        """Append chunks (DocumentProcessor dicts) with their embeddings; returns their rows"""
+        self.make_writable()
+        start = self._size
+        end = start + len(chunks)
+        self._reserve(end)
+        for row, chunk in enumerate(chunks, start):
+            self._write_fields(row, chunk)
+        self._embeddings[start:end] = embeddings
+        self._size = end
+        return np.arange(start, end, dtype=np.int64)
+    
+    def set(self, row: int, chunk: Dict[str, Any], embedding: np.ndarray):
+        """Overwrite an existing row"""
+        self.make_writable()
+        self._garbage_path_ids += int(self._path_lengths[row])
+        self._garbage_bytes += int(self._content_lengths[row])
+        self._write_fields(row, chunk)
+        self._embeddings[row] = embedding
+        self._maybe_compact()
+    
+    def move(self, src: int, dst: int):
+        """Copy row src over row dst"""
+        self.make_writable()
+        self._garbage_path_ids += int(self._path_lengths[dst])
+        self._garbage_bytes += int(self._content_lengths[dst])
+        for column in (self._path_starts, self._path_lengths, self._content_starts,
+                       self._content_lengths, self._types, self._embeddings):
+            column[dst] = column[src]
+        # src still references the same pool entries; count them once
+        self._garbage_path_ids -= int(self._path_lengths[src])
+        self._garbage_bytes -= int(self._content_lengths[src])
+    
+    def truncate(self, size: int):
+        """Drop the rows from size onwards"""
+        if size >= self._size:
+            return
+        self.make_writable()
+        self._garbage_path_ids += int(self._path_lengths[size:self._size].sum())
+        self._garbage_bytes += int(self._content_lengths[size:self._size].sum())
+        self._size = size
+        self._maybe_compact()
+    
+    def _write_fields(self, row: int, chunk: Dict[str, Any]):
+        ids = [self._segment_id(segment) for segment in chunk["key_path"].split(".")]
+        self._path_pool = _grow(self._path_pool, self._path_used, self._path_used + len(ids))
+        self._path_pool[self._path_used:self._path_used + len(ids)] = ids
+        self._path_starts[row] = self._path_used
+        self._path_lengths[row] = len(ids)
+        self._path_used += len(ids)
+        
+        data = chunk["content"].encode("utf-8")
+        self._content_starts[row] = len(self._content_pool)
+        self._content_lengths[row] = len(data)
+        self._content_pool += data
+        
+        type_name = chunk["metadata"]["type"]
+        if type_name not in self._type_names:
+            self._type_names.append(type_name)
+        self._types[row] = self._type_names.index(type_name)
+    
+    def _segment_id(self, segment: str) -> int:
+        # Canonical non-negative integers are array indices; store them inline
+        if segment.isascii() and segment.isdigit() and (segment == "0" or segment[0] != "0") and len(segment) < 10:
+            return -int(segment) - 1
+        segment_id = self._segment_ids.get(segment)
+        if segment_id is None:
+            segment_id = len(self._segments)
+            self._segments.append(segment)
+            self._segment_ids[segment] = segment_id
+        return segment_id
+    
+    def _reserve(self, rows: int):
+        size = self._size
+        self._path_starts = _grow(self._path_starts, size, rows)
+        self._path_lengths = _grow(self._path_lengths, size, rows)
+        self._content_starts = _grow(self._content_starts, size, rows)
+        self._content_lengths = _grow(self._content_lengths, size, rows)
+        self._types = _grow(self._types, size, rows)
+        self._embeddings = _grow(self._embeddings, size, rows)
+    
+    def make_writable(self):
+        """Copy memory-mapped columns into private, growable memory"""
+        if self._segment_ids is not None:
+            return
+        size = self._size
+        self._segment_ids = {segment: i for i, segment in enumerate(self._segments)}
+        self._path_pool = np.array(self._path_pool[:self._path_used])
+        self._content_pool = bytearray(self._content_pool)
+        self._path_starts = np.array(self._path_starts[:size])
+        self._path_lengths = np.array(self._path_lengths[:size])
+        self._content_starts = np.array(self._content_starts[:size])
+        self._content_lengths = np.array(self._content_lengths[:size])
+        self._types = np.array(self._types[:size])
+        self._embeddings = np.array(self._embeddings[:size])
+    
+    def _maybe_compact(self):
+        live_ids = self._path_used - self._garbage_path_ids
+        live_bytes = len(self._content_pool) - self._garbage_bytes
+        if self._garbage_path_ids > max(live_ids, 4096) or self._garbage_bytes > max(live_bytes, 65536):
+            self.compact()
+    
+    def compact(self):
+        """Rewrite the path and content pools with only live rows, in row order"""
+        size = self._size
+        path_lengths = self._path_lengths[:size].astype(np.int64)
+        self._path_pool = np.array(self._path_pool[_gather_ranges(self._path_starts[:size], path_lengths)])
+        self._path_used = len(self._path_pool)
+        self._path_starts[:size] = np.concatenate(([0], np.cumsum(path_lengths)[:-1]))
+        
+        content_lengths = self._content_lengths[:size].astype(np.int64)
+        content = np.frombuffer(self._content_pool, dtype=np.uint8)
+        self._content_pool = bytearray(content[_gather_ranges(self._content_starts[:size], content_lengths)].tobytes())
+        self._content_starts[:size] = np.concatenate(([0], np.cumsum(content_lengths)[:-1]))
+        
+        self._garbage_path_ids = 0
+        self._garbage_bytes = 0
+    
+    def to_columns(self) -> Dict[str, Any]:
+        """Compacted columns for persistence (see index_store.save_index)"""
+        if self._garbage_path_ids or self._garbage_bytes:
+            self.compact()
+        size = self._size
+        return {
+            "segments": list(self._segments),
+            "types": list(self._type_names),
+            "dtype": self.dtype.name,
+            "path_ids": self._path_pool[:self._path_used],
+            "path_starts": self._path_starts[:size],
+            "path_lengths": self._path_lengths[:size],
+            "content": self._content_pool,
+            "content_starts": self._content_starts[:size],
+            "content_lengths": self._content_lengths[:size],
+            "type_codes": self._types[:size],
+            "embeddings": self._embeddings[:size]
+        }
+    
+    @classmethod
+    def from_columns(cls, dimension: int, columns: Dict[str, Any]) -> "ChunkStore":
+        """Wrap columns as written by to_columns; they may be read-only memory maps"""
+        store = cls(dimension, columns["dtype"])
+        store._size = len(columns["type_codes"])
+        store._segments = list(columns["segments"])
+        store._segment_ids = None  # built by make_writable on the first edit
+        store._type_names = list(columns["types"])
+        store._path_pool = columns["path_ids"]
+        store._path_used = len(columns["path_ids"])
+        store._path_starts = columns["path_starts"]
+        store._path_lengths = columns["path_lengths"]
+        store._content_pool = columns["content"]
+        store._content_starts = columns["content_starts"]
+        store._content_lengths = columns["content_lengths"]
+        store._types = columns["type_codes"]
+        store._embeddings = columns["embeddings"]
+        return store
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Row count and bytes held by each part of the store"""
+        size = self._size
+        metadata_bytes = (self._path_pool.itemsize * self._path_used + len(self._content_pool) + size * (
+            self._path_starts.itemsize + self._path_lengths.itemsize + self._content_starts.itemsize
+            + self._content_lengths.itemsize + self._types.itemsize
+        ))
+        return {
+            "rows": size,
+            "dtype": self.dtype.name,
+            "segments": len(self._segments),
+            "embedding_bytes": size * self.dimension * self.dtype.itemsize,
+            "metadata_bytes": metadata_bytes
+        }
@@ -0,0 +1,346 @@
+import asyncio
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Iterator, Optional
+import logging
+from rag.vector_store import VectorStore
+from rag.index_store import current_version, index_exists
+from rag.retrieval import RAGPipeline
+from aws.bedrock_client import BedrockClient
+from aws.embedding_client import AWSBedrockEmbeddings
+from metrics import Family
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLLECTION = "default"
+# Collection names double as directory names
+COLLECTION_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+class CollectionNotFoundError(LookupError):
+    """No collection of that name has been uploaded"""
+
+class IndexConflictError(RuntimeError):
+    """Another version of a collection was published after a copy of it was loaded"""
+
+class Collection:
+    """One knowledge base: its vector store and a RAG pipeline over it"""
+    
+    def __init__(self, name: str, path: str, vector_store: VectorStore, rag_pipeline: RAGPipeline, generation: int = 0,
+                 base_version: Optional[str] = None):
+        self.name = name
+        self.path = path
+        self.vector_store = vector_store
+        self.rag_pipeline = rag_pipeline
+        # Requests currently using the collection; it is never unloaded under them
+        self.users = 0
+        # Deletions of the name seen when created; a stale generation is never saved
+        self.generation = generation
+        # Version on disk this collection was loaded from, or replaces; save()
+        # refuses to publish over any other
+        self.base_version = base_version
+        # When the on-disk version was last compared with the loaded one
+        self.checked_at = time.monotonic()
+    
+    def memory_bytes(self) -> int:
+        cache = self.rag_pipeline.response_cache
+        return self.vector_store.memory_bytes() + (cache.memory_bytes() if cache is not None else 0)
+    
+    def get_status(self) -> Dict[str, Any]:
+        status = self.vector_store.get_status()
+        status["collection"] = self.name
+        if self.rag_pipeline.response_cache is not None:
+            status["response_cache"] = self.rag_pipeline.response_cache.get_stats()
+        return status
+
+class CollectionManager:
+    """Named, isolated knowledge bases with lazy loading and LRU unloading
+    
+    Every collection persists to its own index directory under root (the
+    default collection keeps the single-tenant INDEX_PATH) and has its own
+    vector store, lexical/path indexes and response cache. Only the
+    embedding client, with its executor and embedding cache, and the
+    Bedrock client are shared.
+    
+    Indexes are published as immutable versions (see save_index) and
+    loaded memory-mapped, so every worker process serving the same root
+    shares one copy of the column files in the page cache. At most every
+    refresh_interval seconds a request checks whether another process
+    published a newer version and, if so, re-attaches to it; in-flight
+    requests finish on the version they started with.
+    
+    A collection is loaded on its first request. Once the
+    loaded collections hold more than memory_budget bytes, or there are
+    more than max_loaded of them, the least recently used ones not serving
+    a request are dropped; their files stay on disk for the next request.
+    """
+    
+    def __init__(self, root: str, bedrock_client: BedrockClient, default_path: Optional[str] = None,
+                 memory_budget: int = 1 << 30, max_loaded: int = 256, response_cache_size: int = 100,
+                 refresh_interval: float = 1.0, mock_mode: bool = False):
+        self.root = root
+        self.bedrock_client = bedrock_client
+        self.default_path = default_path or os.path.join(root, DEFAULT_COLLECTION)
+        self.memory_budget = memory_budget
+        self.max_loaded = max_loaded
+        self.response_cache_size = response_cache_size
+        self.refresh_interval = refresh_interval
+        self.mock_mode = mock_mode
+        self.embedding_model: Optional[AWSBedrockEmbeddings] = None
+        self._loaded: "OrderedDict[str, Collection]" = OrderedDict()
+        # Bytes of each loaded collection, measured when it was loaded or
+        # installed (its size is fixed from then on), and their running total
+        self._loaded_bytes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._generations: Dict[str, int] = {}
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+    
+    def path(self, name: str) -> str:
+        if not COLLECTION_NAME_RE.match(name):
+            raise ValueError(f"Invalid collection name {name!r}: use up to 64 letters, digits, '-' or '_'")
+        return self.default_path if name == DEFAULT_COLLECTION else os.path.join(self.root, name)
+    
+    def new_collection(self, name: str) -> Collection:
+        """An empty collection, not yet registered (see install)"""
+        vector_store = VectorStore(mock_mode=self.mock_mode, embedding_model=self.embedding_model)
+        # The first store creates the embedding client every later store shares
+        self.embedding_model = vector_store.embedding_model
+        rag_pipeline = RAGPipeline(vector_store, self.bedrock_client, cache_size=self.response_cache_size)
+        path = self.path(name)
+        return Collection(name, path, vector_store, rag_pipeline, self._generations.get(name, 0), current_version(path))
+    
+    def _open(self, name: str) -> Optional[Collection]:
+        """Load a collection from disk, or None if it was never saved
+        
+        Its search structures are built here, before any request can use it,
+        so first queries never build them concurrently.
+        """
+        path = self.path(name)
+        if not index_exists(path):
+            return None
+        collection = self.new_collection(name)
+        collection.vector_store.load(path)
+        collection.base_version = collection.vector_store.index_version
+        collection.vector_store.prepare()
+        self.loads += 1
+        logger.info(f"Loaded collection '{name}' ({len(collection.vector_store.chunks)} chunks)")
+        return collection
+    
+    async def acquire(self, name: str, create: bool = False) -> Collection:
+        """Get a collection for one request, loading it if needed; pair with release()
+        
+        Raises CollectionNotFoundError for an unknown name unless create is
+        set, in which case an empty collection is returned.
+        """
+        self.path(name)
+        collection = self._loaded.get(name)
+        if collection is not None and self._outdated(collection):
+            logger.info(f"Collection '{name}' has a newer index version on disk, re-attaching")
+            self._unload(name)
+            collection = None
+            self.reloads += 1
+        if collection is None:
+            # Concurrent first requests share one load
+            loading = self._loading.get(name)
+            if loading is None:
+                loading = self._loading[name] = asyncio.ensure_future(asyncio.to_thread(self._open, name))
+                loading.add_done_callback(lambda _: self._loading.pop(name, None))
+            opened = await asyncio.shield(loading)
+            collection = self._loaded.get(name) or opened
+            if collection is None:
+                if not create:
+                    raise CollectionNotFoundError(name)
+                collection = self.new_collection(name)
+            if self._loaded.get(name) is not collection:
+                self._put(collection)
+        self._loaded.move_to_end(name)
+        collection.users += 1
+        self._evict()
+        return collection
+    
+    def _outdated(self, collection: Collection) -> bool:
+        """Whether another process published a newer version (checked at most every refresh_interval)"""
+        now = time.monotonic()
+        if now - collection.checked_at < self.refresh_interval:
+            return False
+        collection.checked_at = now
+        return current_version(collection.path) != collection.vector_store.index_version
+    
+    def pin(self, collection: Collection):
+        """Hold an acquired collection for work that may outlive its request; pair with release()"""
+        collection.users += 1
+    
+    def release(self, collection: Collection):
+        collection.users -= 1
+        if self._loaded.get(collection.name) is collection:
+            # Response caches grow as requests are answered
+            size = collection.memory_bytes()
+            self._total_bytes += size - self._loaded_bytes[collection.name]
+            self._loaded_bytes[collection.name] = size
+        self._evict()
+    
+    @asynccontextmanager
+    async def use(self, name: str, create: bool = False):
+        collection = await self.acquire(name, create)
+        try:
+            yield collection
+        finally:
+            self.release(collection)
+    
+    def _put(self, collection: Collection):
+        """Register a collection as loaded under its name, replacing any other"""
+        self._unload(collection.name)
+        size = collection.memory_bytes()
+        self._loaded[collection.name] = collection
+        self._loaded_bytes[collection.name] = size
+        self._total_bytes += size
+    
+    def _unload(self, name: str) -> Optional[Collection]:
+        self._total_bytes -= self._loaded_bytes.pop(name, 0)
+        return self._loaded.pop(name, None)
+    
+    def _evict(self):
+        """Unload least recently used idle collections until within budget
+        
+        Runs on every acquire and release, so it only compares the running
+        byte total; collections are walked only when over budget.
+        """
+        if self._total_bytes <= self.memory_budget and len(self._loaded) <= self.max_loaded:
+            return
+        for name in list(self._loaded):
+            if self._total_bytes <= self.memory_budget and len(self._loaded) <= self.max_loaded:
+                break
+            if self._loaded[name].users:
+                continue
+            size = self._loaded_bytes.get(name, 0)
+            self._unload(name)
+            self.evictions += 1
+            logger.info(f"Unloaded collection '{name}' ({size / 1e6:.1f} MB)")
+    
+    def load_copy(self, name: str) -> Collection:
+        """A private copy of a collection from disk (empty if never saved), to modify and install()
+        
+        Blocking; run it off the event loop.
+        """
+        return self._open(name) or self.new_collection(name)
+    
+    def install(self, collection: Collection):
+        """Swap a collection built off to the side in for its name
+        
+        Requests that start afterwards use it; requests in flight finish on
+        the collection they acquired. Ignored if the name was deleted since
+        the collection was created, or if the version it was saved as is no
+        longer current (requests re-attach to the newer one instead).
+        """
+        if collection.generation != self._generations.get(collection.name, 0):
+            return
+        if current_version(collection.path) != collection.vector_store.index_version:
+            logger.info(f"Not installing collection '{collection.name}': a newer version was published")
+            return
+        collection.checked_at = time.monotonic()
+        self._put(collection)
+        self._evict()
+    
+    def save(self, collection: Collection):
+        """Persist a collection, unless it was deleted while being written
+        
+        Raises IndexConflictError instead of overwriting a version published
+        since the collection was loaded or created. Indexing jobs hold the
+        collection's directory lock (see JobManager), so this only fires
+        when the directory is written some other way.
+        """
+        if collection.generation != self._generations.get(collection.name, 0):
+            return
+        published = current_version(collection.path)
+        if published != collection.base_version:
+            raise IndexConflictError(f"Collection '{collection.name}' was republished as version {published} "
+                                     f"after this copy was made from {collection.base_version}")
+        collection.base_version = collection.vector_store.save(collection.path)
+    
+    async def delete(self, name: str) -> bool:
+        """Unload and remove a collection; False if it did not exist"""
+        path = self.path(name)
+        collection = self._unload(name)
+        self._generations[name] = self._generations.get(name, 0) + 1
+        existed = os.path.exists(path)
+        if existed:
+            await asyncio.to_thread(shutil.rmtree, path)
+        logger.info(f"Deleted collection '{name}'")
+        return existed or collection is not None
+    
+    def directory_names(self) -> List[str]:
+        """Names of the collections with a directory on disk, whether or not it holds an index yet"""
+        names = []
+        if os.path.isdir(self.root):
+            names.extend(entry for entry in os.listdir(self.root) if COLLECTION_NAME_RE.match(entry))
+        if os.path.exists(self.default_path) and DEFAULT_COLLECTION not in names:
+            names.append(DEFAULT_COLLECTION)
+        return names
+    
+    def list_collections(self) -> List[Dict[str, Any]]:
+        """Every collection on disk or in memory, with its load state"""
+        names = set(self._loaded)
+        names.update(name for name in self.directory_names() if index_exists(self.path(name)))
+        collections = []
+        for name in sorted(names):
+            collection = self._loaded.get(name)
+            collections.append({
+                "name": name,
+                "loaded": collection is not None,
+                "chunks_count": len(collection.vector_store.chunks) if collection is not None else None
+            })
+        return collections
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": len(self._loaded),
+            "max_loaded": self.max_loaded,
+            "memory_bytes": self._total_bytes,
+            "memory_budget_bytes": self.memory_budget,
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "evictions": self.evictions
+        }
+    
+    def collect_metrics(self) -> Iterator[Family]:
+        """Index sizes, cache hit rates and load counters, read at scrape time
+        
+        Response cache counters belong to a loaded collection and restart
+        from zero when it is loaded again.
+        """
+        loaded = list(self._loaded.values())
+        yield ("chatbot_collections_loaded", "gauge", "Collections loaded in this process", [({}, len(loaded))])
+        yield ("chatbot_collection_loads_total", "counter", "Collection index loads from disk", [({}, self.loads)])
+        yield ("chatbot_collection_reloads_total", "counter", "Re-attachments to a version published by another process",
+               [({}, self.reloads)])
+        yield ("chatbot_collection_evictions_total", "counter", "Collections unloaded to stay within budget",
+               [({}, self.evictions)])
+        yield ("chatbot_index_chunks", "gauge", "Chunks indexed per loaded collection",
+               [({"collection": c.name}, len(c.vector_store.chunks)) for c in loaded])
+        yield ("chatbot_index_memory_bytes", "gauge", "Approximate memory per loaded collection",
+               [({"collection": c.name}, self._loaded_bytes.get(c.name, 0)) for c in loaded])
+        
+        caches = [(c.name, c.rag_pipeline.response_cache.get_stats()) for c in loaded
+                  if c.rag_pipeline.response_cache is not None]
+        yield ("chatbot_response_cache_lookups_total", "counter", "Response cache lookups by result", [
+            ({"collection": name, "result": result}, stats[key])
+            for name, stats in caches
+            for result, key in (("exact_hit", "exact_hits"), ("semantic_hit", "semantic_hits"), ("miss", "misses"))
+        ])
+        yield ("chatbot_response_cache_hit_ratio", "gauge", "Response cache hits per lookup",
+               [({"collection": name}, stats["hit_rate"]) for name, stats in caches])
+        
+        embedding_cache = self.embedding_model.get_cache_stats() if self.embedding_model is not None else None
+        if embedding_cache is not None:
+            yield ("chatbot_embedding_cache_lookups_total", "counter", "Embedding cache lookups by result", [
+                ({"result": "hit"}, embedding_cache["hits"]),
+                ({"result": "miss"}, embedding_cache["misses"])
+            ])
+            yield ("chatbot_embedding_cache_hit_ratio", "gauge", "Embedding cache hits per lookup",
+                   [({}, embedding_cache["hit_rate"])])
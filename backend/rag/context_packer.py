@@ -0,0 +1,127 @@
+import re
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# No tokenizer ships with the app; Claude averages roughly four characters per token
+CHARS_PER_TOKEN = 4
+_WORD_RE = re.compile(r"\w+")
+# Questions that ask for an enumeration or an explanation get the whole answer allowance
+_LONG_ANSWER_RE = re.compile(
+    r"\b(list|all|every|compare|comparison|explain|describe|summari[sz]e|overview|details?|why|"
+    r"how (?:does|do|can|to)|steps|differences?)\b",
+    re.IGNORECASE
+)
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def answer_token_limit(query: str, groups: int, floor: int = 256, ceiling: int = 1000) -> int:
+    """max_tokens for an answer to query over a context of `groups` objects
+    
+    Lookups get floor plus a little per object in context; list, compare
+    and explain questions get the ceiling. Bedrock reserves max_tokens
+    against the output token quota up front, so a tight limit on short
+    answers also leaves more throughput for other requests.
+    """
+    if _LONG_ANSWER_RE.search(query):
+        return ceiling
+    return max(1, min(ceiling, floor + 48 * groups))
+
+class ContextPacker:
+    """Builds the prompt context from search hits and their expanded objects
+    
+    Leaves are grouped under their parent path, so "products.0" is written
+    once with name, price, ... below it instead of repeating the prefix on
+    every line. A long value (min_dedupe_words or more words) whose word set
+    nearly matches one already kept (Jaccard similarity of at least
+    dedupe_threshold) is dropped. The rest are admitted by relevance until
+    token_budget is spent: the hits in rank order first, then the other
+    leaves of their objects, so a tight budget keeps what the search
+    matched. Groups are written in order of their best hit, leaves in
+    document order.
+    """
+    
+    def __init__(self, token_budget: int = 1500, dedupe_threshold: float = 0.9, min_dedupe_words: int = 8):
+        self.token_budget = token_budget
+        self.dedupe_threshold = dedupe_threshold
+        self.min_dedupe_words = min_dedupe_words
+    
+    def pack(self, sources: List[Dict[str, Any]], entries: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, Dict[str, int]]:
+        """Context text for sources (ranked hits) and entries (their expansion)
+        
+        Returns (context, stats); stats counts the groups and entries kept,
+        the entries dropped as duplicates or for the budget, and the
+        estimated context tokens.
+        """
+        if entries is None:
+            entries = sources
+        ranks: Dict[str, int] = {}
+        for rank, source in enumerate(sources):
+            ranks.setdefault(source["key_path"], rank)
+        # Hits come first in rank order, then the other leaves of each hit's object
+        object_prefixes = [source["key_path"].rpartition(".")[0] + "." for source in sources]
+        
+        items = []
+        for position, entry in enumerate(entries):
+            key_path = entry["key_path"]
+            if key_path in ranks:
+                priority = (0, ranks[key_path])
+            else:
+                priority = (1, next((rank for rank, prefix in enumerate(object_prefixes)
+                                     if prefix != "." and key_path.startswith(prefix)), len(sources)))
+            parent, _, field = key_path.rpartition(".")
+            items.append((priority, position, parent or key_path, field if parent else "", entry["content"]))
+        items.sort(key=lambda item: item[:2])
+        
+        kept, kept_words, groups = [], [], set()
+        used = duplicates = over_budget = 0
+        for _, position, group, field, content in items:
+            words = set(_WORD_RE.findall(content.lower()))
+            if len(words) >= self.min_dedupe_words:
+                if any(len(words & other) >= self.dedupe_threshold * len(words | other) for other in kept_words):
+                    duplicates += 1
+                    continue
+            cost = estimate_tokens(f"  {field}: {content}\n")
+            if group not in groups:
+                cost += estimate_tokens(f"{len(groups) + 1}. {group}:\n")
+            if used + cost > self.token_budget:
+                if kept:
+                    over_budget += 1
+                    continue
+                # The best hit is always sent, cut to the budget if it alone exceeds it
+                content = content[:max(0, self.token_budget * CHARS_PER_TOKEN - len(group) - len(field) - 8)] + "..."
+            kept.append((group, position, field, content))
+            if len(words) >= self.min_dedupe_words:
+                kept_words.append(words)
+            groups.add(group)
+            used += cost
+        
+        context = self._render(kept)
+        stats = {
+            "groups": len(groups),
+            "entries": len(kept),
+            "duplicates_dropped": duplicates,
+            "over_budget_dropped": over_budget,
+            "tokens": estimate_tokens(context)
+        }
+        logger.debug("Packed context: %s", stats)
+        return context, stats
+    
+    @staticmethod
+    def _render(kept: List[Tuple[str, int, str, str]]) -> str:
+        by_group: Dict[str, List[Tuple[int, str, str]]] = {}
+        for group, position, field, content in kept:
+            by_group.setdefault(group, []).append((position, field, content))
+        lines = []
+        for number, (group, leaves) in enumerate(by_group.items(), 1):
+            leaves.sort()
+            if len(leaves) == 1:
+                _, field, content = leaves[0]
+                lines.append(f"{number}. {group}.{field}: {content}" if field else f"{number}. {group}: {content}")
+                continue
+            lines.append(f"{number}. {group}:")
+            lines.extend(f"  {field}: {content}" for _, field, content in leaves)
+        return "\n".join(lines)
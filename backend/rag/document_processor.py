@@ -1,6 +1,7 @@
 import json
-from typing import List, Dict, Any
-import uuid
+from typing import List, Dict, Any, Iterator
+import hashlib
+from rag.json_stream import iter_json_events, MAP_KEY, START_MAP, END_MAP, START_ARRAY, END_ARRAY
 
 class DocumentProcessor:
     def __init__(self):
@@ -11,36 +12,85 @@ class DocumentProcessor:
         Process JSON document into chunks by keys
         Each chunk contains the key path and its value
         """
-        chunks = []
-        self._process_json_recursive(json_data, "", chunks)
-        return chunks
+        return list(self.iter_chunks(json_data))
     
-    def _process_json_recursive(self, data: Any, current_path: str, chunks: List[Dict[str, Any]]):
+    def iter_chunks(self, json_data: Any) -> Iterator[Dict[str, Any]]:
         """
-        Recursively process JSON data and create chunks
-        """
-        if isinstance(data, dict):
-            for key, value in data.items():
-                new_path = f"{current_path}.{key}" if current_path else key
-                self._process_json_recursive(value, new_path, chunks)
+        Yield the leaf chunks of already-parsed JSON data in document order
         
-        elif isinstance(data, list):
-            for i, item in enumerate(data):
-                new_path = f"{current_path}.{i}"
-                self._process_json_recursive(item, new_path, chunks)
+        Walks the tree with an explicit stack, so deeply nested documents
+        cannot hit the recursion limit.
+        """
+        stack = [(json_data, "")]
+        while stack:
+            data, current_path = stack.pop()
+            if isinstance(data, dict):
+                children = [(value, f"{current_path}.{key}" if current_path else key) for key, value in data.items()]
+                stack.extend(reversed(children))
+            
+            elif isinstance(data, list):
+                children = [(item, f"{current_path}.{i}") for i, item in enumerate(data)]
+                stack.extend(reversed(children))
+            
+            else:
+                # Leaf node - create chunk
+                yield self._make_chunk(current_path, data)
+    
+    def iter_json_chunks(self, stream, buffer_size: int = 65536) -> Iterator[Dict[str, Any]]:
+        """
+        Yield leaf chunks straight from a JSON file-like object
         
-        else:
-            # Leaf node - create chunk
-            chunk = {
-                "id": str(uuid.uuid4()),
-                "key_path": current_path,
-                "content": str(data),
-                "metadata": {
-                    "type": type(data).__name__,
-                    "key_path": current_path
-                }
+        The document is never loaded or built as a tree: an incremental
+        parser emits events and only the current key path is kept on an
+        explicit stack, so memory stays flat for any file size or depth.
+        Chunks come out in the same order and form as process_json.
+        """
+        # One frame per open container: [is_object, container path, current key or index]
+        stack = []
+        for event, value in iter_json_events(stream, buffer_size):
+            if event == MAP_KEY:
+                stack[-1][2] = value
+                continue
+            if event == END_MAP or event == END_ARRAY:
+                stack.pop()
+                continue
+            
+            # A value starts: work out its key path
+            if not stack:
+                path = ""
+            else:
+                frame = stack[-1]
+                if frame[0]:
+                    path = f"{frame[1]}.{frame[2]}" if frame[1] else frame[2]
+                else:
+                    frame[2] += 1
+                    path = f"{frame[1]}.{frame[2]}"
+            
+            if event == START_MAP:
+                stack.append([True, path, None])
+            elif event == START_ARRAY:
+                stack.append([False, path, -1])
+            else:
+                yield self._make_chunk(path, value)
+    
+    def _make_chunk(self, key_path: str, data: Any) -> Dict[str, Any]:
+        return {
+            "id": self.chunk_id(key_path),
+            "key_path": key_path,
+            "content": str(data),
+            "metadata": {
+                "type": type(data).__name__,
+                "key_path": key_path
             }
-            chunks.append(chunk)
+        }
+    
+    @staticmethod
+    def chunk_id(key_path: str) -> str:
+        """
+        Stable chunk ID derived from the key path, so the same leaf keeps
+        its ID across uploads
+        """
+        return hashlib.sha1(key_path.encode("utf-8")).hexdigest()[:16]
     
     def get_chunk_text(self, chunk: Dict[str, Any]) -> str:
         """
@@ -0,0 +1,145 @@
+import json
+import re
+import time
+from typing import Dict, Any, Optional, Tuple
+import os
+import shutil
+import logging
+import numpy as np
+from rag.chunk_store import ChunkStore
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+CONTENT_FILE = "content.bin"
+# Names the version directory readers should load
+CURRENT_FILE = "CURRENT"
+VERSION_RE = re.compile(r"^\d+-\d+$")
+# Versions kept on disk, the current one included
+KEEP_VERSIONS = 2
+
+# ChunkStore columns saved as .npy arrays, one file each
+ARRAY_COLUMNS = ("embeddings", "path_ids", "path_starts", "path_lengths",
+                 "content_starts", "content_lengths", "type_codes")
+
+def current_version(path: str) -> Optional[str]:
+    """Version an index directory currently points at, or None (missing or unversioned)"""
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as current_file:
+            return current_file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def index_exists(path: str) -> bool:
+    """Whether a directory holds a saved index, versioned or not"""
+    return current_version(path) is not None or os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+def save_index(path: str, store: ChunkStore, model_id: str) -> str:
+    """Publish a chunk store's columns as a new version of an index directory
+    
+    Each save writes a fresh, immutable version directory under path and
+    then atomically replaces the CURRENT pointer file, so readers (in this
+    or any other process) never observe a half-written index and keep
+    their memory-mapped version until they re-attach. The previous
+    KEEP_VERSIONS - 1 versions are left for processes still loading them.
+    Nothing already on disk is removed until CURRENT points at the new
+    version, so a failed save leaves the previous index loadable.
+    Returns the new version.
+    """
+    version = f"{time.time_ns()}-{os.getpid()}"
+    os.makedirs(path, exist_ok=True)
+    tmp_path = os.path.join(path, f".tmp-{version}")
+    pointer_path = os.path.join(path, f".{CURRENT_FILE}-{version}")
+    try:
+        os.makedirs(tmp_path)
+        columns = store.to_columns()
+        for name in ARRAY_COLUMNS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(columns[name]))
+        with open(os.path.join(tmp_path, CONTENT_FILE), "wb") as content_file:
+            content_file.write(columns["content"])
+        with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as manifest_file:
+            json.dump({
+                "format_version": FORMAT_VERSION,
+                "count": len(store),
+                "dimension": store.dimension,
+                "dtype": columns["dtype"],
+                "model_id": model_id,
+                "types": columns["types"],
+                "segments": columns["segments"]
+            }, manifest_file)
+        os.replace(tmp_path, os.path.join(path, version))
+        
+        with open(pointer_path, "w") as pointer_file:
+            pointer_file.write(version)
+        os.replace(pointer_path, os.path.join(path, CURRENT_FILE))
+    except BaseException:
+        # Leave the directory as it was; the previous index is still current
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        _remove_file(pointer_path)
+        if current_version(path) != version:
+            shutil.rmtree(os.path.join(path, version), ignore_errors=True)
+        raise
+    
+    # Only now that CURRENT names the new version is the old layout unused
+    _remove_unversioned(path)
+    # Version names sort by creation time
+    versions = sorted(entry for entry in os.listdir(path) if VERSION_RE.match(entry))
+    for old_version in versions[:-KEEP_VERSIONS]:
+        if old_version != version:
+            shutil.rmtree(os.path.join(path, old_version), ignore_errors=True)
+    logger.info(f"Saved index with {len(store)} chunks to {path} (version {version})")
+    return version
+
+def _remove_unversioned(path: str):
+    """Drop the files of an index saved before versioned directories"""
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return
+    logger.info(f"Replacing unversioned index at {path}")
+    for name in ARRAY_COLUMNS:
+        _remove_file(os.path.join(path, f"{name}.npy"))
+    _remove_file(os.path.join(path, CONTENT_FILE))
+    _remove_file(os.path.join(path, MANIFEST_FILE))
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def load_index(path: str, mmap: bool = True, version: Optional[str] = None) -> Tuple[ChunkStore, Dict[str, Any]]:
+    """Open the current (or the given) version of an index directory written by save_index
+    
+    With mmap=True every column is mapped read-only instead of read into
+    memory, so loading is O(1) and the pages are shared with every other
+    process that maps the same files. The returned manifest carries the
+    loaded "version" (None for an unversioned directory).
+    """
+    version = version or current_version(path)
+    if version is not None:
+        path = os.path.join(path, version)
+    with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format version: {manifest.get('format_version')}")
+    
+    mmap_mode = "r" if mmap else None
+    columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_COLUMNS}
+    content_path = os.path.join(path, CONTENT_FILE)
+    if os.path.getsize(content_path) == 0:
+        columns["content"] = np.empty(0, dtype=np.uint8)
+    elif mmap:
+        columns["content"] = np.memmap(content_path, dtype=np.uint8, mode="r")
+    else:
+        columns["content"] = bytearray(np.fromfile(content_path, dtype=np.uint8).tobytes())
+    columns["segments"] = manifest["segments"]
+    columns["types"] = manifest["types"]
+    columns["dtype"] = manifest["dtype"]
+    
+    if columns["embeddings"].shape != (manifest["count"], manifest["dimension"]) or len(columns["type_codes"]) != manifest["count"]:
+        raise ValueError(f"Index at {path} is inconsistent with its manifest")
+    
+    store = ChunkStore.from_columns(manifest["dimension"], columns)
+    manifest["version"] = version
+    logger.info(f"Loaded index with {len(store)} chunks from {path} (mmap: {mmap})")
+    return store, manifest
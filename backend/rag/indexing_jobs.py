@@ -0,0 +1,298 @@
+import asyncio
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Iterable, Optional, Callable, Awaitable, BinaryIO
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process job lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Job records live in this subdirectory of their collection's directory
+JOBS_DIR = "jobs"
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# A running job's record is rewritten with its progress at most this often
+SAVE_INTERVAL_SECONDS = 1.0
+# How often a job waiting for another process's lock on its collection retries
+LOCK_POLL_SECONDS = 0.2
+
+class IndexingJob:
+    """State and progress of one background (re)indexing run
+    
+    Progress comes from two sources: bytes of the upload consumed by the
+    parser (wrap the file with track()) and chunks embedded so far (pass
+    progress() as the progress callback). The ETA uses the chunk total
+    when it is known and the byte position otherwise, since a streamed
+    upload is not counted before it has been parsed.
+    """
+    
+    def __init__(self, job_id: str, collection: str, kind: str, bytes_total: Optional[int] = None):
+        self.id = job_id
+        self.collection = collection
+        self.kind = kind
+        self.state = "queued"
+        self.bytes_total = bytes_total
+        self.bytes_done = 0
+        self.chunks_done = 0
+        self.chunks_total: Optional[int] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        # Where the status is persisted for other processes (None: memory only)
+        self.record_path: Optional[str] = None
+        self._saved_at = 0.0
+        self._save_lock = threading.Lock()
+    
+    def save(self):
+        """Write the status to record_path, atomically, if it is set"""
+        if self.record_path is None:
+            return
+        with self._save_lock:
+            directory = os.path.dirname(self.record_path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+            with os.fdopen(fd, "w") as record_file:
+                json.dump(self.get_status(), record_file)
+            os.replace(tmp_path, self.record_path)
+            self._saved_at = time.monotonic()
+    
+    def _save_progress(self):
+        if self.record_path is not None and time.monotonic() - self._saved_at >= SAVE_INTERVAL_SECONDS:
+            self.save()
+    
+    def track(self, stream: BinaryIO) -> "_ProgressReader":
+        """Wrap a binary stream so reads advance bytes_done"""
+        return _ProgressReader(stream, self)
+    
+    def progress(self, done: int, total: Optional[int] = None):
+        """(done, total) progress callback for the embedding stage"""
+        self.chunks_done = done
+        self.chunks_total = total
+        self._save_progress()
+    
+    def _fraction(self) -> Optional[float]:
+        if self.state == "succeeded":
+            return 1.0
+        if self.chunks_total:
+            return self.chunks_done / self.chunks_total
+        if self.bytes_total:
+            return self.bytes_done / self.bytes_total
+        return None
+    
+    def get_status(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        fraction = self._fraction()
+        eta = None
+        if self.state == "running" and fraction and elapsed:
+            eta = elapsed * (1 - fraction) / fraction
+        return {
+            "job_id": self.id,
+            "collection": self.collection,
+            "kind": self.kind,
+            "state": self.state,
+            "progress": fraction,
+            "chunks_processed": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "bytes_processed": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "chunks_per_second": self.chunks_done / elapsed if elapsed else None,
+            "elapsed_seconds": elapsed,
+            "eta_seconds": eta,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error
+        }
+
+class _ProgressReader:
+    """File-like wrapper that counts the bytes read into a job"""
+    
+    def __init__(self, stream: BinaryIO, job: IndexingJob):
+        self._stream = stream
+        self._job = job
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self._job.bytes_done += len(data)
+        self._job._save_progress()
+        return data
+
+class JobManager:
+    """Runs indexing jobs in the background, at most max_concurrent at once
+    
+    Jobs for the same collection run one after another, in submission
+    order, so an update always starts from the previous job's result. The
+    most recent max_finished finished jobs stay queryable.
+    
+    With directory (collection name -> its index directory), this holds
+    across worker processes too: each job's status is written to
+    <directory>/jobs/<id>.json, so any process can report it, and a job
+    holds an exclusive flock on its collection's directory while it runs.
+    collections lists the names whose records are searched for a job this
+    process did not run.
+    """
+    
+    def __init__(self, max_concurrent: int = 2, max_finished: int = 1000,
+                 directory: Optional[Callable[[str], str]] = None,
+                 collections: Optional[Callable[[], Iterable[str]]] = None):
+        self.max_concurrent = max_concurrent
+        self.max_finished = max_finished
+        self.directory = directory
+        self.collections = collections
+        self._jobs: "OrderedDict[str, IndexingJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Per-collection lock and number of its jobs not yet finished
+        self._collection_locks: Dict[str, asyncio.Lock] = {}
+        self._pending: Dict[str, int] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+    
+    def submit(self, collection: str, kind: str, run: Callable[[IndexingJob], Awaitable[Dict[str, Any]]],
+               bytes_total: Optional[int] = None) -> IndexingJob:
+        """Queue run(job) on the running event loop and return the job"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        job = IndexingJob(uuid.uuid4().hex, collection, kind, bytes_total)
+        if self.directory is not None:
+            job.record_path = self._record_path(collection, job.id)
+            job.save()
+        self._collection_locks.setdefault(collection, asyncio.Lock())
+        self._pending[collection] = self._pending.get(collection, 0) + 1
+        self._jobs[job.id] = job
+        self._prune()
+        self._tasks[job.id] = asyncio.get_running_loop().create_task(self._run(job, run))
+        logger.info(f"Queued {kind} job {job.id} for collection '{collection}'")
+        return job
+    
+    async def _run(self, job: IndexingJob, run: Callable[[IndexingJob], Awaitable[Dict[str, Any]]]):
+        try:
+            async with self._collection_locks[job.collection], self._directory_lock(job.collection), self._slots:
+                job.state = "running"
+                job.started_at = time.time()
+                job.save()
+                logger.info(f"Started {job.kind} job {job.id} for collection '{job.collection}'")
+                try:
+                    job.result = await run(job)
+                    job.state = "succeeded"
+                except Exception as e:
+                    logger.error(f"{job.kind.capitalize()} job {job.id} failed: {str(e)}", exc_info=True)
+                    job.error = str(e)
+                    job.state = "failed"
+                job.finished_at = time.time()
+                job.save()
+                logger.info(f"Finished {job.kind} job {job.id} ({job.state}) in {job.finished_at - job.started_at:.1f}s")
+            self._prune_records(job.collection)
+        finally:
+            del self._tasks[job.id]
+            self._pending[job.collection] -= 1
+            if not self._pending[job.collection]:
+                del self._pending[job.collection]
+                del self._collection_locks[job.collection]
+    
+    @asynccontextmanager
+    async def _directory_lock(self, collection: str):
+        """Exclusive flock on a collection's directory, shared by every process serving it
+        
+        Polled rather than waited for on a thread, so a cancelled job never
+        takes the lock after giving up on it. Closing the descriptor releases it.
+        """
+        if self.directory is None or fcntl is None:
+            yield
+            return
+        path = self.directory(collection)
+        os.makedirs(path, exist_ok=True)
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(LOCK_POLL_SECONDS)
+            yield
+        finally:
+            os.close(fd)
+    
+    def _record_path(self, collection: str, job_id: str) -> str:
+        return os.path.join(self.directory(collection), JOBS_DIR, f"{job_id}.json")
+    
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+    
+    def _prune_records(self, collection: str):
+        """Remove all but the newest max_finished job records of a collection"""
+        if self.directory is None:
+            return
+        directory = os.path.join(self.directory(collection), JOBS_DIR)
+        try:
+            entries = [entry for entry in os.scandir(directory) if entry.name.endswith(".json")]
+        except FileNotFoundError:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:max(0, len(entries) - self.max_finished)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    
+    def _read_records(self, collection: str) -> List[Dict[str, Any]]:
+        directory = os.path.join(self.directory(collection), JOBS_DIR)
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+        records = (_read_record(os.path.join(directory, name)) for name in names)
+        return [record for record in records if record is not None]
+    
+    def get_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a job run by any process sharing the directories, or None
+        
+        Blocking when the job is not this process's; run it off the event loop.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.get_status()
+        if self.directory is None or not JOB_ID_RE.match(job_id):
+            return None
+        for collection in self.collections():
+            record = _read_record(self._record_path(collection, job_id))
+            if record is not None:
+                return record
+        return None
+    
+    def list_jobs(self, collection: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Status of known jobs, newest first, optionally for one collection
+        
+        Blocking when records are persisted; run it off the event loop.
+        """
+        statuses = {}
+        if self.directory is not None:
+            for name in ([collection] if collection is not None else self.collections()):
+                for record in self._read_records(name):
+                    statuses[record["job_id"]] = record
+        for job in self._jobs.values():
+            if collection is None or job.collection == collection:
+                statuses[job.id] = job.get_status()
+        return sorted(statuses.values(), key=lambda status: status["created_at"], reverse=True)
+
+def _read_record(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as record_file:
+            return json.load(record_file)
+    except FileNotFoundError:
+        return None
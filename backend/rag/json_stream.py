@@ -0,0 +1,207 @@
+import codecs
+import re
+from json.decoder import JSONDecodeError, scanstring
+from typing import Any, Iterator, Tuple
+
+# Parser events, in the spirit of SAX/ijson
+START_MAP = "start_map"
+MAP_KEY = "map_key"
+END_MAP = "end_map"
+START_ARRAY = "start_array"
+END_ARRAY = "end_array"
+SCALAR = "scalar"
+
+NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?")
+NUMBER_CHARS = "0123456789.eE+-"
+MAX_NUMBER_LENGTH = 1024
+WHITESPACE = " \t\n\r"
+LITERALS = {"t": ("true", True), "f": ("false", False), "n": ("null", None)}
+
+# Longest escape a window can cut short: a \uXXXX\uXXXX surrogate pair
+MAX_ESCAPE_LENGTH = 12
+
+# What the parser accepts next
+_VALUE = 0
+_VALUE_OR_END = 1
+_KEY = 2
+_KEY_OR_END = 3
+_COLON = 4
+_COMMA_OR_END = 5
+_DONE = 6
+
+def _cut_escape(error: JSONDecodeError, text: str) -> bool:
+    """Whether a \\u escape error is only the escape running past the end of text"""
+    return error.msg.startswith("Invalid \\uXXXX escape") and error.pos + MAX_ESCAPE_LENGTH > len(text)
+
+class _Buffer:
+    """Sliding text window over a file-like object, refilled on demand"""
+    
+    def __init__(self, stream, buffer_size: int):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+    
+    def fill(self, minimum: int = 0) -> bool:
+        """Append at least one more block (or minimum characters); False at end of input"""
+        if self.eof:
+            return False
+        parts = [self.text[self.pos:]]
+        read = 0
+        while True:
+            data = self.stream.read(max(self.buffer_size, minimum))
+            if not data:
+                self.eof = True
+                parts.append(self.decoder.decode(b"", final=True))
+                break
+            if isinstance(data, bytes):
+                data = self.decoder.decode(data)
+            parts.append(data)
+            read += len(data)
+            if read >= minimum:
+                break
+        self.text = "".join(parts)
+        self.pos = 0
+        return read > 0 or len(parts[-1]) > 0
+    
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it, or '' at end of input"""
+        while True:
+            text, pos = self.text, self.pos
+            while pos < len(text) and text[pos] in WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(text):
+                return text[pos]
+            if not self.fill():
+                return ""
+    
+    def read_string(self) -> str:
+        """Consume a JSON string starting at the current quote"""
+        need = 0
+        while True:
+            try:
+                value, end = scanstring(self.text, self.pos + 1)
+                self.pos = end
+                return value
+            except JSONDecodeError as e:
+                # Only a string cut off by the end of the window is worth more
+                # input; anything else (a raw control character, a bad escape)
+                # is malformed, and reading on would pull in the rest of the file
+                if not (e.msg.startswith("Unterminated string") or _cut_escape(e, self.text)):
+                    raise ValueError(f"{e.msg.removesuffix(' at')} in JSON string near {self.text[self.pos:self.pos + 40]!r}") from None
+                # Unterminated in this window: grow it geometrically and rescan
+                need = max(self.buffer_size, 2 * need, len(self.text) - self.pos)
+                if not self.fill(need):
+                    raise ValueError(f"Unterminated string in JSON input")
+    
+    def read_number(self):
+        """Consume a JSON number, refilling while it may continue past the window"""
+        while True:
+            match = NUMBER_RE.match(self.text, self.pos)
+            end = match.end() if match else self.pos
+            complete = end < len(self.text) and self.text[end] not in NUMBER_CHARS
+            if complete or self.eof or len(self.text) - self.pos > MAX_NUMBER_LENGTH:
+                break
+            self.fill()
+        if not match:
+            raise ValueError(f"Invalid number in JSON input near {self.text[self.pos:self.pos + 20]!r}")
+        self.pos = match.end()
+        integer, fraction, exponent = match.group(0), match.group(1), match.group(2)
+        if fraction or exponent:
+            return float(integer)
+        return int(integer)
+    
+    def read_literal(self):
+        literal, value = LITERALS[self.text[self.pos]]
+        while len(self.text) - self.pos < len(literal) and self.fill():
+            pass
+        if self.text[self.pos:self.pos + len(literal)] != literal:
+            raise ValueError(f"Invalid literal in JSON input near {self.text[self.pos:self.pos + 20]!r}")
+        self.pos += len(literal)
+        return value
+
+def iter_json_events(stream, buffer_size: int = 65536) -> Iterator[Tuple[str, Any]]:
+    """Parse JSON incrementally from a text or binary file-like object
+    
+    Yields (event, value) pairs: (START_MAP, None), (MAP_KEY, key),
+    (END_MAP, None), (START_ARRAY, None), (END_ARRAY, None) and
+    (SCALAR, value) for strings, numbers, booleans and null. Input is read
+    buffer_size characters at a time and nesting is tracked on an explicit
+    stack, so memory does not grow with the document size or depth.
+    Raises ValueError on malformed input.
+    """
+    buf = _Buffer(stream, buffer_size)
+    stack = []  # True for an object, False for an array
+    expect = _VALUE
+    
+    while True:
+        c = buf.peek()
+        if c == "":
+            if expect != _DONE:
+                raise ValueError("Unexpected end of JSON input")
+            return
+        if expect == _DONE:
+            raise ValueError("Extra data after JSON document")
+        
+        if expect == _VALUE or expect == _VALUE_OR_END:
+            if c == "]" and expect == _VALUE_OR_END:
+                buf.pos += 1
+                stack.pop()
+                yield END_ARRAY, None
+            elif c == "{":
+                buf.pos += 1
+                stack.append(True)
+                yield START_MAP, None
+                expect = _KEY_OR_END
+                continue
+            elif c == "[":
+                buf.pos += 1
+                stack.append(False)
+                yield START_ARRAY, None
+                expect = _VALUE_OR_END
+                continue
+            elif c == '"':
+                yield SCALAR, buf.read_string()
+            elif c == "-" or c.isdigit():
+                yield SCALAR, buf.read_number()
+            elif c in LITERALS:
+                yield SCALAR, buf.read_literal()
+            else:
+                raise ValueError(f"Unexpected character {c!r} in JSON input")
+        
+        elif expect == _KEY or expect == _KEY_OR_END:
+            if c == "}" and expect == _KEY_OR_END:
+                buf.pos += 1
+                stack.pop()
+                yield END_MAP, None
+            elif c == '"':
+                yield MAP_KEY, buf.read_string()
+                expect = _COLON
+                continue
+            else:
+                raise ValueError(f"Expected an object key, got {c!r}")
+        
+        elif expect == _COLON:
+            if c != ":":
+                raise ValueError(f"Expected ':', got {c!r}")
+            buf.pos += 1
+            expect = _VALUE
+            continue
+        
+        elif expect == _COMMA_OR_END:
+            in_map = stack[-1]
+            buf.pos += 1
+            if c == ",":
+                expect = _KEY if in_map else _VALUE
+                continue
+            if c == ("}" if in_map else "]"):
+                stack.pop()
+                yield (END_MAP if in_map else END_ARRAY), None
+            else:
+                raise ValueError(f"Expected ',' or a closing bracket, got {c!r}")
+        
+        # A value (scalar or container) just finished
+        expect = _COMMA_OR_END if stack else _DONE
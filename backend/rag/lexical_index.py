@@ -0,0 +1,236 @@
+import math
+import os
+import re
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+import numpy as np
+from rag.ann_index import top_k
+from rag.chunk_store import ChunkStore, _grow, _gather_ranges
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+# Dropped from queries and documents; they carry no lookup intent
+STOPWORDS = frozenset(
+    "a about an and are as at be by can do does for from give has have how i in is it me many much "
+    "of on or our please s show tell the their there this to was we what when where which who whom "
+    "why will with you your".split()
+)
+
+def _stem(token: str) -> str:
+    """Fold plain plurals onto the singular (industries -> industry, employees -> employee)"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, plural-folded word tokens; key path separators and underscores split words"""
+    return [_stem(token) for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+def _parent_path(key_path: str) -> str:
+    return key_path.rsplit(".", 1)[0] if "." in key_path else ""
+
+class LexicalIndex:
+    """BM25 inverted index over the tokenized key path and content of every row
+    
+    Rows mirror VectorStore rows and are kept in step through the same
+    update/move/truncate/invalidate hooks as the vector indexes. Term IDs
+    of each row live back to back in one pool; the postings (CSR arrays of
+    rows and term frequencies per term) are rebuilt lazily on the first
+    search after a change. Searches run on executor threads, so the
+    build happens under a lock and the postings are published last:
+    concurrent first searches wait for one build instead of running it
+    over each other.
+    
+    A leaf rarely names its own subject ("products.0.price: 299.99"), so
+    a row also earns sibling_weight times the BM25 score of the other
+    leaves under the same parent ("products.0.name: CloudSync Pro").
+    """
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75, sibling_weight: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.sibling_weight = sibling_weight
+        self._build_lock = threading.Lock()
+        self._clear()
+    
+    def invalidate(self):
+        """Forget everything; the next search rebuilds from the chunk store"""
+        self._clear()
+        self._stale = True
+    
+    def _clear(self):
+        self._vocabulary: Dict[str, int] = {}
+        self._parent_ids: Dict[str, int] = {}
+        self._size = 0
+        self._pool = np.empty(0, dtype=np.int32)
+        self._pool_used = 0
+        self._starts = np.empty(0, dtype=np.int64)
+        self._lengths = np.empty(0, dtype=np.int32)
+        self._parents = np.empty(0, dtype=np.int32)
+        self._postings = None
+        self._stale = False
+    
+    def update(self, rows: np.ndarray, chunks: List[Dict[str, Any]]):
+        """Rows were added or overwritten with these chunks"""
+        if self._stale:
+            return
+        size = max(self._size, int(rows.max()) + 1) if len(rows) else self._size
+        self._starts = _grow(self._starts, self._size, size)
+        self._lengths = _grow(self._lengths, self._size, size)
+        self._parents = _grow(self._parents, self._size, size)
+        self._size = size
+        for row, chunk in zip(rows.tolist(), chunks):
+            self._write_row(row, chunk["key_path"], chunk["content"])
+        self._postings = None
+    
+    def move(self, src: int, dst: int):
+        if self._stale:
+            return
+        for column in (self._starts, self._lengths, self._parents):
+            column[dst] = column[src]
+        self._postings = None
+    
+    def truncate(self, size: int):
+        if self._stale:
+            return
+        self._size = min(self._size, size)
+        self._postings = None
+    
+    def _write_row(self, row: int, key_path: str, content: str):
+        ids = []
+        for token in tokenize(key_path) + tokenize(content):
+            term_id = self._vocabulary.get(token)
+            if term_id is None:
+                term_id = self._vocabulary[token] = len(self._vocabulary)
+            ids.append(term_id)
+        self._pool = _grow(self._pool, self._pool_used, self._pool_used + len(ids))
+        self._pool[self._pool_used:self._pool_used + len(ids)] = ids
+        self._starts[row] = self._pool_used
+        self._lengths[row] = len(ids)
+        self._pool_used += len(ids)
+        
+        parent = _parent_path(key_path)
+        parent_id = self._parent_ids.get(parent)
+        if parent_id is None:
+            parent_id = self._parent_ids[parent] = len(self._parent_ids)
+        self._parents[row] = parent_id
+    
+    def rebuild(self, store: ChunkStore):
+        """Tokenize every row of a chunk store"""
+        logger.info(f"Building lexical index over {len(store)} chunks")
+        self._clear()
+        rows = np.arange(len(store), dtype=np.int64)
+        for start in range(0, len(store), 65536):
+            batch = rows[start:start + 65536]
+            self.update(batch, [{"key_path": store.key_path(row), "content": store.content(row)} for row in batch.tolist()])
+    
+    def _build_postings(self):
+        size = self._size
+        lengths = self._lengths[:size].astype(np.int64)
+        # Rebuilding is also when dropped rows' terms are compacted away
+        pool = np.array(self._pool[_gather_ranges(self._starts[:size], lengths)])
+        starts = self._starts.copy()
+        starts[:size] = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        self._pool, self._pool_used, self._starts = pool, len(pool), starts
+        
+        # Unique (term, row) pairs with their counts, grouped by term
+        pairs = pool.astype(np.int64) * max(size, 1) + np.repeat(np.arange(size, dtype=np.int64), lengths)
+        pairs, frequencies = np.unique(pairs, return_counts=True)
+        terms = pairs // max(size, 1)
+        offsets = np.zeros(len(self._vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self._vocabulary)), out=offsets[1:])
+        self._postings = {
+            "rows": (pairs % max(size, 1)).astype(np.int64),
+            "frequencies": frequencies.astype(np.float32),
+            "offsets": offsets,
+            "average_length": float(lengths.mean()) if size else 0.0
+        }
+    
+    def prepare(self, store: ChunkStore):
+        """Rebuild if out of step with the store, and build the postings
+        
+        Safe to call from several threads: one builds, the others wait.
+        """
+        if self._ready(store):
+            return
+        with self._build_lock:
+            if self._stale or self._size != len(store):
+                self.rebuild(store)
+            if self._postings is None and self._size:
+                self._build_postings()
+    
+    def _ready(self, store: ChunkStore) -> bool:
+        # The postings are set last, so a half-built index never reads as ready
+        return not self._stale and self._size == len(store) and (self._postings is not None or not self._size)
+    
+    def search(self, store: ChunkStore, query: str, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (rows, scores, coverage) of the k best rows for query
+        
+        coverage is the IDF-weighted fraction of the query terms found in
+        the row or its siblings: 1.0 means every term matched, terms that
+        occur nowhere in the knowledge base pull it down.
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32))
+        terms = list(dict.fromkeys(tokenize(query)))
+        self.prepare(store)
+        if not terms or not self._size:
+            return empty
+        
+        size = self._size
+        postings = self._postings
+        lengths = self._lengths[:size]
+        norms = self.k1 * (1 - self.b + self.b * lengths / max(postings["average_length"], 1e-9))
+        scores = np.zeros(size, dtype=np.float32)
+        weights = []
+        matched = []
+        for term in terms:
+            term_id = self._vocabulary.get(term)
+            start, end = (postings["offsets"][term_id], postings["offsets"][term_id + 1]) if term_id is not None else (0, 0)
+            idf = math.log(1 + (size - (end - start) + 0.5) / ((end - start) + 0.5))
+            weights.append(idf)
+            if end == start:
+                matched.append(None)
+                continue
+            rows = postings["rows"][start:end]
+            frequencies = postings["frequencies"][start:end]
+            scores[rows] += idf * frequencies * (self.k1 + 1) / (frequencies + norms[rows])
+            matched.append(rows)
+        
+        if self.sibling_weight:
+            parents = self._parents[:size]
+            group = np.bincount(parents, weights=scores, minlength=len(self._parent_ids))
+            scores += self.sibling_weight * (group[parents] - scores).astype(np.float32)
+        
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) == 0:
+            return empty
+        best = candidates[top_k(scores[candidates], k)]
+        
+        # With sibling evidence, a term counts as found if any sibling has it
+        covered = np.zeros(len(best), dtype=np.float64)
+        for weight, rows in zip(weights, matched):
+            if rows is None:
+                continue
+            if self.sibling_weight:
+                covered += weight * np.isin(self._parents[best], self._parents[rows])
+            else:
+                covered += weight * np.isin(best, rows)
+        return best, scores[best], covered / sum(weights)
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "type": "bm25",
+            "built": not self._stale,
+            "terms": len(self._vocabulary),
+            "sibling_weight": self.sibling_weight
+        }
+
+def create_lexical_index() -> Optional[LexicalIndex]:
+    """Lexical index for hybrid search, or None when HYBRID_SEARCH is off"""
+    if os.getenv("HYBRID_SEARCH", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return LexicalIndex(sibling_weight=float(os.getenv("LEXICAL_SIBLING_WEIGHT", "0.5")))
@@ -0,0 +1,82 @@
+import asyncio
+import contextvars
+from typing import List, Dict, Any, Callable, Awaitable, Generic, Optional, TypeVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+class MicroBatcher(Generic[Item, Result]):
+    """Groups concurrent async calls into batches for one batch function
+    
+    The first call to arrive opens a collection window of window_ms; every
+    call made before it closes joins the batch, which then runs as one
+    run_batch(items) call. A batch that reaches max_batch items runs at
+    once. A lone call therefore waits at most window_ms longer than it
+    would unbatched, and nothing waits for more than one window.
+    
+    run_batch returns one result per item, in order; if it raises, every
+    call in the batch raises that error.
+    """
+    
+    def __init__(self, run_batch: Callable[[List[Item]], Awaitable[List[Result]]],
+                 window_ms: float = 2.0, max_batch: int = 32, name: str = "batch"):
+        self.run_batch = run_batch
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.name = name
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Running batches, referenced so they are not garbage collected mid-flight
+        self._running = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+    
+    async def submit(self, item: Item) -> Result:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+    
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # A batch serves many requests, so it runs outside any one request's trace
+            task = asyncio.get_running_loop().create_task(self._run(batch), context=contextvars.Context())
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+    
+    async def _run(self, batch: List[tuple]):
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            logger.warning(f"{self.name} batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "mean_batch": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch
+        }
@@ -0,0 +1,210 @@
+import sys
+from typing import List, Dict, Any, Optional
+import logging
+import numpy as np
+from rag.chunk_store import ChunkStore, _grow
+
+logger = logging.getLogger(__name__)
+
+ROOT = 0
+
+class PathIndex:
+    """Trie over the dotted key paths of the stored chunks
+    
+    One node per key-path segment; a node that ends a stored key path
+    records its row. Exact lookups walk one node per segment, and every
+    node keeps the number of leaves below it, so subtree sizes are known
+    without walking them. Children are kept in insertion order, which is
+    document order for a fresh upload.
+    
+    Rows mirror VectorStore rows and are kept in step through the same
+    update/move/truncate/invalidate hooks as the other indexes; emptied
+    branches are pruned as rows go away.
+    """
+    
+    def __init__(self):
+        self._clear()
+    
+    def invalidate(self):
+        """Forget everything; rebuild() must run before the next lookup"""
+        self._clear()
+        self.stale = True
+    
+    def _clear(self):
+        self._names: List[Optional[str]] = [None]
+        self._children: List[Optional[Dict[str, int]]] = [None]
+        self._node_count = 1
+        self._free_nodes: List[int] = []
+        self._parents = np.full(1, -1, dtype=np.int64)
+        self._node_rows = np.full(1, -1, dtype=np.int64)
+        self._leaf_counts = np.zeros(1, dtype=np.int64)
+        self._row_nodes = np.empty(0, dtype=np.int64)
+        self._size = 0
+        self.stale = False
+    
+    def rebuild(self, store: ChunkStore):
+        """Insert the key path of every row of a chunk store"""
+        logger.info(f"Building key-path index over {len(store)} chunks")
+        self._clear()
+        rows = np.arange(len(store), dtype=np.int64)
+        self.update(rows, [{"key_path": store.key_path(row)} for row in rows.tolist()])
+    
+    def update(self, rows: np.ndarray, chunks: List[Dict[str, Any]]):
+        """Rows were added or overwritten with these chunks"""
+        if self.stale:
+            return
+        size = max(self._size, int(rows.max()) + 1) if len(rows) else self._size
+        if size > self._size:
+            self._row_nodes = _grow(self._row_nodes, self._size, size)
+            self._row_nodes[self._size:size] = -1
+            self._size = size
+        for row, chunk in zip(rows.tolist(), chunks):
+            node = self._find(chunk["key_path"])
+            if node is not None and node == self._row_nodes[row]:
+                continue  # same key path: keep its place in document order
+            self._remove_row(row)
+            self._insert(row, chunk["key_path"])
+    
+    def move(self, src: int, dst: int):
+        """Row src was moved to row dst, replacing it"""
+        if self.stale:
+            return
+        self._remove_row(dst)
+        node = int(self._row_nodes[src])
+        self._row_nodes[src] = -1
+        self._row_nodes[dst] = node
+        if node >= 0:
+            self._node_rows[node] = dst
+    
+    def truncate(self, size: int):
+        """Rows from size onwards were dropped"""
+        if self.stale:
+            return
+        for row in range(size, self._size):
+            self._remove_row(row)
+        self._size = min(self._size, size)
+    
+    def _insert(self, row: int, key_path: str):
+        node = ROOT
+        for segment in key_path.split("."):
+            children = self._children[node]
+            if children is None:
+                children = self._children[node] = {}
+            child = children.get(segment)
+            if child is None:
+                child = children[segment] = self._new_node(node, segment)
+            node = child
+        # A duplicated key path keeps its last row, as a dict would
+        previous = int(self._node_rows[node])
+        if previous >= 0:
+            self._row_nodes[previous] = -1
+        else:
+            self._add_leaf_count(node, 1)
+        self._node_rows[node] = row
+        self._row_nodes[row] = node
+    
+    def _new_node(self, parent: int, segment: str) -> int:
+        if self._free_nodes:
+            node = self._free_nodes.pop()
+        else:
+            node = self._node_count
+            self._node_count += 1
+            self._parents = _grow(self._parents, node, node + 1)
+            self._node_rows = _grow(self._node_rows, node, node + 1)
+            self._leaf_counts = _grow(self._leaf_counts, node, node + 1)
+            self._names.append(None)
+            self._children.append(None)
+        self._names[node] = sys.intern(segment)
+        self._children[node] = None
+        self._parents[node] = parent
+        self._node_rows[node] = -1
+        self._leaf_counts[node] = 0
+        return node
+    
+    def _remove_row(self, row: int):
+        node = int(self._row_nodes[row])
+        if node < 0:
+            return
+        self._row_nodes[row] = -1
+        self._node_rows[node] = -1
+        self._add_leaf_count(node, -1)
+        # Prune the branch up to the first node still in use
+        while node != ROOT and self._node_rows[node] < 0 and not self._children[node]:
+            parent = int(self._parents[node])
+            del self._children[parent][self._names[node]]
+            self._names[node] = None
+            self._children[node] = None
+            self._free_nodes.append(node)
+            node = parent
+    
+    def _add_leaf_count(self, node: int, delta: int):
+        while node >= 0:
+            self._leaf_counts[node] += delta
+            node = int(self._parents[node])
+    
+    def _find(self, key_path: str) -> Optional[int]:
+        node = ROOT
+        for segment in key_path.split("."):
+            children = self._children[node]
+            node = children.get(segment) if children else None
+            if node is None:
+                return None
+        return node
+    
+    def lookup(self, key_path: str) -> Optional[int]:
+        """Row stored under exactly this key path, or None"""
+        node = self._find(key_path)
+        if node is None or self._node_rows[node] < 0:
+            return None
+        return int(self._node_rows[node])
+    
+    def count(self, prefix: str) -> int:
+        """Number of rows at or below a key-path prefix ("" is everything)"""
+        node = ROOT if prefix == "" else self._find(prefix)
+        return 0 if node is None else int(self._leaf_counts[node])
+    
+    def subtree(self, prefix: str, limit: Optional[int] = None) -> List[int]:
+        """Rows at or below a key-path prefix, in document order ("" is everything)"""
+        node = ROOT if prefix == "" else self._find(prefix)
+        return [] if node is None else self._subtree_rows(node, limit)
+    
+    def siblings(self, key_path: str) -> List[int]:
+        """Rows of the other leaves directly under the same parent"""
+        node = self._find(key_path)
+        if node is None:
+            return []
+        children = self._children[int(self._parents[node])]
+        return [int(self._node_rows[child]) for child in children.values()
+                if child != node and self._node_rows[child] >= 0]
+    
+    def parent_subtree(self, key_path: str, max_rows: int) -> List[int]:
+        """Rows of the object that contains key_path, if it has at most max_rows leaves
+        
+        The top level is never expanded: its "object" is the whole knowledge base.
+        """
+        node = self._find(key_path)
+        if node is None:
+            return []
+        parent = int(self._parents[node])
+        if parent == ROOT or self._leaf_counts[parent] > max_rows:
+            return []
+        return self._subtree_rows(parent, None)
+    
+    def _subtree_rows(self, node: int, limit: Optional[int]) -> List[int]:
+        rows = []
+        stack = [node]
+        while stack and (limit is None or len(rows) < limit):
+            node = stack.pop()
+            if self._node_rows[node] >= 0:
+                rows.append(int(self._node_rows[node]))
+            children = self._children[node]
+            if children:
+                stack.extend(reversed(list(children.values())))
+        return rows
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "built": not self.stale,
+            "nodes": self._node_count - len(self._free_nodes),
+            "leaves": int(self._leaf_counts[ROOT])
+        }
@@ -0,0 +1,241 @@
+import abc
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+import numpy as np
+from rag.ann_index import FlatIndex, top_k, score, ASSIGN_BLOCK_ROWS
+
+logger = logging.getLogger(__name__)
+
+# Rows decoded per block when scoring product-quantized codes
+PQ_BLOCK_ROWS = 16384
+
+def _kmeans(sample: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Euclidean k-means on the rows of sample; returns (k, dim) centroids"""
+    centroids = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        distances = (centroids ** 2).sum(axis=1) - 2 * sample @ centroids.T
+        labels = np.argmin(distances, axis=1)
+        counts = np.bincount(labels, minlength=k)
+        # Per-cluster sums: sort rows by cluster, then add up each contiguous run
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        empty = counts == 0
+        centroids[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0) / counts[~empty, None]
+        # Re-seed empty clusters with random sample points
+        centroids[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+    return centroids
+
+class QuantizedIndex(FlatIndex, abc.ABC):
+    """Two-pass search over compressed copies of the rows
+    
+    A first pass scores every row from its compact code, then the best
+    rerank rows are re-scored exactly against the full-precision matrix.
+    Only the shortlist rows of that matrix are read per query, so it can
+    stay memory-mapped on disk (see VectorStore.load) while the codes are
+    the resident, bandwidth-bound part of search.
+    
+    Like IVFIndex, the quantizer is trained lazily on the first search on
+    a sample of at most train_size rows, incremental updates are encoded
+    with the existing quantizer, and it retrains once the store has grown
+    retrain_growth times past its training size. Below min_rows rows it
+    searches exactly. Training builds the quantizer and codes into locals
+    under a lock and publishes them before setting `trained`, so a search
+    never pairs codes with a quantizer they were not encoded by.
+    
+    Subclasses define the quantizer: _fit returns its parameters, which
+    are passed back to _encode and _approximate_scores.
+    """
+    
+    def __init__(self, rerank: int = 200, train_size: int = 100000, min_rows: int = 10000,
+                 retrain_growth: float = 4.0, seed: int = 0):
+        self.rerank = rerank
+        self.train_size = train_size
+        self.min_rows = min_rows
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+        self._build_lock = threading.Lock()
+        self.invalidate()
+    
+    def invalidate(self):
+        self.trained = False
+        self.quantizer = None
+        self.codes = None
+        self._trained_rows = 0
+        self._size = 0
+    
+    def update(self, embeddings: np.ndarray, rows: np.ndarray):
+        if not self.trained:
+            return
+        size = max(self._size, int(rows.max()) + 1) if len(rows) else self._size
+        if size > self.retrain_growth * self._trained_rows:
+            self.invalidate()
+            return
+        if size > len(self.codes):
+            grown = np.empty((max(size, len(self.codes) * 3 // 2),) + self.codes.shape[1:], dtype=self.codes.dtype)
+            grown[:self._size] = self.codes[:self._size]
+            self.codes = grown
+        self._size = size
+        self.codes[rows] = self._encode(self.quantizer, embeddings[rows].astype(np.float32, copy=False))
+    
+    def move(self, src: int, dst: int):
+        if self.trained:
+            self.codes[dst] = self.codes[src]
+    
+    def truncate(self, size: int):
+        if self.trained:
+            self._size = min(self._size, size)
+    
+    def prepare(self, embeddings: np.ndarray):
+        """Train if out of step with embeddings; safe from several threads"""
+        if len(embeddings) < self.min_rows or self._ready(embeddings):
+            return
+        with self._build_lock:
+            if not self._ready(embeddings):
+                self.train(embeddings)
+    
+    def _ready(self, embeddings: np.ndarray) -> bool:
+        return self.trained and self._size == len(embeddings)
+    
+    def search_batch(self, embeddings: np.ndarray, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        return [self.search(embeddings, query, k) for query in queries]
+    
+    def search(self, embeddings: np.ndarray, query: np.ndarray, k: int, rerank: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if len(embeddings) < self.min_rows:
+            return super().search(embeddings, query, k)
+        self.prepare(embeddings)
+        
+        approximate = self._approximate_scores(self.quantizer, self.codes[:self._size], query)
+        # Sorted shortlist rows keep the re-rank reads in file order
+        shortlist = np.sort(top_k(approximate, max(k, rerank or self.rerank)))
+        scores = embeddings[shortlist].astype(np.float32, copy=False) @ query
+        best = top_k(scores, k)
+        return shortlist[best], scores[best]
+    
+    def train(self, embeddings: np.ndarray):
+        """Fit the quantizer on a sample and encode every row
+        
+        Call through prepare() once the index serves searches.
+        """
+        n = len(embeddings)
+        rng = np.random.default_rng(self.seed)
+        sample_rows = np.sort(rng.choice(n, size=min(n, self.train_size), replace=False))
+        sample = np.ascontiguousarray(embeddings[sample_rows], dtype=np.float32)
+        logger.info(f"Training {self.name} quantizer on {len(sample)} of {n} rows")
+        quantizer = self._fit(sample, rng)
+        
+        codes = None
+        for start in range(0, n, ASSIGN_BLOCK_ROWS):
+            block = self._encode(quantizer, embeddings[start:start + ASSIGN_BLOCK_ROWS].astype(np.float32, copy=False))
+            if codes is None:
+                codes = np.empty((n,) + block.shape[1:], dtype=block.dtype)
+            codes[start:start + len(block)] = block
+        self.trained = False
+        self.quantizer = quantizer
+        self.codes = codes
+        self._trained_rows = n
+        self._size = n
+        self.trained = True
+    
+    @abc.abstractmethod
+    def _fit(self, sample: np.ndarray, rng: np.random.Generator) -> Any:
+        """Train the quantizer on a float32 sample and return its parameters"""
+    
+    @abc.abstractmethod
+    def _encode(self, quantizer: Any, vectors: np.ndarray) -> np.ndarray:
+        """Codes of float32 vectors, one row each"""
+    
+    @abc.abstractmethod
+    def _approximate_scores(self, quantizer: Any, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate dot product of the query with the row behind every code"""
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "type": self.name,
+            "trained": self.trained,
+            "rerank": self.rerank,
+            "code_bytes": int(self.codes[:self._size].nbytes) if self.trained else 0
+        }
+
+class Int8Index(QuantizedIndex):
+    """Scalar quantization: every dimension mapped linearly onto int8
+    
+    Each dimension gets its own range, taken from the training sample, so
+    codes are 4x smaller than float32 rows. The first pass is one
+    matrix-vector product over the codes with a rescaled query.
+    """
+    
+    name = "int8"
+    
+    def _fit(self, sample: np.ndarray, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-dimension (low, scale)"""
+        low = sample.min(axis=0)
+        scale = (sample.max(axis=0) - low) / 255.0
+        scale[scale == 0] = 1.0
+        return low, scale
+    
+    def _encode(self, quantizer: Tuple[np.ndarray, np.ndarray], vectors: np.ndarray) -> np.ndarray:
+        low, scale = quantizer
+        codes = np.rint((vectors - low) / scale) - 128.0
+        return np.clip(codes, -128, 127).astype(np.int8)
+    
+    def _approximate_scores(self, quantizer: Tuple[np.ndarray, np.ndarray], codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # x ~= low + (code + 128) * scale, so x . q = code . (q * scale) + a constant per query
+        _, scale = quantizer
+        return score(codes, (query * scale).astype(np.float32))
+
+class PQIndex(QuantizedIndex):
+    """Product quantization: one byte per group of dimensions
+    
+    Rows are split into n_subspaces groups of dimensions and each group is
+    replaced by the nearest of 256 k-means centroids, so a 1536-dim row
+    with 96 subspaces takes 96 bytes instead of 6 KB. The first pass adds
+    up per-subspace query/centroid dot products from a lookup table.
+    """
+    
+    name = "pq"
+    
+    def __init__(self, n_subspaces: int = 96, iterations: int = 10, **kwargs):
+        self.n_subspaces = n_subspaces
+        self.iterations = iterations
+        # About 39 training rows per centroid is enough for 256 centroids,
+        # and keeps the lazy training on the first search short
+        kwargs.setdefault("train_size", 10000)
+        super().__init__(**kwargs)
+    
+    def _fit(self, sample: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """(n_subspaces, k, width) codebooks"""
+        dimension = sample.shape[1]
+        if dimension % self.n_subspaces:
+            raise ValueError(f"PQ subspaces ({self.n_subspaces}) must divide the embedding dimension ({dimension})")
+        width = dimension // self.n_subspaces
+        k = min(256, len(sample))
+        return np.stack([
+            _kmeans(sample[:, j * width:(j + 1) * width], k, self.iterations, rng)
+            for j in range(self.n_subspaces)
+        ]).astype(np.float32)
+    
+    def _encode(self, codebooks: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        width = codebooks.shape[2]
+        codes = np.empty((len(vectors), self.n_subspaces), dtype=np.uint8)
+        for j, codebook in enumerate(codebooks):
+            sub = vectors[:, j * width:(j + 1) * width]
+            distances = (codebook ** 2).sum(axis=1) - 2 * sub @ codebook.T
+            codes[:, j] = np.argmin(distances, axis=1)
+        return codes
+    
+    def _approximate_scores(self, codebooks: np.ndarray, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        width = codebooks.shape[2]
+        # table[j, c] = query subvector j . centroid c of subspace j, flattened
+        table = np.einsum("jcw,jw->jc", codebooks, query.reshape(self.n_subspaces, width)).ravel()
+        offsets = np.arange(self.n_subspaces, dtype=np.int32) * codebooks.shape[1]
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), PQ_BLOCK_ROWS):
+            block = codes[start:start + PQ_BLOCK_ROWS]
+            scores[start:start + len(block)] = table[block + offsets].sum(axis=1)
+        return scores
+    
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status["n_subspaces"] = self.n_subspaces
+        return status
@@ -0,0 +1,160 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+import numpy as np
+from rag.chunk_store import _grow
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(query: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!. ").lower()
+
+class ResponseCache:
+    """Cache of generated answers in front of the LLM
+    
+    Two tiers share one set of entries:
+    - exact: keyed on the normalized query plus the IDs of the retrieved
+      chunks, so the same question over the same context is answered once;
+    - semantic: a new query whose embedding has cosine similarity of at
+      least similarity_threshold with a cached query reuses its answer.
+    
+    Entries expire after ttl_seconds and the least recently used entry is
+    evicted beyond max_entries. Everything is dropped when the knowledge
+    base version changes. Query embeddings live in one matrix that grows
+    with the entries, up to max_entries rows, and is released on a clear.
+    """
+    
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600.0,
+                 similarity_threshold: float = 0.95, dimension: int = 1536):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self.dimension = dimension
+        self._reset_slots()
+        self._version = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+    
+    def memory_bytes(self) -> int:
+        """Bytes of the rows allocated for cached query embeddings"""
+        return self._vectors.nbytes
+    
+    def _reset_slots(self):
+        # Query embeddings of live entries, one slot (row) per entry; rows
+        # past len(self._slot_keys) are not allocated to any entry yet
+        self._vectors = np.empty((0, self.dimension), dtype=np.float32)
+        self._slot_keys: List[Optional[Tuple]] = []
+        self._free_slots: List[int] = []
+    
+    @staticmethod
+    def make_key(query: str, chunk_ids) -> Tuple:
+        """Exact-tier key: normalized query and the set of retrieved chunk IDs"""
+        return (normalize_query(query), tuple(sorted(chunk_ids)))
+    
+    def sync_version(self, version: int):
+        """Drop every entry if the knowledge base changed since they were cached"""
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    logger.info(f"Knowledge base version changed ({self._version} -> {version}), clearing response cache")
+                self._clear()
+                self._version = version
+    
+    def get_exact(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """Cached result for an exact key, or None"""
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.exact_hits += 1
+            return entry["result"]
+    
+    def get_similar(self, query_embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Cached result for the most similar cached query above the threshold, or None
+        
+        Misses are not counted here; a semantic miss is followed by an
+        exact lookup that records the outcome.
+        """
+        with self._lock:
+            if not self._entries or not self._slot_keys:
+                return None
+            scores = self._vectors[:len(self._slot_keys)] @ query_embedding
+            while True:
+                slot = int(np.argmax(scores))
+                if scores[slot] < self.similarity_threshold or self._slot_keys[slot] is None:
+                    return None
+                entry = self._live(self._slot_keys[slot])
+                if entry is not None:
+                    self.semantic_hits += 1
+                    return entry["result"]
+                # Expired and removed by _live; look at the next best slot
+                scores[slot] = -np.inf
+    
+    def put(self, key: Tuple, query_embedding: Optional[np.ndarray], result: Dict[str, Any], version: int):
+        """Cache a result under key (and its query embedding for the semantic tier)
+        
+        version is the knowledge base version the result was computed from;
+        results computed before a knowledge base change are discarded.
+        """
+        with self._lock:
+            if version != self._version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+            slot = None
+            if query_embedding is not None:
+                slot = self._new_slot()
+                self._vectors[slot] = query_embedding
+                self._slot_keys[slot] = key
+            self._entries[key] = {"result": result, "created": time.monotonic(), "slot": slot}
+    
+    def _live(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["created"] > self.ttl_seconds:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+    
+    def _remove(self, key: Tuple):
+        entry = self._entries.pop(key)
+        if entry["slot"] is not None:
+            self._vectors[entry["slot"]] = 0.0
+            self._slot_keys[entry["slot"]] = None
+            self._free_slots.append(entry["slot"])
+    
+    def _new_slot(self) -> int:
+        if self._free_slots:
+            return self._free_slots.pop()
+        slot = len(self._slot_keys)
+        self._vectors = _grow(self._vectors, slot, slot + 1, self.max_entries)
+        self._slot_keys.append(None)
+        return slot
+    
+    def _clear(self):
+        self._entries.clear()
+        self._reset_slots()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+            }
@@ -1,58 +1,224 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, AsyncIterator, Optional
+import os
 import logging
+import numpy as np
 from rag.vector_store import VectorStore
+from rag.response_cache import ResponseCache
+from rag.context_packer import ContextPacker, answer_token_limit
+from rag.session_store import ChatSession, with_conversation
 from aws.bedrock_client import BedrockClient
+from metrics import CONTEXT_TOKENS, SESSION_EMBEDDING_REUSES, span
 
 logger = logging.getLogger(__name__)
 
 class RAGPipeline:
-    def __init__(self, vector_store: VectorStore, bedrock_client: BedrockClient):
+    def __init__(self, vector_store: VectorStore, bedrock_client: BedrockClient,
+                 response_cache: Optional[ResponseCache] = None, cache_size: Optional[int] = None):
         self.vector_store = vector_store
         self.bedrock_client = bedrock_client
+        
+        # Response cache in front of generation; RESPONSE_CACHE_SIZE=0 disables it
+        if cache_size is None:
+            cache_size = int(os.getenv('RESPONSE_CACHE_SIZE', '1000'))
+        if response_cache is None and cache_size > 0:
+            response_cache = ResponseCache(
+                max_entries=cache_size,
+                ttl_seconds=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+                similarity_threshold=float(os.getenv('RESPONSE_CACHE_THRESHOLD', '0.95')),
+                dimension=vector_store.dimension
+            )
+        self.response_cache = response_cache
+        self.top_k = int(os.getenv('RETRIEVAL_TOP_K', '5'))
+        # Hits are widened to parent objects of at most this many leaves; 0 disables it
+        self.context_expansion = int(os.getenv('CONTEXT_EXPANSION_MAX_LEAVES', '12'))
+        # Context is grouped, deduplicated and cut to CONTEXT_TOKEN_BUDGET; 0 sends every entry as is
+        token_budget = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))
+        self.context_packer = ContextPacker(
+            token_budget=token_budget,
+            dedupe_threshold=float(os.getenv('CONTEXT_DEDUP_THRESHOLD', '0.9'))
+        ) if token_budget > 0 else None
+        # Answers get between GENERATION_MIN_TOKENS and GENERATION_MAX_TOKENS, sized to the question
+        self.min_answer_tokens = int(os.getenv('GENERATION_MIN_TOKENS', '256'))
+        self.max_answer_tokens = int(os.getenv('GENERATION_MAX_TOKENS', '1000'))
+        # Weight of the earlier turns' blended query embedding when searching for a follow-up
+        self.session_context_weight = float(os.getenv('SESSION_CONTEXT_WEIGHT', '0.5'))
         logger.info("RAG Pipeline initialized")
     
-    async def process_query(self, query: str) -> Tuple[str, List[Dict[str, Any]], float]:
-        """Process query using RAG pipeline"""
-        logger.info(f"RAG pipeline processing query: '{query[:50]}{'...' if len(query) > 50 else ''}'")
+    async def process_query(self, query: str, session: Optional[ChatSession] = None) -> Tuple[str, List[Dict[str, Any]], float]:
+        """Process query using RAG pipeline, as the next turn of session if given"""
+        logger.info("RAG pipeline processing query: %r", query[:50])
+        conversation = session.conversation() if session is not None else ""
         
         # Retrieve relevant documents
-        logger.info("Retrieving relevant documents from vector store...")
-        sources = self.vector_store.search(query, top_k=5)
-        logger.info(f"Retrieved {len(sources)} sources from vector store")
+        logger.debug("Retrieving relevant documents from vector store...")
+        version = self.vector_store.version
+        with span("retrieval"):
+            query_embedding, sources, cache_key, cached = await self._retrieve(query, session)
+        if cached is not None:
+            logger.info("Response served from response cache")
+            return cached["response"], cached["sources"], cached["confidence"]
+        logger.info("Retrieved %d sources from vector store", len(sources))
         
         if not sources:
             logger.warning("No relevant sources found, using direct generation")
             # No relevant sources found, use direct generation
-            response = await self.bedrock_client.generate_response(query)
+            response = await self.bedrock_client.generate_response(with_conversation(query, conversation))
+            self._cache_result(cache_key, query_embedding, version, response, [], 0.5)
             return response, [], 0.5
         
         # Build context from sources
-        logger.info("Building context from retrieved sources...")
-        context = self._build_context(sources)
-        logger.info(f"Context built with {len(sources)} sources, length: {len(context)} characters")
+        logger.debug("Building context from retrieved sources...")
+        with span("context_build"):
+            context, max_tokens = await self._pack_context(query, sources)
+        logger.debug("Context built with %d sources, length: %d characters", len(sources), len(context))
         
         # Calculate confidence based on source relevance
-        logger.info("Calculating confidence score...")
         confidence = self._calculate_confidence(sources)
-        logger.info(f"Confidence calculated: {confidence:.3f}")
         
         # Generate response with context
-        logger.info("Generating response with context...")
-        response = await self._generate_with_context(query, context, sources)
-        logger.info(f"Response generated, length: {len(response)} characters")
+        response = await self._generate_with_context(query, context, sources, max_tokens, conversation)
+        logger.info("Response generated, length: %d characters, confidence: %.3f", len(response), confidence)
         
+        self._cache_result(cache_key, query_embedding, version, response, sources, confidence)
         return response, sources, confidence
     
+    async def process_query_stream(self, query: str, session: Optional[ChatSession] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Process query using RAG pipeline, streaming the answer
+        
+        Yields a "sources" event (with confidence) as soon as retrieval is
+        done, then one "token" event per generated text delta. If generation
+        fails, GenerationError is raised and nothing is cached.
+        """
+        logger.info("RAG pipeline streaming query: %r", query[:50])
+        conversation = session.conversation() if session is not None else ""
+        
+        version = self.vector_store.version
+        with span("retrieval"):
+            query_embedding, sources, cache_key, cached = await self._retrieve(query, session)
+        if cached is not None:
+            logger.info("Response served from response cache")
+            yield {"type": "sources", "sources": cached["sources"], "confidence": cached["confidence"]}
+            yield {"type": "token", "text": cached["response"]}
+            return
+        logger.info("Retrieved %d sources from vector store", len(sources))
+        
+        if not sources:
+            logger.warning("No relevant sources found, using direct generation")
+            confidence = 0.5
+            prompt = with_conversation(query, conversation)
+            max_tokens = self.max_answer_tokens
+        else:
+            confidence = self._calculate_confidence(sources)
+            with span("context_build"):
+                context, max_tokens = await self._pack_context(query, sources)
+                prompt = self._build_prompt(query, context, conversation)
+        yield {"type": "sources", "sources": sources, "confidence": confidence}
+        
+        parts = []
+        async for text in self.bedrock_client.generate_response_stream(prompt, max_tokens):
+            parts.append(text)
+            yield {"type": "token", "text": text}
+        self._cache_result(cache_key, query_embedding, version, "".join(parts), sources, confidence)
+    
+    async def _retrieve(self, query: str, session: Optional[ChatSession] = None) -> Tuple[Optional[np.ndarray], List[Dict[str, Any]], Optional[Tuple], Optional[Dict[str, Any]]]:
+        """Retrieve sources for query, consulting the response cache
+        
+        Returns (query_embedding, sources, cache_key, cached_result). The
+        semantic tier is checked before retrieval and the exact tier (keyed
+        on the retrieved chunk IDs) after it; cached_result is None on a miss.
+        Lookups answered by the lexical fast path have no query embedding and
+        only use the exact tier.
+        """
+        if session is not None:
+            return await self._retrieve_in_session(query, session)
+        if self.response_cache is None:
+            return None, await self.vector_store.asearch(query, top_k=self.top_k), None, None
+        
+        self.response_cache.sync_version(self.vector_store.version)
+        query_embedding = None
+        sources = await self.vector_store.alexical_lookup(query, top_k=self.top_k)
+        if sources is None:
+            query_embedding = await self.vector_store.aembed_query(query)
+            cached = self.response_cache.get_similar(query_embedding)
+            if cached is not None:
+                return query_embedding, cached["sources"], None, cached
+            sources = await self.vector_store.asearch_by_vector(query_embedding, top_k=self.top_k, query=query)
+        
+        cache_key = ResponseCache.make_key(query, [source["key_path"] for source in sources])
+        return query_embedding, sources, cache_key, self.response_cache.get_exact(cache_key)
+    
+    async def _retrieve_in_session(self, query: str, session: ChatSession) -> Tuple[Optional[np.ndarray], List[Dict[str, Any]], Optional[Tuple], Optional[Dict[str, Any]]]:
+        """Retrieval for a turn of a session
+        
+        The first turn is retrieved like a stateless query, response cache
+        included. Follow-ups bypass the cache, since their answer depends
+        on the conversation, and the lexical fast path, since "and its
+        warranty?" names no product. They are searched with their query
+        embedding blended into the session's context embedding (weight
+        SESSION_CONTEXT_WEIGHT for the earlier turns), with the previous
+        question added to the BM25 side; a question already asked in the
+        session reuses its embedding.
+        """
+        if not session.has_history():
+            query_embedding, sources, cache_key, cached = await self._retrieve(query)
+            if query_embedding is not None:
+                session.remember_embedding(query, query_embedding)
+                session.context_embedding = query_embedding
+            return query_embedding, sources, cache_key, cached
+        
+        query_embedding = session.cached_embedding(query)
+        if query_embedding is not None:
+            SESSION_EMBEDDING_REUSES.labels().inc()
+        else:
+            query_embedding = await self.vector_store.aembed_query(query)
+            session.remember_embedding(query, query_embedding)
+        search_embedding = query_embedding
+        if session.context_embedding is not None and self.session_context_weight > 0:
+            blended = query_embedding + self.session_context_weight * session.context_embedding
+            norm = np.linalg.norm(blended)
+            if norm > 0:
+                search_embedding = (blended / norm).astype(np.float32)
+        session.context_embedding = search_embedding
+        
+        lexical_query = f"{session.turns[-1]['user']} {query}" if session.turns else query
+        sources = await self.vector_store.asearch_by_vector(search_embedding, top_k=self.top_k, query=lexical_query)
+        return query_embedding, sources, None, None
+    
+    def _cache_result(self, cache_key: Optional[Tuple], query_embedding: Optional[np.ndarray], version: int,
+                      response: str, sources: List[Dict[str, Any]], confidence: float):
+        """Store a generated answer, unless caching is off or generation failed"""
+        if self.response_cache is None or cache_key is None or self.bedrock_client.is_error_response(response):
+            return
+        self.response_cache.put(cache_key, query_embedding, {
+            "response": response,
+            "sources": sources,
+            "confidence": confidence
+        }, version)
+    
+    async def _context_entries(self, sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Sources as put in the prompt: expanded to their parent objects unless disabled"""
+        if self.context_expansion <= 0:
+            return sources
+        return await self.vector_store.aexpand_sources(sources, self.context_expansion)
+    
+    async def _pack_context(self, query: str, sources: List[Dict[str, Any]]) -> Tuple[str, int]:
+        """Prompt context for sources and the max_tokens to generate with"""
+        entries = await self._context_entries(sources)
+        if self.context_packer is None:
+            context, groups = self._build_context(entries), len(entries)
+        else:
+            context, stats = self.context_packer.pack(sources, entries)
+            groups = stats["groups"]
+            CONTEXT_TOKENS.labels().observe(stats["tokens"])
+        return context, answer_token_limit(query, groups, self.min_answer_tokens, self.max_answer_tokens)
+    
     def _build_context(self, sources: List[Dict[str, Any]]) -> str:
         """Build context string from retrieved sources"""
-        logger.info(f"Building context from {len(sources)} sources...")
         context_parts = []
         for i, source in enumerate(sources, 1):
             context_parts.append(f"{i}. {source['key_path']}: {source['content']}")
-            logger.info(f"Added source {i}: {source['key_path']}")
-        context = "\n".join(context_parts)
-        logger.info(f"Context built successfully, {len(context_parts)} parts")
-        return context
+            logger.debug("Added source %d: %s", i, source['key_path'])
+        return "\n".join(context_parts)
     
     def _calculate_confidence(self, sources: List[Dict[str, Any]]) -> float:
         """Calculate confidence score based on source relevance"""
@@ -63,31 +229,29 @@ class RAGPipeline:
         # Average distance (lower is better)
         distances = [source["distance"] for source in sources]
         avg_distance = sum(distances) / len(distances)
-        logger.info(f"Average distance: {avg_distance:.4f} (distances: {[f'{d:.4f}' for d in distances]})")
+        logger.debug("Average distance: %.4f (distances: %s)", avg_distance, distances)
         
         # Convert distance to confidence (0-1 scale)
-        confidence = max(0.0, min(1.0, 1.0 - avg_distance / 2.0))
-        logger.info(f"Calculated confidence: {confidence:.3f}")
-        return confidence
+        return max(0.0, min(1.0, 1.0 - avg_distance / 2.0))
     
-    async def _generate_with_context(self, query: str, context: str, sources: List[Dict[str, Any]]) -> str:
+    async def _generate_with_context(self, query: str, context: str, sources: List[Dict[str, Any]],
+                                     max_tokens: int = 1000, conversation: str = "") -> str:
         """Generate response using context and sources"""
-        logger.info("Generating response with context and sources...")
+        prompt = self._build_prompt(query, context, conversation)
         
-        prompt = f"""You are a helpful assistant that answers questions based on the provided knowledge base.
+        logger.debug("Prompt prepared, length: %d characters, preview: %r", len(prompt), prompt[:200])
+        return await self.bedrock_client.generate_response(prompt, max_tokens)
+    
+    def _build_prompt(self, query: str, context: str, conversation: str = "") -> str:
+        """Build the grounded prompt sent to the LLM, with the session's conversation if any"""
+        history = f"Conversation so far:\n{conversation}\n\n" if conversation else ""
+        return f"""You are a helpful assistant that answers questions based on the provided knowledge base.
 
 Knowledge Base Context:
 {context}
 
-User Question: {query}
+{history}User Question: {query}
 
 Please answer the question based on the knowledge base context above. If the information is not available in the context, say so clearly. Be concise and accurate.
 
-Answer:"""
-        
-        logger.info(f"Prompt prepared, length: {len(prompt)} characters")
-        logger.info(f"Prompt preview: {prompt[:200]}...")
-        
-        response = await self.bedrock_client.generate_response(prompt)
-        logger.info(f"Response received from Bedrock, length: {len(response)} characters")
-        return response 
\ No newline at end of file
+Answer:""" 
\ No newline at end of file
@@ -0,0 +1,363 @@
+import asyncio
+import contextvars
+import json
+import os
+import re
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+import logging
+import numpy as np
+from aws.bedrock_client import BedrockClient
+from metrics import CONVERSATION_TOKENS, Family, span
+from rag.context_packer import CHARS_PER_TOKEN, estimate_tokens
+from rag.response_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+class SessionNotFoundError(LookupError):
+    """No live session has that ID (never created, deleted or evicted)"""
+
+def _clip(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "..."
+
+def with_conversation(query: str, conversation: str) -> str:
+    """Prompt for answering query without retrieval, after the conversation so far"""
+    if not conversation:
+        return query
+    return f"Conversation so far:\n{conversation}\n\nUser Question: {query}"
+
+class ChatSession:
+    """One conversation: a rolling summary of older turns and the latest turns verbatim
+    
+    Turns are serialized by `lock`. The unit-length embeddings of recent
+    queries are kept by normalized text, and `context_embedding` is a
+    decaying blend of the queries so far, which follow-up questions are
+    searched with. `version` counts the stored states (see SessionStore);
+    the query embeddings are a per-process cache and are not stored.
+    """
+    
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.summary = ""
+        self.turns: List[Dict[str, str]] = []
+        self.turn_count = 0
+        self.summarized_turns = 0
+        self.created_at = time.time()
+        # Wall-clock time, comparable between processes sharing a session database
+        self.last_active = time.time()
+        self.version = 0
+        self.lock = asyncio.Lock()
+        self.query_embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.context_embedding: Optional[np.ndarray] = None
+        self.folding = False
+    
+    def has_history(self) -> bool:
+        return bool(self.turns or self.summary)
+    
+    def conversation(self) -> str:
+        """Summary and recent turns as prompt text (empty for a new session); its size is recorded"""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+        parts.extend(f"User: {turn['user']}\nAssistant: {turn['assistant']}" for turn in self.turns)
+        text = "\n\n".join(parts)
+        CONVERSATION_TOKENS.labels().observe(estimate_tokens(text))
+        return text
+    
+    def cached_embedding(self, query: str) -> Optional[np.ndarray]:
+        """Embedding of the same question asked earlier in this session, or None"""
+        key = normalize_query(query)
+        embedding = self.query_embeddings.get(key)
+        if embedding is not None:
+            self.query_embeddings.move_to_end(key)
+        return embedding
+    
+    def remember_embedding(self, query: str, embedding: np.ndarray, limit: int = 16):
+        self.query_embeddings[normalize_query(query)] = embedding
+        self.query_embeddings.move_to_end(normalize_query(query))
+        while len(self.query_embeddings) > limit:
+            self.query_embeddings.popitem(last=False)
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "created_at": self.created_at,
+            "turns": self.turn_count,
+            "summarized_turns": self.summarized_turns,
+            "summary": self.summary,
+            "recent_turns": list(self.turns),
+            "idle_seconds": time.time() - self.last_active
+        }
+
+class SessionStore:
+    """Chat sessions, bounded in number and evicted when idle
+    
+    A session keeps at most recent_turns exchanges verbatim (each side cut
+    to turn_max_chars). When a turn pushes it past that, the oldest turns
+    are folded into the summary in the background: with bedrock_client the
+    model rewrites the summary to include them, in at most summary_tokens
+    tokens; in mock mode, or if that call fails, a one-line digest per
+    turn is appended and the oldest lines dropped to stay in budget. The
+    conversation added to a prompt is therefore bounded however long the
+    session runs. Turns stay verbatim until their fold is done.
+    
+    Sessions idle for idle_seconds are dropped, and the least recently
+    used one beyond max_sessions.
+    
+    With db_path, sessions are stored in that SQLite database, so every
+    worker process sharing it serves every session; without it they live
+    in this process only. Each turn and summary fold is written through.
+    A session is re-read when a request brings it to a process that holds
+    an older state. Writes are conditional on the state they started from:
+    if another process stored a turn first, the change is applied again
+    to the newer state.
+    """
+    
+    def __init__(self, bedrock_client: Optional[BedrockClient] = None, max_sessions: int = 10000,
+                 idle_seconds: float = 1800.0, recent_turns: int = 4, summary_tokens: int = 300,
+                 turn_max_chars: int = 1200, db_path: Optional[str] = None):
+        self.bedrock_client = bedrock_client
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.recent_turns = max(0, recent_turns)
+        self.summary_tokens = summary_tokens
+        self.turn_max_chars = turn_max_chars
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._fold_tasks = set()
+        self.created = 0
+        self.evictions = 0
+        # Summary folds by how they were written: "model" or "digest"
+        self.folds = {"model": 0, "digest": 0}
+        
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+                             "last_active REAL NOT NULL, state TEXT NOT NULL, context BLOB)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active)")
+            self._db.commit()
+            logger.info(f"Chat sessions stored in {db_path}")
+    
+    def create(self) -> ChatSession:
+        self._evict()
+        if self._db is not None:
+            self._evict_stored()
+        session = ChatSession(uuid.uuid4().hex)
+        self._remember(session)
+        self.created += 1
+        if self._db is not None:
+            session.version = 1
+            self._db.execute("INSERT INTO sessions (id, version, last_active, state, context) VALUES (?, ?, ?, ?, ?)",
+                             (session.id, session.version, *self._row_state(session)))
+            self._db.commit()
+        logger.info(f"Created chat session {session.id}")
+        return session
+    
+    def get(self, session_id: str) -> ChatSession:
+        """Live session by ID, marked as active; SessionNotFoundError otherwise"""
+        self._evict()
+        session = self._sessions.get(session_id) if SESSION_ID_RE.match(session_id) else None
+        if self._db is not None and SESSION_ID_RE.match(session_id):
+            session = self._refresh(session_id, session)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        session.last_active = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+    
+    def _refresh(self, session_id: str, session: Optional[ChatSession]) -> Optional[ChatSession]:
+        """The stored state of a session, re-read if this process holds an older one"""
+        row = self._db.execute("SELECT version, last_active, state, context FROM sessions WHERE id = ?",
+                               (session_id,)).fetchone()
+        if row is None or row[1] < time.time() - self.idle_seconds:
+            # Deleted, or expired, by another process
+            self._sessions.pop(session_id, None)
+            return None
+        if session is None:
+            session = ChatSession(session_id)
+            self._remember(session)
+        if session.version != row[0]:
+            self._load(session, row)
+        return session
+    
+    def _load(self, session: ChatSession, row: Tuple):
+        version, last_active, state, context = row
+        state = json.loads(state)
+        session.version = version
+        session.last_active = last_active
+        session.summary = state["summary"]
+        session.turns = state["turns"]
+        session.turn_count = state["turn_count"]
+        session.summarized_turns = state["summarized_turns"]
+        session.created_at = state["created_at"]
+        session.context_embedding = np.frombuffer(context, dtype=np.float32) if context is not None else None
+    
+    def _row_state(self, session: ChatSession) -> Tuple:
+        """(last_active, state, context) columns of a session"""
+        state = json.dumps({
+            "summary": session.summary,
+            "turns": session.turns,
+            "turn_count": session.turn_count,
+            "summarized_turns": session.summarized_turns,
+            "created_at": session.created_at
+        })
+        context = session.context_embedding
+        return session.last_active, state, (context.astype(np.float32).tobytes() if context is not None else None)
+    
+    def _commit(self, session: ChatSession, change: Callable[[ChatSession], bool]) -> bool:
+        """Apply change(session) and store the result; False if it no longer applies
+        
+        If another process stored a newer state since this one was read, the
+        write is refused, that state is loaded and change applied to it again.
+        """
+        while True:
+            if not change(session):
+                return False
+            session.last_active = time.time()
+            if self._db is None:
+                return True
+            cursor = self._db.execute(
+                "UPDATE sessions SET version = ?, last_active = ?, state = ?, context = ? WHERE id = ? AND version = ?",
+                (session.version + 1, *self._row_state(session), session.id, session.version)
+            )
+            self._db.commit()
+            if cursor.rowcount:
+                session.version += 1
+                return True
+            row = self._db.execute("SELECT version, last_active, state, context FROM sessions WHERE id = ?",
+                                   (session.id,)).fetchone()
+            if row is None:
+                return False
+            logger.debug("Session %s was updated by another process, reapplying", session.id)
+            self._load(session, row)
+    
+    def delete(self, session_id: str) -> bool:
+        deleted = self._sessions.pop(session_id, None) is not None
+        if self._db is not None:
+            deleted = self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0 or deleted
+            self._db.commit()
+        return deleted
+    
+    def _remember(self, session: ChatSession):
+        self._sessions[session.id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            # With a database this only drops the process's copy
+            if self._db is None:
+                self.evictions += 1
+    
+    def _evict(self):
+        # Sessions are ordered by last activity, so the idle ones are at the front
+        deadline = time.time() - self.idle_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_active > deadline or session.lock.locked():
+                break
+            del self._sessions[session.id]
+            if self._db is None:
+                self.evictions += 1
+    
+    def _evict_stored(self):
+        """Delete stored sessions that are idle or beyond max_sessions (on create, not every request)"""
+        deadline = time.time() - self.idle_seconds
+        evicted = self._db.execute("DELETE FROM sessions WHERE last_active <= ?", (deadline,)).rowcount
+        evicted += self._db.execute("DELETE FROM sessions WHERE id IN "
+                                    "(SELECT id FROM sessions ORDER BY last_active DESC LIMIT -1 OFFSET ?)",
+                                    (self.max_sessions,)).rowcount
+        self._db.commit()
+        self.evictions += evicted
+    
+    def record_turn(self, session: ChatSession, user: str, assistant: str):
+        """Append a finished exchange and fold the oldest turns if the window is full"""
+        turn = {"user": _clip(user, self.turn_max_chars), "assistant": _clip(assistant, self.turn_max_chars)}
+        
+        def append(session: ChatSession) -> bool:
+            session.turns.append(turn)
+            session.turn_count += 1
+            return True
+        
+        self._commit(session, append)
+        if len(session.turns) > self.recent_turns and not session.folding:
+            session.folding = True
+            # Detached from the request's trace and log sampling
+            task = asyncio.get_running_loop().create_task(self.fold(session), context=contextvars.Context())
+            self._fold_tasks.add(task)
+            task.add_done_callback(self._fold_tasks.discard)
+    
+    async def fold(self, session: ChatSession):
+        """Roll the turns beyond the recent window into the session summary"""
+        try:
+            while len(session.turns) > self.recent_turns:
+                folded = session.turns[:len(session.turns) - self.recent_turns]
+                with span("session_summary"):
+                    summary, kind = await self._summarize(session.summary, folded)
+                
+                def apply(session: ChatSession) -> bool:
+                    # Another process may have folded these turns already
+                    if session.turns[:len(folded)] != folded:
+                        return False
+                    session.summary = summary
+                    del session.turns[:len(folded)]
+                    session.summarized_turns += len(folded)
+                    return True
+                
+                if not self._commit(session, apply):
+                    break
+                self.folds[kind] += 1
+        except Exception as e:
+            logger.error(f"Error summarizing session {session.id}: {str(e)}", exc_info=True)
+        finally:
+            session.folding = False
+    
+    async def _summarize(self, summary: str, turns: List[Dict[str, str]]) -> Tuple[str, str]:
+        if self.bedrock_client is not None and not self.bedrock_client.mock_mode:
+            exchanges = "\n".join(f"User: {turn['user']}\nAssistant: {turn['assistant']}" for turn in turns)
+            prompt = f"""Update the running summary of a conversation between a user and an assistant that answers from a knowledge base. Keep the names, numbers and topics the user may refer back to, and drop small talk. Reply with the updated summary only, in at most {self.summary_tokens * 3 // 4} words.
+
+Current summary:
+{summary or "(none)"}
+
+New exchanges:
+{exchanges}
+
+Updated summary:"""
+            response = await self.bedrock_client.generate_response(prompt, self.summary_tokens)
+            if not self.bedrock_client.is_error_response(response):
+                return _clip(response, self.summary_tokens * CHARS_PER_TOKEN), "model"
+            logger.warning("Session summary generation failed, appending turn digests instead")
+        return self._digest(summary, turns), "digest"
+    
+    def _digest(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        lines = summary.splitlines() if summary else []
+        for turn in turns:
+            answer = re.split(r"(?<=[.!?])\s", turn["assistant"], maxsplit=1)[0]
+            lines.append(f"- Asked: {_clip(turn['user'], 160)} Answered: {_clip(answer, 200)}")
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self._sessions),
+            "created": self.created,
+            "evictions": self.evictions,
+            "summary_folds": dict(self.folds)
+        }
+    
+    def collect_metrics(self) -> Iterator[Family]:
+        """Session counts and summary folds, read at scrape time"""
+        yield ("chatbot_sessions_active", "gauge", "Chat sessions held in memory", [({}, len(self._sessions))])
+        yield ("chatbot_sessions_created_total", "counter", "Chat sessions created", [({}, self.created)])
+        yield ("chatbot_session_evictions_total", "counter", "Chat sessions dropped as idle or over MAX_SESSIONS",
+               [({}, self.evictions)])
+        yield ("chatbot_session_summary_folds_total", "counter", "Rolls of older turns into a session summary, by writer",
+               [({"writer": kind}, count) for kind, count in self.folds.items()])
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+import logging
+
+from metrics import COALESCED_CALLS, span
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """Concurrent async calls with the same key share one in-flight computation
+    
+    The first call for a key starts compute() as a task; calls for that key
+    made before it finishes wait for the same task and get its result (or
+    its exception). Nothing is kept once it finishes, so this only merges
+    duplicates that overlap in time; the response cache covers the rest.
+    
+    The task runs in a copy of the first caller's context, so its spans land
+    in that caller's trace; the others record a "coalesced_wait" span. It is
+    shielded from cancellation, so one client disconnecting does not fail
+    the others.
+    """
+    
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._coalesced = COALESCED_CALLS.labels(kind)
+        self.calls = 0
+        self.coalesced = 0
+    
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._inflight[key] = asyncio.ensure_future(compute())
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            return await asyncio.shield(future)
+        
+        self.coalesced += 1
+        self._coalesced.inc()
+        logger.debug("Coalesced %s call with one in flight", self.kind)
+        with span("coalesced_wait"):
+            return await asyncio.shield(future)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
@@ -1,20 +1,66 @@
+import asyncio
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+import itertools
 import os
 import logging
+import threading
 from aws.embedding_client import AWSBedrockEmbeddings
+from aws.runtime import run_blocking
+from metrics import span
+from rag.index_store import save_index, load_index
+from rag.chunk_store import ChunkStore
+from rag.lexical_index import create_lexical_index
+from rag.path_index import PathIndex
+from rag.micro_batcher import MicroBatcher
+from rag.ann_index import FlatIndex, create_index
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 logger = logging.getLogger(__name__)
 
+# Rank offset of reciprocal rank fusion; damps the weight of the very first ranks
+RRF_K = 60
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row in place so dot products become cosine similarities"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def _normalize_vector(vector) -> np.ndarray:
+    """Return vector as a unit-length float32 array"""
+    vector = np.array(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
 class VectorStore:
-    def __init__(self, mock_mode: bool = False):
+    def __init__(self, mock_mode: bool = False, index: Optional[FlatIndex] = None, storage_dtype: Optional[str] = None,
+                 embedding_model: Optional[AWSBedrockEmbeddings] = None):
         self.mock_mode = mock_mode
-        self.documents = []
-        self.embeddings = []
+        # Search backend: exact by default, VECTOR_INDEX=ivf for approximate search
+        self.index = index or create_index()
         
-        if not mock_mode:
+        if embedding_model is not None:
+            # Shared with other stores (one client, executor and embedding cache per process)
+            self.embedding_model = embedding_model
+            self.mock_mode = embedding_model.mock_mode
+        elif not mock_mode:
             try:
                 self.embedding_model = AWSBedrockEmbeddings(mock_mode=False)
                 logger.info("✅ Using AWS Titan embeddings")
@@ -22,93 +68,466 @@ class VectorStore:
                 logger.warning(f"Warning: AWS embedding client not available, using mock mode: {e}")
                 self.mock_mode = True
         
-        if self.mock_mode:
+        if self.mock_mode and embedding_model is None:
             self.embedding_model = AWSBedrockEmbeddings(mock_mode=True)
             logger.info("✅ Using mock embeddings")
+        
+        # Columnar chunk storage with a pre-normalized (n, dim) embedding matrix;
+        # EMBEDDING_STORAGE_DTYPE=float16 halves the matrix at a small precision cost,
+        # but exact search then upcasts it block by block
+        self.dimension = self.embedding_model.get_embedding_dimension()
+        self.storage_dtype = storage_dtype or os.getenv('EMBEDDING_STORAGE_DTYPE', 'float32')
+        self.chunks = ChunkStore(self.dimension, self.storage_dtype)
+        # BM25 over key paths and values, fused with vector scores (HYBRID_SEARCH=false disables it).
+        # Queries whose terms it covers at least LEXICAL_FAST_PATH_COVERAGE skip the embedding call.
+        self.lexical = create_lexical_index()
+        self.lexical_fast_path_coverage = float(os.getenv('LEXICAL_FAST_PATH_COVERAGE', '1.0'))
+        # Trie over key paths: row lookups for incremental updates and parent-object expansion
+        self.paths = PathIndex()
+        # Serializes the lazy trie rebuild, which concurrent first queries would otherwise race
+        self._paths_lock = threading.Lock()
+        # Bumped on every change to the indexed content, so caches can tell they are stale
+        self.version = 0
+        # On-disk index version last saved or loaded, to notice versions published by other processes
+        self.index_version: Optional[str] = None
+        # Concurrent async queries arriving within QUERY_BATCH_WINDOW_MS are embedded
+        # (duplicates once) and scored together, up to QUERY_BATCH_MAX_SIZE; 0 disables it
+        window_ms = float(os.getenv('QUERY_BATCH_WINDOW_MS', '2'))
+        max_batch = int(os.getenv('QUERY_BATCH_MAX_SIZE', '32'))
+        self._embed_batcher = self._search_batcher = None
+        if window_ms > 0:
+            self._embed_batcher = MicroBatcher(self._embed_queries, window_ms, max_batch, name="embed")
+            self._search_batcher = MicroBatcher(self._search_requests, window_ms, max_batch, name="search")
     
-    def add_documents(self, chunks: List[Dict[str, Any]]):
-        """Add document chunks to vector store"""
+    def add_documents(self, chunks: List[Dict[str, Any]], progress_callback: Optional[Callable[[int, int], None]] = None):
+        """Add document chunks to vector store, replacing the current contents
+        
+        Chunks are embedded through the concurrent embed_batch path;
+        progress_callback(done, total) is forwarded to it.
+        """
         if not chunks:
             return
         
         logger.info(f"Adding {len(chunks)} documents to vector store...")
         
-        # Clear existing documents
-        self.documents = []
-        self.embeddings = []
-        
         # Process chunks
-        for i, chunk in enumerate(chunks):
-            text = f"{chunk['key_path']}: {chunk['content']}"
-            logger.info(f"Generating embedding for chunk {i+1}/{len(chunks)}: {chunk['key_path']}")
-            embedding = self.embedding_model.embed_text(text)
-            logger.info(f"Embedding generated for chunk {i+1}, dimensions: {len(embedding)}")
-            
-            self.documents.append({
-                "id": chunk["id"],
-                "text": text,
-                "key_path": chunk["key_path"],
-                "content": chunk["content"],
-                "type": chunk["metadata"]["type"]
-            })
-            self.embeddings.append(embedding)
+        texts = [self._chunk_text(chunk) for chunk in chunks]
+        embeddings = self.embedding_model.embed_batch(texts, progress_callback=progress_callback)
         
+        # Replace existing documents only once every embedding succeeded
+        store = ChunkStore(self.dimension, self.storage_dtype)
+        rows = store.append(chunks, _normalize_rows(embeddings))
+        lexical, paths = create_lexical_index(), PathIndex()
+        for row_index in (lexical, paths):
+            if row_index is not None:
+                row_index.update(rows, chunks)
+        self.chunks = store
+        self.lexical = lexical
+        self.paths = paths
+        self.index.invalidate()
+        self.version += 1
         logger.info(f"✅ Added {len(chunks)} documents to vector store")
     
+    def add_documents_stream(self, chunks: Iterable[Dict[str, Any]], batch_size: int = 1024,
+                             progress_callback: Optional[Callable[[int, Optional[int]], None]] = None) -> int:
+        """Replace the store contents with chunks pulled from an iterator
+        
+        Chunks are embedded batch_size at a time and appended to a new
+        chunk store, so only one batch of chunk dicts is alive at once. The
+        current contents keep serving searches until the new index is
+        complete. progress_callback(done, None) is called after each batch.
+        Returns the number of chunks indexed.
+        """
+        store = ChunkStore(self.dimension, self.storage_dtype)
+        lexical, paths = create_lexical_index(), PathIndex()
+        
+        for batch in _batched(chunks, batch_size):
+            embeddings = self.embedding_model.embed_batch([self._chunk_text(chunk) for chunk in batch])
+            rows = store.append(batch, _normalize_rows(embeddings))
+            for row_index in (lexical, paths):
+                if row_index is not None:
+                    row_index.update(rows, batch)
+            if progress_callback:
+                progress_callback(len(store), None)
+        
+        if not store:
+            return 0
+        
+        self.chunks = store
+        self.lexical = lexical
+        self.paths = paths
+        self.index.invalidate()
+        self.version += 1
+        logger.info(f"✅ Streamed {len(store)} documents into vector store")
+        return len(store)
+    
+    def update_documents(self, chunks: List[Dict[str, Any]], progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+        """Bring the store in line with a new chunk list without a full re-index
+        
+        Chunks are matched to stored documents by key_path. Only added or
+        changed leaves are embedded; removed leaves are deleted in place by
+        moving the last row into the freed slot. Returns per-kind counts.
+        """
+        paths = self._path_index()
+        incoming = {chunk["key_path"]: chunk for chunk in chunks}
+        
+        removed = [row for row in range(len(self.chunks)) if self.chunks.key_path(row) not in incoming]
+        changed = []
+        for key, chunk in incoming.items():
+            row = paths.lookup(key)
+            if row is None:
+                changed.append(chunk)
+                continue
+            if self.chunks.content(row) != chunk["content"] or self.chunks.type_name(row) != chunk["metadata"]["type"]:
+                changed.append(chunk)
+        
+        logger.info(f"Incremental update: {len(changed)} added/changed, {len(removed)} removed, "
+                    f"{len(incoming) - len(changed)} unchanged")
+        
+        # Embed before touching the store so a failure leaves it intact
+        embeddings = _normalize_rows(self.embedding_model.embed_batch(
+            [self._chunk_text(chunk) for chunk in changed], progress_callback=progress_callback
+        ))
+        
+        # Delete from the highest row down so a moved last row is never one still to delete
+        for row in sorted(removed, reverse=True):
+            self._remove_row(row)
+        
+        new_chunks, new_embeddings, rows, row_chunks = [], [], [], []
+        for chunk, embedding in zip(changed, embeddings):
+            row = paths.lookup(chunk["key_path"])
+            if row is None:
+                new_chunks.append(chunk)
+                new_embeddings.append(embedding)
+            else:
+                self.chunks.set(row, chunk, embedding)
+                rows.append(row)
+                row_chunks.append(chunk)
+        if new_chunks:
+            new_rows = self.chunks.append(new_chunks, np.array(new_embeddings))
+            rows.extend(new_rows.tolist())
+            row_chunks.extend(new_chunks)
+        
+        rows = np.array(rows, dtype=np.int64)
+        self.index.update(self.embeddings, rows)
+        for row_index in self._row_indexes():
+            row_index.update(rows, row_chunks)
+        if changed or removed:
+            self.version += 1
+        summary = {
+            "added": len(new_chunks),
+            "updated": len(changed) - len(new_chunks),
+            "removed": len(removed),
+            "unchanged": len(incoming) - len(changed),
+            "total": len(self.chunks)
+        }
+        logger.info(f"✅ Incremental update applied: {summary}")
+        return summary
+    
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Pre-normalized (n, dim) matrix; row i belongs to chunk row i"""
+        return self.chunks.embeddings
+    
+    @staticmethod
+    def _chunk_text(chunk: Dict[str, Any]) -> str:
+        return f"{chunk['key_path']}: {chunk['content']}"
+    
+    def prepare(self):
+        """Build every search structure now, so the first query does not pay for it"""
+        self.index.prepare(self.embeddings)
+        if self.lexical is not None:
+            self.lexical.prepare(self.chunks)
+        self._path_index()
+    
+    def _path_index(self) -> PathIndex:
+        """The key-path trie, rebuilt first if the store was loaded or cleared
+        
+        The rebuild fills a new trie and swaps it in when complete, so a
+        concurrent query never walks a half-built one.
+        """
+        if self.paths.stale:
+            with self._paths_lock:
+                if self.paths.stale:
+                    paths = PathIndex()
+                    paths.rebuild(self.chunks)
+                    self.paths = paths
+        return self.paths
+    
+    def _row_indexes(self) -> list:
+        """Indexes kept row-aligned with the chunk store through update/move/truncate"""
+        return [row_index for row_index in (self.lexical, self.paths) if row_index is not None]
+    
+    def _remove_row(self, row: int):
+        last = len(self.chunks) - 1
+        if row != last:
+            self.chunks.move(last, row)
+            self.index.move(last, row)
+            for row_index in self._row_indexes():
+                row_index.move(last, row)
+        self.chunks.truncate(last)
+        self.index.truncate(last)
+        for row_index in self._row_indexes():
+            row_index.truncate(last)
+    
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Search for relevant documents using cosine similarity"""
-        if not self.documents:
-            logger.info("No documents in vector store, returning empty results")
+        if not self.chunks:
+            logger.debug("No documents in vector store, returning empty results")
             return []
         
-        logger.info(f"Searching for query: '{query[:50]}{'...' if len(query) > 50 else ''}' (top_k: {top_k})")
+        logger.debug("Searching for query: %r (top_k: %d)", query[:50], top_k)
+        
+        sources = self.lexical_lookup(query, top_k)
+        if sources is not None:
+            return sources
         
         # Get query embedding
-        logger.info("Generating query embedding...")
-        query_embedding = self.embedding_model.embed_text(query)
-        logger.info(f"Query embedding generated, dimensions: {len(query_embedding)}")
-        
-        # Calculate similarities
-        logger.info(f"Calculating similarities against {len(self.embeddings)} documents...")
-        similarities = []
-        for i, doc_embedding in enumerate(self.embeddings):
-            similarity = cosine_similarity([query_embedding], [doc_embedding])[0][0]
-            similarities.append(similarity)
-            logger.info(f"Document {i+1} similarity: {similarity:.4f}")
-        
-        # Get top k results
-        top_indices = np.argsort(similarities)[::-1][:top_k]
-        logger.info(f"Top {len(top_indices)} results selected")
+        logger.debug("Generating query embedding...")
+        query_embedding = self.embed_query(query)
+        with span("vector_search"):
+            return self.search_by_vector(query_embedding, top_k, query=query)
+    
+    async def asearch(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Non-blocking search for async callers
+        
+        The query embedding goes through the shared Bedrock executor and the
+        similarity scan runs there too, so the event loop never waits on either.
+        """
+        if not self.chunks:
+            logger.debug("No documents in vector store, returning empty results")
+            return []
+        
+        logger.debug("Searching for query: %r (top_k: %d)", query[:50], top_k)
+        sources = await self.alexical_lookup(query, top_k)
+        if sources is not None:
+            return sources
+        return await self.asearch_by_vector(await self.aembed_query(query), top_k, query=query)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Unit-length query embedding"""
+        with span("query_embedding"):
+            return _normalize_vector(self.embedding_model.embed_text(query))
+    
+    async def aembed_query(self, query: str) -> np.ndarray:
+        """Unit-length query embedding, computed without blocking the event loop"""
+        with span("query_embedding"):
+            if self._embed_batcher is not None:
+                return await self._embed_batcher.submit(query)
+            return _normalize_vector(await self.embedding_model.aembed_text(query))
+    
+    async def _embed_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """Embed one micro-batch of queries
+        
+        Titan takes one text per call, so the distinct texts are embedded
+        concurrently and repeated questions share a single call.
+        """
+        distinct = list(dict.fromkeys(queries))
+        embeddings = await asyncio.gather(*(self.embedding_model.aembed_text(query) for query in distinct))
+        by_query = {query: _normalize_vector(embedding) for query, embedding in zip(distinct, embeddings)}
+        return [by_query[query] for query in queries]
+    
+    async def asearch_by_vector(self, query_embedding: np.ndarray, top_k: int = 5, query: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Non-blocking search_by_vector; concurrent calls are scored as one batch"""
+        if not self.chunks:
+            return []
+        with span("vector_search"):
+            if self._search_batcher is not None:
+                return await self._search_batcher.submit((query_embedding, top_k, query))
+            return await run_blocking(self.search_by_vector, query_embedding, top_k, query)
+    
+    async def _search_requests(self, requests: List[Tuple[np.ndarray, int, Optional[str]]]) -> List[List[Dict[str, Any]]]:
+        return await run_blocking(self.search_batch, requests)
+    
+    def search_batch(self, requests: List[Tuple[np.ndarray, int, Optional[str]]]) -> List[List[Dict[str, Any]]]:
+        """search_by_vector for a batch of (query_embedding, top_k, query) requests
+        
+        All vector rankings come from one index.search_batch call, which the
+        exact index answers with a single matrix-matrix pass over the rows.
+        """
+        if not self.chunks:
+            return [[] for _ in requests]
+        hybrid = [query is not None and self.lexical is not None for _, _, query in requests]
+        depths = [max(4 * top_k, 20) if fuse else top_k for (_, top_k, _), fuse in zip(requests, hybrid)]
+        query_embeddings = np.stack([query_embedding for query_embedding, _, _ in requests])
+        logger.debug("Searching %d documents with %s index for a batch of %d queries", len(self.chunks), self.index.name, len(requests))
+        with span("vector_search_batch"):
+            rankings = self.index.search_batch(self.embeddings, query_embeddings, max(depths))
+            
+            results = []
+            for (query_embedding, top_k, query), fuse, depth, (rows, similarities) in zip(requests, hybrid, depths, rankings):
+                if fuse:
+                    rows, similarities = self._fuse(query, query_embedding, rows[:depth], top_k)
+                results.append(self._make_sources(rows[:top_k], similarities[:top_k]))
+        return results
+    
+    def search_by_vector(self, query_embedding: np.ndarray, top_k: int = 5, query: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Search with an already normalized query embedding
+        
+        When the query text is given too, vector and lexical rankings are
+        combined (hybrid search).
+        """
+        if not self.chunks:
+            return []
+        
+        # Cosine similarity through the configured search index
+        logger.debug("Searching %d documents with %s index", len(self.chunks), self.index.name)
+        if query is not None and self.lexical is not None:
+            top_indices, similarities = self._hybrid_search(query, query_embedding, top_k)
+        else:
+            top_indices, similarities = self.index.search(self.embeddings, query_embedding, top_k)
+        return self._make_sources(top_indices, similarities)
+    
+    def _hybrid_search(self, query: str, query_embedding: np.ndarray, top_k: int):
+        """Reciprocal rank fusion of the vector and BM25 rankings
+        
+        Returns (rows, similarities) like an index search; similarities are
+        the true cosine similarities, also for rows only BM25 found.
+        """
+        vector_rows, _ = self.index.search(self.embeddings, query_embedding, max(4 * top_k, 20))
+        return self._fuse(query, query_embedding, vector_rows, top_k)
+    
+    def _fuse(self, query: str, query_embedding: np.ndarray, vector_rows: np.ndarray, top_k: int):
+        """RRF of a vector ranking with the BM25 ranking of the same depth"""
+        lexical_rows, _, _ = self.lexical.search(self.chunks, query, len(vector_rows))
+        fused: Dict[int, float] = {}
+        for ranking in (vector_rows, lexical_rows):
+            for rank, row in enumerate(ranking.tolist()):
+                fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+        rows = np.array(sorted(fused, key=fused.get, reverse=True)[:top_k], dtype=np.int64)
+        similarities = self.embeddings[rows].astype(np.float32) @ query_embedding
+        return rows, similarities
+    
+    def lexical_lookup(self, query: str, top_k: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Answer a lookup-style query from the BM25 index alone
+        
+        Returns sources when the best row, with its siblings, covers the
+        query terms well enough that the embedding call can be skipped,
+        otherwise None. Similarities are the term coverage scaled by the
+        BM25 score relative to the best row.
+        """
+        if self.lexical is None or not self.chunks:
+            return None
+        with span("lexical_lookup"):
+            rows, scores, coverage = self.lexical.search(self.chunks, query, top_k)
+        if len(rows) == 0 or coverage[0] < self.lexical_fast_path_coverage:
+            return None
+        logger.info("Lexical fast path: coverage %.2f, skipping query embedding", coverage[0])
+        return self._make_sources(rows, coverage * scores / scores[0])
+    
+    async def alexical_lookup(self, query: str, top_k: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Non-blocking lexical_lookup"""
+        if self.lexical is None or not self.chunks:
+            return None
+        return await run_blocking(self.lexical_lookup, query, top_k)
+    
+    def expand_sources(self, sources: List[Dict[str, Any]], max_leaves: int = 12) -> List[Dict[str, Any]]:
+        """Widen search hits to the objects that contain them, for LLM context
         
+        Each hit is replaced by every leaf of its parent object, in document
+        order, when that object has at most max_leaves leaves ("products.0.price"
+        brings along products.0.name, .description, ...); larger objects and
+        top-level keys stay as the hit alone. Hits are taken in rank order and
+        leaves already emitted are skipped. Costs one trie walk per hit and no
+        embedding calls. Entries carry key_path, content and type.
+        """
+        paths = self._path_index()
+        entries, seen = [], set()
+        for source in sources:
+            rows = paths.parent_subtree(source["key_path"], max_leaves) if max_leaves > 0 else []
+            if not rows:
+                if source["key_path"] not in seen:
+                    seen.add(source["key_path"])
+                    entries.append({"key_path": source["key_path"], "content": source["content"], "type": source["type"]})
+                continue
+            for row in rows:
+                key_path = self.chunks.key_path(row)
+                if key_path not in seen:
+                    seen.add(key_path)
+                    entries.append({"key_path": key_path, "content": self.chunks.content(row), "type": self.chunks.type_name(row)})
+        logger.debug("Expanded %d sources to %d context entries", len(sources), len(entries))
+        return entries
+    
+    async def aexpand_sources(self, sources: List[Dict[str, Any]], max_leaves: int = 12) -> List[Dict[str, Any]]:
+        """Non-blocking expand_sources (the first call after a load builds the trie)"""
+        return await run_blocking(self.expand_sources, sources, max_leaves)
+    
+    def _make_sources(self, top_indices: np.ndarray, similarities: np.ndarray) -> List[Dict[str, Any]]:
         sources = []
-        for i, idx in enumerate(top_indices):
-            doc = self.documents[idx]
-            similarity = similarities[idx]
-            logger.info(f"Result {i+1}: {doc['key_path']} (similarity: {similarity:.4f})")
+        for i, (idx, similarity) in enumerate(zip(top_indices, similarities)):
+            doc = self.chunks[int(idx)]
+            similarity = float(similarity)
+            logger.debug("Result %d: %s (similarity: %.4f)", i + 1, doc['key_path'], similarity)
             sources.append({
                 "key_path": doc["key_path"],
                 "content": doc["content"],
                 "type": doc["type"],
                 "distance": 1 - similarity  # Convert similarity to distance
             })
-        
-        logger.info(f"Search completed, returning {len(sources)} results")
         return sources
     
+    def save(self, path: str) -> str:
+        """Publish the chunk store columns as a new version of an index directory
+        
+        The store then serves from memory-mapped views of the published
+        files instead of the columns it was built in, like a freshly
+        loaded one. The rows are the same, so the search indexes built over
+        them stay valid.
+        """
+        version = save_index(path, self.chunks, self.embedding_model.model_id)
+        self.chunks, _ = load_index(path, version=version)
+        self.index_version = version
+        return version
+    
+    def load(self, path: str, mmap: bool = True):
+        """Replace the store contents with an index directory written by save()
+        
+        With mmap=True nothing is copied: the chunk store columns are
+        memory-mapped read-only and shared with other processes mapping them.
+        """
+        store, manifest = load_index(path, mmap=mmap)
+        if manifest["dimension"] != self.dimension:
+            raise ValueError(f"Index dimension {manifest['dimension']} does not match embedding dimension {self.dimension}")
+        if manifest["model_id"] != self.embedding_model.model_id:
+            logger.warning(f"Index was built with {manifest['model_id']}, store uses {self.embedding_model.model_id}")
+        self.chunks = store
+        self.index_version = manifest["version"]
+        self.index.invalidate()
+        for row_index in self._row_indexes():
+            row_index.invalidate()
+        self.version += 1
+    
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by the store: chunk columns plus compressed index codes"""
+        stats = self.chunks.get_stats()
+        return stats["embedding_bytes"] + stats["metadata_bytes"] + self.index.get_status().get("code_bytes", 0)
+    
     def get_status(self) -> Dict[str, Any]:
         """Get current status of vector store"""
         status = {
-            "loaded": len(self.documents) > 0,
-            "document_count": 1 if len(self.documents) > 0 else 0,
-            "chunks_count": len(self.documents),
+            "loaded": len(self.chunks) > 0,
+            "document_count": 1 if len(self.chunks) > 0 else 0,
+            "chunks_count": len(self.chunks),
             "embedding_type": "AWS Titan" if not self.mock_mode else "Mock",
-            "mock_mode": self.mock_mode
+            "mock_mode": self.mock_mode,
+            "embedding_cache": self.embedding_model.get_cache_stats(),
+            "storage": self.chunks.get_stats(),
+            "index": self.index.get_status(),
+            "lexical_index": self.lexical.get_status() if self.lexical is not None else None,
+            "path_index": self.paths.get_status(),
+            "query_batching": {
+                "embed": self._embed_batcher.get_stats(),
+                "search": self._search_batcher.get_stats()
+            } if self._search_batcher is not None else None
         }
-        logger.info(f"Vector store status: {status}")
+        logger.debug("Vector store status: %s", status)
         return status
     
     def clear(self):
         """Clear all documents from vector store"""
         logger.info("Clearing all documents from vector store")
-        self.documents = []
-        self.embeddings = [] 
\ No newline at end of file
+        self.chunks = ChunkStore(self.dimension, self.storage_dtype)
+        self.index.invalidate()
+        for row_index in self._row_indexes():
+            row_index.invalidate()
+        self.version += 1
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Bedrock calls saved by coalescing identical in-flight requests
+
+Sends bursts of identical /chat questions (the spike after a popular
+question) through the FastAPI app against the stub Bedrock endpoint, with
+CHAT_COALESCING off and on, and reports model calls, embedding calls and
+latency per burst. Then uploads the same document to two collections at
+once and reports the embedding calls of the pair against a single upload.
+The response and embedding caches are off, so only coalescing merges calls.
+
+    python benchmarks/bench_coalescing.py --burst 50 --llm-latency-ms 400
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from load_test_chat import SAMPLE_DATA, percentile, wait_for_job
+from stub_bedrock import start_stub_server
+
+QUESTIONS = (
+    "What is the price of CloudSync Pro?",
+    "Tell me about the company's products",
+    "Who is the CEO?",
+)
+
+
+async def burst(client, question, size):
+    latencies = []
+
+    async def one():
+        start = time.perf_counter()
+        response = await client.post("/collections/kb/chat", json={"message": question})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(size)))
+    return latencies
+
+
+async def upload(client, name):
+    with open(SAMPLE_DATA, "rb") as f:
+        response = await client.post(f"/collections/{name}/upload",
+                                     files={"file": ("sample_data.json", f, "application/json")})
+    response.raise_for_status()
+    await wait_for_job(client, response.json()["job_id"])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Calls saved by request coalescing")
+    parser.add_argument("--burst", type=int, default=50, help="identical requests per burst")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="stub median latency per embedding call")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0, help="stub median time to first token")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency_ms=args.latency_ms, llm_latency_ms=args.llm_latency_ms)
+    directory = tempfile.mkdtemp()
+    os.environ.update({
+        "BEDROCK_ENDPOINT_URL": url,
+        "INDEX_PATH": os.path.join(directory, "index"),
+        "COLLECTIONS_PATH": os.path.join(directory, "collections"),
+        "RESPONSE_CACHE_SIZE": "0",
+        "EMBEDDING_CACHE_SIZE": "0",
+        "HYBRID_SEARCH": "false",
+        "LOG_LEVEL": "WARNING",
+        "LOG_FILE": ""
+    })
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+
+    import httpx
+    import main as app_module
+    from logging_config import configure_logging
+    from metrics import TOKENS
+    configure_logging()
+    generations = TOKENS.labels(app_module.bedrock_client.model_id, "output")
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await upload(client, "kb")
+        embeddings = TOKENS.labels(app_module.collections.embedding_model.model_id, "input")
+
+        print(f"Bursts of {args.burst} identical /chat requests "
+              f"({args.llm_latency_ms:.0f} ms to first token, {args.latency_ms:.0f} ms/embedding)")
+        for coalescing in (False, True):
+            app_module.CHAT_COALESCING = coalescing
+            for question in QUESTIONS:
+                output_before, input_before = generations._value, embeddings._value
+                latencies = await burst(client, question, args.burst)
+                print(f"  coalescing {'on ' if coalescing else 'off'}  {question[:36]:<36}  "
+                      f"output tokens {generations._value - output_before:>6.0f}  "
+                      f"embedding tokens {embeddings._value - input_before:>5.0f}  "
+                      f"p50 {percentile(latencies, 0.5) * 1000:6.0f} ms  p95 {percentile(latencies, 0.95) * 1000:6.0f} ms")
+
+        input_before = embeddings._value
+        await upload(client, "single")
+        single = embeddings._value - input_before
+        input_before = embeddings._value
+        await asyncio.gather(upload(client, "twin-a"), upload(client, "twin-b"))
+        print(f"Embedding tokens for one upload {single:.0f}, for two identical uploads at once "
+              f"{embeddings._value - input_before:.0f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
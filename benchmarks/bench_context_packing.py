@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Prompt tokens, max_tokens and latency per query, before and after context packing
+
+Indexes a synthetic product catalog with long, partly duplicated values
+(each product's marketing summary nearly repeats its description) and
+runs lookup, describe and list questions through RAGPipeline.process_query
+for several top_k values, in two configurations:
+
+- before: every expanded entry as "i. key_path: content", max_tokens 1000
+- after: grouped, deduplicated context within CONTEXT_TOKEN_BUDGET and
+  max_tokens sized to the question
+
+Prompt tokens are the input tokens Bedrock reports. The stub counts one
+per four characters; with --live they come from the real model, and so
+does the latency. With the stub, latency covers retrieval, packing and
+the injected call latency only.
+
+    python benchmarks/bench_context_packing.py --products 200 --top-k 5,10,20
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from load_test_chat import percentile
+from stub_bedrock import start_stub_server
+
+WORDS = ("secure fast reliable cloud native analytics dashboard storage sync team realtime encrypted scalable "
+         "workflow automation reporting integration mobile desktop enterprise backup compliance audit").split()
+
+
+def synthetic_catalog(products, seed=0):
+    rng = random.Random(seed)
+    catalog = []
+    for i in range(products):
+        description = " ".join(rng.choice(WORDS) for _ in range(60))
+        catalog.append({
+            "name": f"Product {i}",
+            "category": rng.choice(["Storage", "Analytics", "Security", "Communication"]),
+            "price": round(rng.uniform(10, 1000), 2),
+            "description": f"Product {i} is a {description}.",
+            "marketing_summary": f"Product {i} is a {description}!",
+            "features": [" ".join(rng.choice(WORDS) for _ in range(4)) for _ in range(5)],
+            "warranty": f"{rng.randint(1, 5)} years"
+        })
+    return {"products": catalog}
+
+
+def questions(products, count, seed=1):
+    rng = random.Random(seed)
+    templates = ["What is the price of Product {}?", "Describe Product {}", "List the features of Product {}",
+                 "How long is the warranty on Product {}?"]
+    return [rng.choice(templates).format(rng.randrange(products)) for _ in range(count)]
+
+
+async def run(pipeline, queries, requested):
+    from metrics import TOKENS
+
+    input_tokens = TOKENS.labels(pipeline.bedrock_client.model_id, "input")
+    prompt_tokens, latencies = [], []
+    for query in queries:
+        before = input_tokens._value
+        start = time.perf_counter()
+        await pipeline.process_query(query)
+        latencies.append(time.perf_counter() - start)
+        prompt_tokens.append(input_tokens._value - before)
+    return prompt_tokens, latencies, requested[-len(queries):]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Context packing benchmark")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--top-k", default="5,10,20")
+    parser.add_argument("--budget", type=int, default=1500, help="CONTEXT_TOKEN_BUDGET of the packed configuration")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="stub latency per completion call")
+    parser.add_argument("--live", action="store_true", help="use real Bedrock instead of the stub")
+    args = parser.parse_args()
+
+    server = None
+    if not args.live:
+        server, url = start_stub_server(llm_latency_ms=args.llm_latency_ms)
+        os.environ["BEDROCK_ENDPOINT_URL"] = url
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+    os.environ.update({"EMBEDDING_CACHE_SIZE": "0", "QUERY_BATCH_WINDOW_MS": "0", "LOG_LEVEL": "WARNING"})
+
+    from logging_config import configure_logging
+    from aws.bedrock_client import BedrockClient
+    from rag.document_processor import DocumentProcessor
+    from rag.retrieval import RAGPipeline
+    from rag.vector_store import VectorStore
+
+    configure_logging(log_file="")
+    store = VectorStore()
+    store.add_documents(DocumentProcessor().process_json(synthetic_catalog(args.products)))
+    store.prepare()
+    queries = questions(args.products, args.queries)
+    print(f"{len(store.chunks)} chunks, {len(queries)} queries" + ("" if args.live else " (stub Bedrock)"))
+
+    bedrock_client = BedrockClient()
+    requested = []
+    generate = bedrock_client.generate_response
+
+    async def recording_generate(prompt, max_tokens=1000):
+        requested.append(max_tokens)
+        return await generate(prompt, max_tokens)
+
+    bedrock_client.generate_response = recording_generate
+
+    configs = [
+        ("before", {"CONTEXT_TOKEN_BUDGET": "0", "GENERATION_MIN_TOKENS": "1000", "GENERATION_MAX_TOKENS": "1000"}),
+        ("after", {"CONTEXT_TOKEN_BUDGET": str(args.budget), "GENERATION_MIN_TOKENS": "256", "GENERATION_MAX_TOKENS": "1000"}),
+    ]
+    for top_k in [int(k) for k in args.top_k.split(",")]:
+        for name, env in configs:
+            os.environ.update(env, RETRIEVAL_TOP_K=str(top_k))
+            pipeline = RAGPipeline(store, bedrock_client, cache_size=0)
+            prompt_tokens, latencies, max_tokens = asyncio.run(run(pipeline, queries, requested))
+            n = len(queries)
+            print(f"  top_k {top_k:>2} {name:>6}: prompt {sum(prompt_tokens) / n:7.1f} tokens (max {max(prompt_tokens):5.0f})  "
+                  f"max_tokens {sum(max_tokens) / n:6.1f}  "
+                  f"latency p50 {percentile(latencies, 0.5) * 1000:6.1f} ms  p95 {percentile(latencies, 0.95) * 1000:6.1f} ms")
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Embedding ingestion throughput against a local stub Bedrock endpoint
+
+Compares the old one-call-at-a-time loop with AWSBedrockEmbeddings.embed_batch
+at several worker counts and reports chunks/sec.
+
+    python benchmarks/bench_embedding_ingest.py --chunks 2000 --latency-ms 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stub_bedrock import start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding ingestion throughput benchmark")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="injected latency per Bedrock call")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="fraction of calls answered with ThrottlingException")
+    parser.add_argument("--workers", default="1,4,8,16,32")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency_ms=args.latency_ms, throttle_rate=args.throttle_rate)
+    os.environ["BEDROCK_ENDPOINT_URL"] = url
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+
+    from aws.embedding_client import AWSBedrockEmbeddings
+
+    texts = [f"products.{i}.features.{i % 7}: Feature number {i} of the catalogue" for i in range(args.chunks)]
+    print(f"Stub endpoint {url}: {args.latency_ms:.0f} ms/call, {args.throttle_rate:.0%} throttled, {args.chunks} chunks")
+
+    # Baseline: the previous serial embed_text loop (no retries, so no throttling here)
+    server.throttle_rate = 0.0
+    client = AWSBedrockEmbeddings(max_workers=1)
+    sample = texts[:max(1, min(len(texts), 200))]
+    start = time.perf_counter()
+    for text in sample:
+        client.embed_text(text)
+    elapsed = time.perf_counter() - start
+    print(f"{'serial embed_text':>22}: {len(sample) / elapsed:8.1f} chunks/sec")
+    server.throttle_rate = args.throttle_rate
+
+    for workers in [int(w) for w in args.workers.split(",")]:
+        client = AWSBedrockEmbeddings(max_workers=workers)
+        start = time.perf_counter()
+        matrix = client.embed_batch(texts)
+        elapsed = time.perf_counter() - start
+        assert matrix.shape == (len(texts), client.get_embedding_dimension())
+        print(f"{f'embed_batch x{workers}':>22}: {len(texts) / elapsed:8.1f} chunks/sec")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Vector vs hybrid (BM25 + vector) retrieval on sample_data.json
+
+Runs a labelled set of lookup questions through three retrieval modes and
+reports hit@1 / hit@5 (the expected key path among the first results),
+mean latency per query and how often the lexical fast path skipped the
+embedding call:
+
+- vector: cosine similarity only
+- hybrid: reciprocal rank fusion of vector and BM25 rankings
+- hybrid + fast path: lexical-only answer when BM25 covers every term
+
+By default embeddings come from the local stub endpoint with an injected
+latency; its vectors are hash-seeded, so vector-mode hit quality is only
+meaningful with --live (real Bedrock, credentials from backend/.env).
+
+    python benchmarks/bench_hybrid.py --latency-ms 40
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stub_bedrock import start_stub_server
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sample_data.json')
+
+# (question, key path prefix of a correct answer)
+QUESTIONS = [
+    ("price of CloudSync Pro", "products.0.price"),
+    ("What is the DataViz Analytics price?", "products.1.price"),
+    ("SecureChat price", "products.2.price"),
+    ("Who is the CEO?", "team.ceo.name"),
+    ("CTO background", "team.cto.background"),
+    ("How many employees?", "company_info.employee_count"),
+    ("Where is the headquarters?", "company_info.headquarters"),
+    ("revenue in 2022", "financials.2022.revenue"),
+    ("profit margin 2023", "financials.2023.profit_margin"),
+    ("What is the return policy?", "policies.return_policy"),
+    ("warranty", "policies.warranty"),
+    ("support hours", "policies.support_hours"),
+    ("customer satisfaction rate", "customers.satisfaction_rate"),
+    ("When did the Microsoft partnership start?", "partnerships.0.start_date"),
+    ("Salesforce partnership description", "partnerships.1.description"),
+    ("Which backend technologies do you use?", "technology_stack.backend"),
+    ("CloudSync Pro launch date", "products.0.launch_date"),
+    ("Does SecureChat have end-to-end encryption?", "products.2.features.0"),
+    ("What cloud tools are in the technology stack?", "technology_stack.cloud"),
+    ("When was the company founded?", "company_info.founded"),
+    ("What does the company do to keep customers happy?", "customers.satisfaction_rate"),
+    ("Is there anything about machine learning?", "technology_stack.ai_ml"),
+]
+
+
+def evaluate(name, retrieve, k):
+    hits_1 = hits_k = 0
+    latencies = []
+    for question, expected in QUESTIONS:
+        start = time.perf_counter()
+        sources = retrieve(question, k)
+        latencies.append(time.perf_counter() - start)
+        paths = [source["key_path"] for source in sources]
+        hits_1 += bool(paths) and paths[0].startswith(expected)
+        hits_k += any(path.startswith(expected) for path in paths)
+    n = len(QUESTIONS)
+    print(f"{name:>20}: hit@1 {hits_1 / n:.2f}  hit@{k} {hits_k / n:.2f}  "
+          f"mean {sum(latencies) / n * 1000:6.1f} ms/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hybrid retrieval quality/latency benchmark")
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="injected latency per stub embedding call")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="use real Bedrock instead of the stub")
+    args = parser.parse_args()
+
+    server = None
+    if not args.live:
+        server, url = start_stub_server(latency_ms=args.latency_ms)
+        os.environ["BEDROCK_ENDPOINT_URL"] = url
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+    os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+
+    from rag.document_processor import DocumentProcessor
+    from rag.vector_store import VectorStore
+
+    store = VectorStore()
+    with open(SAMPLE_DATA) as sample_file:
+        store.add_documents(DocumentProcessor().process_json(json.load(sample_file)))
+    print(f"{len(store.chunks)} chunks, {len(QUESTIONS)} questions"
+          + ("" if args.live else f", stub embeddings at {args.latency_ms:.0f} ms/call"))
+
+    def vector(question, k):
+        return store.search_by_vector(store.embed_query(question), k)
+
+    def hybrid(question, k):
+        return store.search_by_vector(store.embed_query(question), k, query=question)
+
+    fast_path = [0]
+
+    def hybrid_fast_path(question, k):
+        sources = store.lexical_lookup(question, k)
+        if sources is not None:
+            fast_path[0] += 1
+            return sources
+        return hybrid(question, k)
+
+    evaluate("vector", vector, args.k)
+    evaluate("hybrid", hybrid, args.k)
+    evaluate("hybrid + fast path", hybrid_fast_path, args.k)
+    print(f"{'fast path taken':>20}: {fast_path[0]}/{len(QUESTIONS)} questions")
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Per-query CPU time of the RAG pipeline under each logging configuration
+
+Runs the same queries through RAGPipeline.process_query (mock embeddings
+and generation, response cache off) over a synthetic store, once per
+logging configuration, and reports process CPU time and wall time per
+query plus the log lines written. CPU time is process-wide, so it
+includes the background thread of production mode; its queue is drained
+before the clock stops. Console output goes to /dev/null.
+
+- baseline/INFO: the logging before the production mode, re-created
+  around each query: development handlers plus every per-item and
+  step line the pipeline used to write at INFO, formatted eagerly
+- development/DEBUG: every per-item line, written synchronously
+- development/INFO: the default configuration
+- production/INFO: queue handler plus request sampling (LOG_SAMPLE_RATE)
+
+    python benchmarks/bench_logging.py --rows 20000 --queries 200
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_ann import synthetic_embeddings
+
+CONFIGS = [("baseline", "INFO"), ("development", "DEBUG"), ("development", "INFO"), ("production", "INFO")]
+
+
+def build_pipeline(rows, dim):
+    from aws.bedrock_client import BedrockClient
+    from rag.chunk_store import ChunkStore
+    from rag.retrieval import RAGPipeline
+    from rag.vector_store import VectorStore
+
+    store = VectorStore(mock_mode=True)
+    centers = np.random.default_rng(0).standard_normal((max(1, rows // 25), dim), dtype=np.float32)
+    store.chunks = ChunkStore(dim)
+    store.chunks.append([{"key_path": f"products.{i}.description", "content": f"Product {i} description",
+                          "metadata": {"type": "str"}} for i in range(rows)],
+                        synthetic_embeddings(centers, rows, 1.0, seed=1))
+    store.prepare()
+    return RAGPipeline(store, BedrockClient(mock_mode=True), cache_size=0)
+
+
+def log_previous_lines(pipeline, query, response, sources, confidence):
+    """The INFO lines a query wrote before they were sampled or moved to DEBUG
+
+    Messages and f-string formatting follow the previous main.py,
+    retrieval.py and vector_store.py; the pipeline still writes its
+    remaining INFO lines itself.
+    """
+    main_log = logging.getLogger("main")
+    retrieval_log = logging.getLogger("rag.retrieval")
+    store_log = logging.getLogger("rag.vector_store")
+    store = pipeline.vector_store
+    main_log.info(f"Chat request received: '{query[:50]}{'...' if len(query) > 50 else ''}' (RAG: True, collection 'default')")
+    main_log.info("Processing query with RAG pipeline...")
+    retrieval_log.info("Retrieving relevant documents from vector store...")
+    store_log.info(f"Searching for query: '{query[:50]}{'...' if len(query) > 50 else ''}' (top_k: {len(sources)})")
+    store_log.info("Generating query embedding...")
+    store_log.info(f"Searching {len(store.chunks)} documents with {store.index.name} index...")
+    store_log.info(f"Top {len(sources)} results selected")
+    for i, source in enumerate(sources):
+        store_log.info(f"Result {i+1}: {source['key_path']} (similarity: {1.0 - source['distance']:.4f})")
+    store_log.info(f"Search completed, returning {len(sources)} results")
+    retrieval_log.info("Building context from retrieved sources...")
+    retrieval_log.info(f"Building context from {len(sources)} sources...")
+    for i, source in enumerate(sources):
+        retrieval_log.info(f"Added source {i}: {source['key_path']}")
+    retrieval_log.info(f"Context built successfully, {len(sources)} parts")
+    context = "\n".join(f"{source['key_path']}: {source['content']}" for source in sources)
+    retrieval_log.info(f"Context built with {len(sources)} sources, length: {len(context)} characters")
+    retrieval_log.info("Calculating confidence score...")
+    distances = [source["distance"] for source in sources]
+    retrieval_log.info(f"Average distance: {sum(distances) / len(distances):.4f} (distances: {[f'{d:.4f}' for d in distances]})")
+    retrieval_log.info(f"Calculated confidence: {confidence:.3f}")
+    retrieval_log.info(f"Confidence calculated: {confidence:.3f}")
+    retrieval_log.info("Generating response with context...")
+    retrieval_log.info("Generating response with context and sources...")
+    prompt = f"Context:\n{context}\n\nQuestion: {query}"
+    retrieval_log.info(f"Prompt prepared, length: {len(prompt)} characters")
+    retrieval_log.info(f"Prompt preview: {prompt[:200]}...")
+    retrieval_log.info(f"Response received from Bedrock, length: {len(response)} characters")
+    main_log.info(f"RAG processing complete. Retrieved {len(sources)} sources, confidence: {confidence:.3f}")
+    for i, source in enumerate(sources):
+        main_log.info(f"Retrieved source {i+1}/{len(sources)}: {source['key_path']} - Content: {source['content'][:100]}{'...' if len(source['content']) > 100 else ''}")
+    main_log.info("Chat processing completed in 0.000 seconds")
+
+
+async def run_queries(pipeline, queries, baseline=False):
+    import metrics
+    from logging_config import sample_request
+
+    for query in queries:
+        # What the /chat handler does around the pipeline
+        sample_request()
+        with metrics.trace("chat") as trace:
+            response, sources, confidence = await pipeline.process_query(query)
+            if baseline:
+                log_previous_lines(pipeline, query, response, sources, confidence)
+        if baseline:
+            logging.getLogger("main").info(f"Request trace: {json.dumps(trace.to_dict())}")
+        else:
+            logging.getLogger("main").info("Request trace: %s", trace)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging overhead per query")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="LOG_SAMPLE_RATE of production mode")
+    args = parser.parse_args()
+
+    os.environ.update({"EMBEDDING_CACHE_SIZE": "0", "QUERY_BATCH_WINDOW_MS": "0"})
+    from logging_config import configure_logging, stop_logging
+
+    devnull = open(os.devnull, "w")
+    configure_logging(level="WARNING", log_file="", stream=devnull)
+    pipeline = build_pipeline(args.rows, args.dim)
+    # Every query is distinct and runs the vector path (no lexical fast path)
+    queries = [f"tell me something about item number {i} please" for i in range(args.queries)]
+    asyncio.run(run_queries(pipeline, queries[:5]))
+    print(f"{args.rows} rows, {args.queries} queries")
+
+    for mode, level in CONFIGS:
+        with tempfile.TemporaryDirectory() as directory:
+            log_file = os.path.join(directory, "chatbot.log")
+            configure_logging(mode="development" if mode == "baseline" else mode, level=level,
+                              sample_rate=args.sample_rate if mode == "production" else 1.0,
+                              log_file=log_file, stream=devnull)
+            cpu, wall = time.process_time(), time.perf_counter()
+            asyncio.run(run_queries(pipeline, queries, baseline=mode == "baseline"))
+            stop_logging()
+            cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+            with open(log_file) as log:
+                lines = sum(1 for _ in log)
+        print(f"  {mode:>11}/{level:<5}: {cpu / args.queries * 1000:7.3f} ms CPU/query  "
+              f"{wall / args.queries * 1000:7.3f} ms wall/query  {lines / args.queries:6.1f} log lines/query")
+    configure_logging(level="WARNING", log_file="", stream=devnull)
+
+
+if __name__ == "__main__":
+    main()
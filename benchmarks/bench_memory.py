@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Resident memory per indexed chunk, by storage layout
+
+Builds the same synthetic knowledge base in each layout the vector store
+has used and measures allocations with tracemalloc (numpy reports its
+buffers to it), then projects the footprint of one million chunks:
+
+- original: uuid chunk dicts, per-document dicts and embeddings as
+  Python lists of floats
+- dicts + matrix: per-document dicts next to a float32 numpy matrix
+- ChunkStore float32 / float16: the columnar store
+
+The metadata column is everything except the embedding rows, and the
+last column says whether a layout reaches --target times less memory
+than the original. The float32 ChunkStore (the default) lands at about
+8x; 10x and more needs EMBEDDING_STORAGE_DTYPE=float16.
+
+    python benchmarks/bench_memory.py --chunks 5000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+import uuid
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from rag.chunk_store import ChunkStore
+from rag.document_processor import DocumentProcessor
+
+DIMENSION = 1536
+
+
+def synthetic_chunks(count: int):
+    """Leaf chunks of a product catalogue shaped like sample_data.json"""
+    processor = DocumentProcessor()
+    fields = ["name", "price", "description", "features.0", "features.1", "specs.weight", "specs.color", "in_stock"]
+    chunks = []
+    for i in range(count):
+        field = fields[i % len(fields)]
+        value = {"price": i * 1.5, "in_stock": i % 3 == 0}.get(field.split(".")[0], f"Value of {field} for product {i // len(fields)}")
+        chunks.append(processor._make_chunk(f"catalogue.products.{i // len(fields)}.{field}", value))
+    return chunks
+
+
+def measure(build):
+    """Bytes still allocated after build() returns, and its result"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def build_original(chunks, embeddings):
+    # The layout before the numpy matrix: uuid chunk dicts kept alongside documents
+    kept = []
+    documents = []
+    for chunk, embedding in zip(chunks, embeddings):
+        chunk = dict(chunk, id=str(uuid.uuid4()), metadata=dict(chunk["metadata"]))
+        kept.append(chunk)
+        documents.append({
+            "id": chunk["id"],
+            "text": f"{chunk['key_path']}: {chunk['content']}",
+            "key_path": chunk["key_path"],
+            "content": chunk["content"],
+            "type": chunk["metadata"]["type"],
+            "embedding": embedding.tolist()
+        })
+    return kept, documents
+
+
+def build_dicts_and_matrix(chunks, embeddings):
+    documents = [{
+        "id": DocumentProcessor.chunk_id(chunk["key_path"]),
+        "text": f"{chunk['key_path']}: {chunk['content']}",
+        "key_path": chunk["key_path"],
+        "content": chunk["content"],
+        "type": chunk["metadata"]["type"]
+    } for chunk in chunks]
+    return documents, embeddings.copy()
+
+
+def build_chunk_store(chunks, embeddings, dtype):
+    store = ChunkStore(DIMENSION, dtype)
+    store.append(chunks, embeddings)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per chunk benchmark")
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--target", type=float, default=10.0, help="reduction vs the original layout to check for")
+    args = parser.parse_args()
+
+    # The chunk dicts and embeddings are inputs, not part of any layout's cost,
+    # except for the original layout, which kept its own copies of both
+    chunks = synthetic_chunks(args.chunks)
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.chunks, DIMENSION), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    # (name, build, bytes per embedding row, or None when embeddings are Python lists)
+    layouts = [
+        ("original (lists + dicts)", lambda: build_original(chunks, embeddings), None),
+        ("dicts + float32 matrix", lambda: build_dicts_and_matrix(chunks, embeddings), 4 * DIMENSION),
+        ("ChunkStore float32", lambda: build_chunk_store(chunks, embeddings, "float32"), 4 * DIMENSION),
+        ("ChunkStore float16", lambda: build_chunk_store(chunks, embeddings, "float16"), 2 * DIMENSION),
+    ]
+
+    print(f"{args.chunks} chunks, {DIMENSION}-dim embeddings")
+    print(f"{'layout':>26} {'bytes/chunk':>12} {'metadata':>9} {'GB per 1M':>10} {'vs original':>12} {f'>= {args.target:g}x':>8}")
+    baseline = None
+    for name, build, row_bytes in layouts:
+        size, result = measure(build)
+        per_chunk = size / args.chunks
+        baseline = baseline or per_chunk
+        metadata = f"{per_chunk - row_bytes:9.0f}" if row_bytes else f"{'-':>9}"
+        ratio = baseline / per_chunk
+        print(f"{name:>26} {per_chunk:12.0f} {metadata} {per_chunk * 1e6 / 1e9:10.2f} {ratio:11.1f}x {'yes' if ratio >= args.target else 'no':>8}")
+        del result
+
+
+if __name__ == "__main__":
+    main()
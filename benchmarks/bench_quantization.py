@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Quantized search (int8 / product quantization) vs full precision
+
+Uses the clustered synthetic corpus of bench_ann.py and reports, for each
+quantizer and shortlist size, recall@k against exact float32 search,
+queries/sec and the resident bytes per row of the codes.
+
+    python benchmarks/bench_quantization.py --rows 100000 --rerank 10,50,200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_ann import synthetic_embeddings, run
+from rag.ann_index import FlatIndex
+from rag.quantization import Int8Index, PQIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantization recall/memory/QPS benchmark")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--noise", type=float, default=1.0, help="per-dimension noise around each cluster center")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--subspaces", type=int, default=96, help="PQ subspaces (bytes per row)")
+    parser.add_argument("--rerank", default="10,50,200")
+    args = parser.parse_args()
+
+    centers = np.random.default_rng(0).standard_normal((args.clusters, args.dim), dtype=np.float32)
+    embeddings = synthetic_embeddings(centers, args.rows, args.noise, seed=1)
+    queries = synthetic_embeddings(centers, args.queries, args.noise, seed=2)
+    print(f"{args.rows} rows x {args.dim} dims, {args.queries} queries, recall@{args.k}")
+
+    exact, exact_qps = run(FlatIndex(), embeddings, queries, args.k)
+    print(f"{'float32 (exact)':>22}: recall 1.000  {exact_qps:8.1f} QPS  {4 * args.dim:6d} bytes/row")
+
+    for index in (Int8Index(min_rows=0), PQIndex(n_subspaces=args.subspaces, min_rows=0)):
+        start = time.perf_counter()
+        index.train(embeddings)
+        bytes_per_row = index.codes.nbytes // len(embeddings)
+        print(f"{f'{index.name} train':>22}: {time.perf_counter() - start:.1f}s")
+        for rerank in [int(r) for r in args.rerank.split(",")]:
+            approximate, qps = run(index, embeddings, queries, args.k, rerank=rerank)
+            recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approximate, exact)])
+            print(f"{f'{index.name} rerank={rerank}':>22}: recall {recall:.3f}  {qps:8.1f} QPS  {bytes_per_row:6d} bytes/row"
+                  f"  ({qps / exact_qps:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Query micro-batching: throughput and latency under concurrent load
+
+Part 1 scores a batch of queries against a synthetic matrix one at a time
+(matrix-vector products) and as one matrix-matrix pass, for several batch
+sizes.
+
+Part 2 runs concurrent async searches (query embedding through the local
+stub endpoint with an injected latency, then vector search) through
+VectorStore with each collection window, and reports queries/sec,
+p50/p99 latency and the mean batch size.
+
+    python benchmarks/bench_query_batching.py --rows 100000 --concurrency 32 --windows 0,1,2,5
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_ann import synthetic_embeddings
+from load_test_chat import percentile
+from stub_bedrock import start_stub_server
+
+
+def bench_scoring(embeddings, queries, k, batch_sizes):
+    from rag.ann_index import FlatIndex
+
+    index = FlatIndex()
+    for batch_size in batch_sizes:
+        batch = queries[:batch_size]
+        start = time.perf_counter()
+        for query in batch:
+            index.search(embeddings, query, k)
+        one_by_one = batch_size / (time.perf_counter() - start)
+        start = time.perf_counter()
+        index.search_batch(embeddings, batch, k)
+        batched = batch_size / (time.perf_counter() - start)
+        print(f"  batch {batch_size:>3}: {one_by_one:8.1f} queries/s one by one  {batched:8.1f} queries/s batched  "
+              f"({batched / one_by_one:.1f}x)")
+
+
+async def drive(store, concurrency, queries_per_user, k):
+    latencies = []
+
+    async def user(u):
+        for i in range(queries_per_user):
+            start = time.perf_counter()
+            embedding = await store.aembed_query(f"user {u} question {i}")
+            await store.asearch_by_vector(embedding, k)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query micro-batching benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--queries-per-user", type=int, default=10)
+    parser.add_argument("--windows", default="0,1,2,5", help="collection windows in ms (0 = unbatched)")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="stub latency per embedding call")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency_ms=args.latency_ms)
+    os.environ.update({
+        "BEDROCK_ENDPOINT_URL": url,
+        "EMBEDDING_CACHE_SIZE": "0",
+        "HYBRID_SEARCH": "false",
+        "QUERY_BATCH_MAX_SIZE": str(args.max_batch),
+    })
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+    logging.basicConfig(level=logging.WARNING)
+
+    from rag.chunk_store import ChunkStore
+    from rag.vector_store import VectorStore
+
+    centers = np.random.default_rng(0).standard_normal((max(1, args.rows // 25), args.dim), dtype=np.float32)
+    embeddings = synthetic_embeddings(centers, args.rows, 1.0, seed=1)
+    queries = synthetic_embeddings(centers, max(int(b) for b in args.batch_sizes.split(",")), 1.0, seed=2)
+    print(f"{args.rows} rows x {args.dim} dims, top {args.k}")
+
+    print("Scoring only:")
+    bench_scoring(embeddings, queries, args.k, [int(b) for b in args.batch_sizes.split(",")])
+
+    chunks = ChunkStore(args.dim)
+    chunks.append([{"key_path": f"items.{i}", "content": f"item {i}", "metadata": {"type": "str"}}
+                   for i in range(args.rows)], embeddings)
+    print(f"Concurrent searches ({args.concurrency} users x {args.queries_per_user}, "
+          f"stub embeddings at {args.latency_ms:.0f} ms/call):")
+    for window in [float(w) for w in args.windows.split(",")]:
+        os.environ["QUERY_BATCH_WINDOW_MS"] = str(window)
+        store = VectorStore()
+        store.chunks = chunks
+        latencies, elapsed = asyncio.run(drive(store, args.concurrency, args.queries_per_user, args.k))
+        batching = store.get_status()["query_batching"]
+        mean_batch = f"mean batch {batching['search']['mean_batch']:5.1f}" if batching else "unbatched"
+        print(f"  window {window:4.1f} ms: {len(latencies) / elapsed:7.1f} queries/s  "
+              f"p50 {percentile(latencies, 0.5) * 1000:6.1f} ms  p99 {percentile(latencies, 0.99) * 1000:6.1f} ms  {mean_batch}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
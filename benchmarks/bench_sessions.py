@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Prompt tokens per turn of a long conversation, with and without a session
+
+Runs the same conversation through /chat twice against the stub Bedrock
+endpoint: once in a session from POST /sessions, and once statelessly with
+the client resending the whole history in each message, as clients had
+to before sessions. For each turn it reports the input tokens of the
+answer's model call (the chatbot_bedrock_tokens_total counter of
+/metrics); the session's summary calls are counted separately.
+
+    python benchmarks/bench_sessions.py --turns 40 --answer-tokens 120
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from load_test_chat import SAMPLE_DATA, wait_for_job
+from stub_bedrock import start_stub_server
+
+QUESTIONS = (
+    "What is the price of CloudSync Pro?",
+    "What features does it have?",
+    "When was it launched?",
+    "How does it compare to DataVault?",
+    "Which of them is cheaper?",
+    "What is the warranty on that one?",
+    "Who is the CEO of the company?",
+    "How many employees does it have?",
+)
+
+
+async def run_conversation(client, input_tokens, turns, session):
+    """Input tokens of each turn's answer, and of the summary calls made meanwhile"""
+    session_id = (await client.post("/sessions")).json()["session_id"] if session else None
+    history, per_turn, summary_tokens = [], [], 0
+    for turn in range(turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        message = question
+        if not session and history:
+            message = "\n".join(history) + f"\nUser: {question}"
+        before = input_tokens()
+        response = await client.post("/chat", json={"message": message, "session_id": session_id})
+        response.raise_for_status()
+        per_turn.append(input_tokens() - before)
+        history.append(f"User: {question}\nAssistant: {response.json()['response']}")
+        # Let the background summary finish, so its call is not counted in the next turn
+        before = input_tokens()
+        await asyncio.sleep(0.05)
+        summary_tokens += input_tokens() - before
+    return per_turn, summary_tokens
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens per turn with and without a session")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--answer-tokens", type=int, default=120, help="stub answer length")
+    parser.add_argument("--recent-turns", type=int, default=4, help="SESSION_RECENT_TURNS")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency_ms=0, llm_latency_ms=0, answer_tokens=args.answer_tokens)
+    directory = tempfile.mkdtemp()
+    os.environ.update({
+        "BEDROCK_ENDPOINT_URL": url,
+        "INDEX_PATH": os.path.join(directory, "index"),
+        "COLLECTIONS_PATH": os.path.join(directory, "collections"),
+        "RESPONSE_CACHE_SIZE": "0",
+        "SESSION_RECENT_TURNS": str(args.recent_turns),
+        "LOG_LEVEL": "WARNING",
+        "LOG_FILE": ""
+    })
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+
+    import httpx
+    import main as app_module
+    from logging_config import configure_logging
+    from metrics import TOKENS
+    configure_logging()
+    counter = TOKENS.labels(app_module.bedrock_client.model_id, "input")
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        with open(SAMPLE_DATA, "rb") as f:
+            response = await client.post("/upload-knowledge-base", files={"file": ("sample_data.json", f, "application/json")})
+        response.raise_for_status()
+        await wait_for_job(client, response.json()["job_id"])
+
+        stateless, _ = await run_conversation(client, lambda: counter._value, args.turns, session=False)
+        in_session, summary_tokens = await run_conversation(client, lambda: counter._value, args.turns, session=True)
+
+    server.shutdown()
+    print(f"{'turn':>5} {'resent history':>15} {'session':>8}")
+    for turn in sorted({0, 1, 4, 9, 19, 39, args.turns - 1}):
+        if turn < args.turns:
+            print(f"{turn + 1:>5} {stateless[turn]:>15.0f} {in_session[turn]:>8.0f}")
+    print(f"{'total':>5} {sum(stateless):>15.0f} {sum(in_session):>8.0f}  (+{summary_tokens:.0f} in session summaries)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
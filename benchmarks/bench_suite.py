@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite over synthetic knowledge bases, in mock mode
+
+For each knowledge-base size (in leaves, see synthetic_kb.py) it measures:
+
+- process_json: DocumentProcessor.process_json on the in-memory document
+- iter_json_chunks: the streaming parser over the document written to disk
+- add_documents: VectorStore.add_documents with mock embeddings, then prepare()
+- search: VectorStore.search latency over sample questions
+- upload: /upload-knowledge-base until its indexing job succeeds
+- chat: /chat latency and throughput through the FastAPI app, per concurrency
+
+Mock embeddings and answers keep AWS out of the numbers, so they measure
+this code. Stages are skipped above --process-max-leaves (in-memory
+document and chunks) and --index-max-leaves (1536 floats per leaf); the
+streaming parser runs at every size, 10m included.
+
+Results are written as JSON along with the git commit and environment.
+Throughput stages keep the fastest of --repeat runs. --compare takes an
+earlier results file, prints the change in throughput and p50/p95 latency
+and exits with status 1 when one got worse by more than --tolerance, so
+two commits can be compared on the same machine:
+
+    python benchmarks/bench_suite.py --sizes 1k,10k,100k --output base.json
+    python benchmarks/bench_suite.py --sizes 1k,10k,100k --output new.json --compare base.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from load_test_chat import percentile, wait_for_job
+from synthetic_kb import generate_kb, sample_questions, write_kb
+
+SUFFIXES = {"k": 1000, "m": 1000000}
+# Metrics --compare checks; the others are recorded for reference
+COMPARED = ("per_second", "p50_ms", "p95_ms")
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1:] in SUFFIXES:
+        return int(float(text[:-1]) * SUFFIXES[text[-1]])
+    return int(text)
+
+
+def best_of(repeat, fn):
+    """(fewest seconds, result) over repeat calls of fn"""
+    best, result = None, None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def throughput(items, seconds):
+    return {"seconds": round(seconds, 4), "items": items, "per_second": round(items / seconds, 1) if seconds else None}
+
+
+def latency_stats(latencies, elapsed):
+    return {
+        "requests": len(latencies),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "per_second": round(len(latencies) / elapsed, 1)
+    }
+
+
+def bench_parsing(leaves, args, directory):
+    from rag.document_processor import DocumentProcessor
+
+    stages, chunks = {}, None
+    processor = DocumentProcessor()
+    if leaves <= args.process_max_leaves:
+        document = generate_kb(leaves, args.seed)
+        seconds, chunks = best_of(args.repeat, lambda: processor.process_json(document))
+        stages["process_json"] = throughput(len(chunks), seconds)
+        del document
+
+    path = os.path.join(directory, f"kb_{leaves}.json")
+    with open(path, "w") as f:
+        write_kb(f, leaves, args.seed)
+
+    def stream():
+        with open(path, "rb") as f:
+            return sum(1 for _ in processor.iter_json_chunks(f))
+
+    seconds, count = best_of(args.repeat, stream)
+    stages["iter_json_chunks"] = throughput(count, seconds)
+    stages["iter_json_chunks"]["file_mb"] = round(os.path.getsize(path) / 1e6, 2)
+    return stages, chunks, path
+
+
+def bench_store(chunks, questions, repeat):
+    from rag.vector_store import VectorStore
+
+    store = VectorStore(mock_mode=True)
+
+    def index():
+        store.add_documents(chunks)
+        store.prepare()
+
+    seconds, _ = best_of(repeat, index)
+    stages = {"add_documents": throughput(len(chunks), seconds)}
+    stages["add_documents"]["index_mb"] = round(store.memory_bytes() / 1e6, 1)
+
+    for question in questions[:5]:
+        store.search(question)
+    latencies = []
+    start = time.perf_counter()
+    for question in questions:
+        began = time.perf_counter()
+        store.search(question)
+        latencies.append(time.perf_counter() - began)
+    stages["search"] = latency_stats(latencies, time.perf_counter() - start)
+    return stages
+
+
+async def bench_app(path, questions, args):
+    import httpx
+    import main as app_module
+
+    stages = {}
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            response = await client.post("/upload-knowledge-base", files={"file": ("kb.json", f, "application/json")})
+        response.raise_for_status()
+        accepted = time.perf_counter() - start
+        job = await wait_for_job(client, response.json()["job_id"])
+        # The job's own run time, so the polling interval does not count
+        stages["upload"] = throughput(job["chunks_processed"], accepted + job["elapsed_seconds"])
+
+        for concurrency in args.concurrency:
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies, errors = [], 0
+
+            async def one(question):
+                nonlocal errors
+                async with semaphore:
+                    began = time.perf_counter()
+                    response = await client.post("/chat", json={"message": question})
+                    if response.status_code != 200:
+                        errors += 1
+                    latencies.append(time.perf_counter() - began)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(question) for question in questions))
+            stages[f"chat_c{concurrency}"] = latency_stats(latencies, time.perf_counter() - start)
+            stages[f"chat_c{concurrency}"]["errors"] = errors
+    return stages
+
+
+def git_commit():
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.stdout.strip(), bool(status.stdout.strip())
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of each metric against baseline; return the regressions"""
+    regressions = []
+    previous = {run["leaves_requested"]: run["stages"] for run in baseline["runs"]}
+    for run in results["runs"]:
+        for stage, metrics in run["stages"].items():
+            old = previous.get(run["leaves_requested"], {}).get(stage)
+            if not old:
+                continue
+            for name, value in metrics.items():
+                if name not in COMPARED or not value or not old.get(name):
+                    continue
+                change = value / old[name] - 1
+                worse = -change if name == "per_second" else change
+                flag = "  REGRESSION" if worse > tolerance else ""
+                print(f"  {run['leaves_requested']:>9} {stage:<18} {name:<10} {old[name]:>12} -> {value:>12} "
+                      f"({change:+.1%}){flag}")
+                if flag:
+                    regressions.append((run["leaves_requested"], stage, name))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite in mock mode")
+    parser.add_argument("--sizes", default="1k,10k,100k", help="knowledge-base sizes in leaves, e.g. 1k,100k,1m,10m")
+    parser.add_argument("--process-max-leaves", type=parse_size, default=parse_size("1m"),
+                        help="largest size built in memory for process_json")
+    parser.add_argument("--index-max-leaves", type=parse_size, default=parse_size("100k"),
+                        help="largest size indexed for add_documents, search, upload and chat")
+    parser.add_argument("--queries", type=int, default=200, help="search queries and chat requests per level")
+    parser.add_argument("--concurrency", default="1,8,32", help="/chat concurrency levels")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each throughput stage; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+
+    directory = tempfile.mkdtemp(prefix="bench_suite_")
+    os.environ.update({
+        "MOCK_MODE": "true",
+        "INDEX_PATH": os.path.join(directory, "index"),
+        "COLLECTIONS_PATH": os.path.join(directory, "collections"),
+        "EMBEDDING_CACHE_SIZE": "0",
+        "RESPONSE_CACHE_SIZE": "0",
+        "LOG_LEVEL": "WARNING",
+        "LOG_FILE": ""
+    })
+    from logging_config import configure_logging
+    configure_logging()
+
+    commit, dirty = git_commit()
+    results = {
+        "suite": "bench_suite",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "git_dirty": dirty,
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "runs": []
+    }
+
+    for leaves in sizes:
+        questions = sample_questions(leaves, args.queries, args.seed + 1)
+        stages, chunks, path = bench_parsing(leaves, args, directory)
+        if chunks is not None and leaves <= args.index_max_leaves:
+            stages.update(bench_store(chunks, questions, args.repeat))
+            del chunks
+            stages.update(asyncio.run(bench_app(path, questions, args)))
+        os.remove(path)
+        results["runs"].append({"leaves_requested": leaves, "stages": stages})
+
+        print(f"{leaves} leaves")
+        for stage, metrics in stages.items():
+            summary = "  ".join(f"{name} {value}" for name, value in metrics.items())
+            print(f"  {stage:<18} {summary}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare} (commit {baseline.get('git_commit')}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
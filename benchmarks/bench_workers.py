@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+/chat throughput versus uvicorn worker count over one shared index
+
+Publishes a synthetic index once (no embedding calls), then for each
+worker count starts `uvicorn main:app --workers N` against it and drives
+/chat at a fixed concurrency for a fixed time. Reports requests/sec,
+latency percentiles and, on Linux, the workers' resident memory split
+into private (anonymous) pages and file-backed pages. File-backed pages
+are mostly the memory-mapped index columns. One copy sits in the page
+cache, but the sum counts it once per worker that touched it.
+
+The stub Bedrock endpoint runs in its own process with zero latency by
+default, so the numbers reflect retrieval and serving cost per core.
+
+    python benchmarks/bench_workers.py --rows 50000 --workers 1,2,4 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.append(BACKEND)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_ann import synthetic_embeddings
+from load_test_chat import percentile
+from rag.chunk_store import ChunkStore
+from rag.index_store import save_index
+
+MODEL_ID = "amazon.titan-embed-text-v1"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_index(path, rows, dim):
+    centers = np.random.default_rng(0).standard_normal((max(1, rows // 25), dim), dtype=np.float32)
+    chunks = [{"key_path": f"items.{i}.description", "content": f"Item {i} description",
+               "metadata": {"type": "str"}} for i in range(rows)]
+    store = ChunkStore(dim)
+    store.append(chunks, synthetic_embeddings(centers, rows, 1.0, seed=1))
+    save_index(path, store, MODEL_ID)
+
+
+def worker_memory(parent_pid):
+    """(private MB, file-backed MB) summed over the children of parent_pid, or None off Linux"""
+    if not os.path.isdir("/proc"):
+        return None
+    private = shared = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status") as status_file:
+                fields = dict(line.split(":", 1) for line in status_file if ":" in line)
+        except OSError:
+            continue
+        if int(fields.get("PPid", "0")) != parent_pid and int(entry) != parent_pid:
+            continue
+        private += int(fields.get("RssAnon", "0 kB").split()[0])
+        shared += int(fields.get("RssFile", "0 kB").split()[0])
+    return private / 1024, shared / 1024
+
+
+async def wait_ready(client, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def drive(client, concurrency, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def user(u):
+        i = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.post("/chat", json={"message": f"user {u} question {i} about item descriptions"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            i += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+async def run_workers(workers, args, env):
+    import httpx
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+            await wait_ready(client)
+            # Every worker attaches to the index and builds its search structures
+            await drive(client, args.concurrency, args.warmup)
+            latencies, elapsed = await drive(client, args.concurrency, args.duration)
+        memory = worker_memory(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    line = (f"{workers:>2} worker(s): {len(latencies) / elapsed:7.1f} req/s  "
+            f"p50 {percentile(latencies, 0.5) * 1000:6.0f} ms  p95 {percentile(latencies, 0.95) * 1000:6.0f} ms")
+    if memory:
+        line += f"  RSS private {memory[0]:7.0f} MB  file-backed {memory[1]:6.0f} MB"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QPS vs uvicorn worker count")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub latency per Bedrock call")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    index_path = os.path.join(root, "index")
+    start = time.perf_counter()
+    build_index(index_path, args.rows, args.dim)
+    print(f"Published {args.rows} x {args.dim} index in {time.perf_counter() - start:.1f}s; "
+          f"{os.cpu_count()} CPU(s), concurrency {args.concurrency}")
+
+    stub_port = free_port()
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_bedrock.py"),
+         "--port", str(stub_port), "--latency-ms", str(args.latency_ms)],
+        stdout=subprocess.DEVNULL
+    )
+    env = dict(os.environ,
+               BEDROCK_ENDPOINT_URL=f"http://127.0.0.1:{stub_port}",
+               AWS_ACCESS_KEY_ID=os.environ.get("AWS_ACCESS_KEY_ID", "stub"),
+               AWS_SECRET_ACCESS_KEY=os.environ.get("AWS_SECRET_ACCESS_KEY", "stub"),
+               INDEX_PATH=index_path,
+               COLLECTIONS_PATH=os.path.join(root, "collections"),
+               EMBEDDING_CACHE_SIZE="0",
+               RESPONSE_CACHE_SIZE="0",
+               HYBRID_SEARCH="false")
+    try:
+        for workers in [int(w) for w in args.workers.split(",")]:
+            asyncio.run(run_workers(workers, args, env))
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
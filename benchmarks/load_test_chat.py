@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Concurrent /chat load test against a local stub Bedrock endpoint
+
+Drives the FastAPI app in-process at increasing concurrency and reports
+requests/sec, latency percentiles and the worst /health latency observed
+while the load runs (a stalled event loop shows up there first). With
+--stream it drives /chat/stream instead and also reports time to first
+token; the stub then streams answers at --output-tokens-per-s.
+
+    python benchmarks/load_test_chat.py --concurrency 1,8,32 --llm-latency-ms 300
+    python benchmarks/load_test_chat.py --stream --latency-dist lognormal --output-tokens-per-s 60
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stub_bedrock import start_stub_server
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sample_data.json')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def wait_for_job(client, job_id):
+    """Poll an indexing job until it finishes; raise if it failed"""
+    while True:
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["state"] == "succeeded":
+            return job
+        if job["state"] == "failed":
+            raise RuntimeError(f"Indexing job failed: {job['error']}")
+        await asyncio.sleep(0.1)
+
+
+async def run_level(client, concurrency: int, requests: int, stream: bool = False):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    first_tokens = []
+    health = []
+    stop = asyncio.Event()
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            message = {"message": f"Question {i} about the product prices"}
+            if not stream:
+                response = await client.post("/chat", json=message)
+                response.raise_for_status()
+            else:
+                # ASGITransport hands over the body only once the stream ends, so
+                # time to first token is the one the server reports in "done"
+                async with client.stream("POST", "/chat/stream", json=message) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if line.startswith('data: {"type": "done"'):
+                            first_token = json.loads(line[len("data: "):]).get("time_to_first_token")
+                            if first_token is not None:
+                                first_tokens.append(first_token)
+            latencies.append(time.perf_counter() - start)
+
+    async def probe_health():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await client.get("/health")
+            health.append(time.perf_counter() - start)
+            await asyncio.sleep(0.05)
+
+    prober = asyncio.create_task(probe_health())
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await prober
+
+    first_token = ""
+    if first_tokens:
+        first_token = (f"  first token p50 {percentile(first_tokens, 0.5) * 1000:6.0f} ms "
+                       f"p95 {percentile(first_tokens, 0.95) * 1000:6.0f} ms")
+    print(f"concurrency {concurrency:>3}: {requests / elapsed:7.1f} req/s  "
+          f"p50 {percentile(latencies, 0.5) * 1000:6.0f} ms  p95 {percentile(latencies, 0.95) * 1000:6.0f} ms{first_token}  "
+          f"worst /health {max(health) * 1000:6.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent /chat load test")
+    parser.add_argument("--concurrency", default="1,4,16,32")
+    parser.add_argument("--requests-per-level", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="stub median latency per embedding call")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="stub median time to first token")
+    parser.add_argument("--latency-dist", default="fixed", help="stub latency distribution: fixed, uniform, normal or lognormal")
+    parser.add_argument("--output-tokens-per-s", type=float, default=0.0, help="stub generation rate; 0 answers at once")
+    parser.add_argument("--answer-tokens", type=int, default=8, help="stub answer length")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="stub throttles calls beyond this many in flight")
+    parser.add_argument("--stream", action="store_true", help="drive /chat/stream instead of /chat")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency_ms=args.latency_ms, llm_latency_ms=args.llm_latency_ms,
+                                    latency_dist=args.latency_dist, output_tokens_per_s=args.output_tokens_per_s,
+                                    answer_tokens=args.answer_tokens, max_concurrency=args.max_concurrency)
+    os.environ.update({
+        "BEDROCK_ENDPOINT_URL": url,
+        "INDEX_PATH": os.path.join(tempfile.mkdtemp(), "index"),
+        # Every level asks the same questions; without these, later levels
+        # would be answered from the response cache or merged in flight
+        "EMBEDDING_CACHE_SIZE": "0",
+        "RESPONSE_CACHE_SIZE": "0",
+        "CHAT_COALESCING": "false",
+    })
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+
+    import logging
+    import httpx
+    import main as app_module
+    logging.getLogger().setLevel(logging.WARNING)
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        with open(SAMPLE_DATA, "rb") as f:
+            response = await client.post("/upload-knowledge-base", files={"file": ("sample_data.json", f, "application/json")})
+        response.raise_for_status()
+        await wait_for_job(client, response.json()["job_id"])
+        print(f"Stub endpoint {url}: {args.latency_ms:.0f} ms/embedding, {args.llm_latency_ms:.0f} ms to first token "
+              f"({args.latency_dist}), {args.answer_tokens} tokens at "
+              + (f"{args.output_tokens_per_s:.0f} tokens/s" if args.output_tokens_per_s else "once"))
+
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            await run_level(client, concurrency, max(args.requests_per_level, concurrency), args.stream)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the bedrock-runtime InvokeModel APIs
+
+Serves deterministic Titan-style embeddings and Claude-style completions,
+both plain (InvokeModel) and streamed (InvokeModelWithResponseStream, in
+the same binary event-stream framing Bedrock uses), so the real boto3
+client paths can be benchmarked without AWS:
+
+- latency: each call waits a sample from a fixed, uniform, normal or
+  lognormal distribution around the configured median
+- token rates: completions also wait input_tokens / input_tokens_per_s
+  before the first token (prefill) and stream output tokens at
+  output_tokens_per_s; 0 disables either
+- throttling: a random throttle_rate of calls, and every call beyond
+  max_concurrency in flight, get 429 ThrottlingException; error_rate of
+  calls get 503 ServiceUnavailableException
+
+Embeddings are seeded by a hash of the text, so the same text always gets
+the same unit vector (1536 floats, or Titan v2's "dimensions"). Answers
+are built from the prompt's words, one word per output token, up to
+answer_tokens and the request's max_tokens. Input tokens are counted as
+one per four characters.
+
+Point the clients at it with BEDROCK_ENDPOINT_URL=http://127.0.0.1:<port>.
+
+    python benchmarks/stub_bedrock.py --latency-ms 40 --latency-dist lognormal --output-tokens-per-s 80
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import numpy as np
+
+EMBEDDING_DIMENSION = 1536
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+CHUNK_HEADERS = {":event-type": "chunk", ":content-type": "application/json", ":message-type": "event"}
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9'-]*")
+
+
+class LatencyModel:
+    """Per-call latency in seconds around median_ms
+
+    spread is the half-width of uniform as a fraction of the median, the
+    standard deviation of normal as a fraction of the median, and the sigma
+    of lognormal (0.5 puts p99 at about 3.2x the median).
+    """
+
+    def __init__(self, median_ms: float, distribution: str = "fixed", spread: float = 0.5, rng: random.Random = None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {distribution!r}: use one of {LATENCY_DISTRIBUTIONS}")
+        self.median_s = median_ms / 1000.0
+        self.distribution = distribution
+        self.spread = spread
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        median = self.median_s
+        if median <= 0 or self.distribution == "fixed":
+            return max(0.0, median)
+        if self.distribution == "uniform":
+            return self.rng.uniform(median * (1 - self.spread), median * (1 + self.spread))
+        if self.distribution == "normal":
+            return max(0.0, self.rng.gauss(median, median * self.spread))
+        return median * math.exp(self.rng.gauss(0.0, self.spread))
+
+
+class StubBedrockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Buffer each response into one write (flushed after do_POST) and send
+    # stream events immediately: a header segment followed by a small body
+    # segment otherwise waits on the client's delayed ACK
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            # Clients that drop a response unread or stop reading a stream
+            pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        # Path is /model/<modelId>/invoke or /model/<modelId>/invoke-with-response-stream
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "model" or parts[2] not in ("invoke", "invoke-with-response-stream"):
+            self._send(404, {"message": f"Unknown operation {self.path}"}, error_type="UnknownOperationException")
+            return
+        model_id = unquote(parts[1])
+        stream = parts[2] == "invoke-with-response-stream"
+        server = self.server
+
+        with server.lock:
+            server.in_flight += 1
+            over_capacity = server.max_concurrency and server.in_flight > server.max_concurrency
+        try:
+            if over_capacity or server.rng.random() < server.throttle_rate:
+                self._send(429, {"message": "Too many requests, please wait before trying again."},
+                           error_type="ThrottlingException")
+                return
+            if server.rng.random() < server.error_rate:
+                self._send(503, {"message": "Service unavailable"}, error_type="ServiceUnavailableException")
+                return
+            if model_id.startswith("amazon.titan-embed"):
+                self._embed(model_id, body)
+            elif stream:
+                self._complete_stream(model_id, body)
+            else:
+                self._complete(model_id, body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _embed(self, model_id: str, body: dict):
+        time.sleep(self.server.latency.sample())
+        text = body.get("inputText", "")
+        dimension = int(body.get("dimensions", 1024 if "-v2" in model_id else EMBEDDING_DIMENSION))
+        self._send(200, {
+            "embedding": deterministic_embedding(text, dimension).tolist(),
+            "inputTextTokenCount": len(text.split())
+        })
+
+    def _complete(self, model_id: str, body: dict):
+        prompt, words, stop_reason = self._answer(body)
+        server = self.server
+        first_byte = server.llm_latency.sample() + _rate_delay(len(prompt) // 4, server.input_tokens_per_s)
+        time.sleep(first_byte + _rate_delay(len(words), server.output_tokens_per_s))
+        self._send(200, {
+            "id": f"msg_stub_{hashlib.md5(prompt.encode('utf-8')).hexdigest()[:16]}",
+            "type": "message",
+            "role": "assistant",
+            "model": model_id,
+            "content": [{"type": "text", "text": " ".join(words)}],
+            "stop_reason": stop_reason,
+            "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(words)}
+        })
+
+    def _complete_stream(self, model_id: str, body: dict):
+        prompt, words, stop_reason = self._answer(body)
+        server = self.server
+        start = time.perf_counter()
+        time.sleep(server.llm_latency.sample() + _rate_delay(len(prompt) // 4, server.input_tokens_per_s))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("x-amzn-bedrock-content-type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        input_tokens = len(prompt) // 4
+        self._write_chunk(encode_chunk_event({
+            "type": "message_start",
+            "message": {"id": f"msg_stub_{hashlib.md5(prompt.encode('utf-8')).hexdigest()[:16]}", "type": "message",
+                        "role": "assistant", "model": model_id, "content": [], "stop_reason": None,
+                        "usage": {"input_tokens": input_tokens, "output_tokens": 1}}
+        }) + encode_chunk_event({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}))
+        first_byte = time.perf_counter() - start
+
+        interval = _rate_delay(1, server.output_tokens_per_s)
+        for i, word in enumerate(words):
+            if interval:
+                time.sleep(interval)
+            self._write_chunk(encode_chunk_event({
+                "type": "content_block_delta", "index": 0,
+                "delta": {"type": "text_delta", "text": word if i == 0 else " " + word}
+            }))
+
+        self._write_chunk(
+            encode_chunk_event({"type": "content_block_stop", "index": 0})
+            + encode_chunk_event({"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                                  "usage": {"output_tokens": len(words)}})
+            + encode_chunk_event({"type": "message_stop", "amazon-bedrock-invocationMetrics": {
+                "inputTokenCount": input_tokens,
+                "outputTokenCount": len(words),
+                "invocationLatency": round((time.perf_counter() - start) * 1000),
+                "firstByteLatency": round(first_byte * 1000)
+            }})
+        )
+        self._write_chunk(b"")
+
+    def _answer(self, body: dict):
+        """(prompt, answer words, stop_reason) for a Claude messages request"""
+        content = (body.get("messages") or [{}])[-1].get("content", "")
+        if isinstance(content, list):
+            content = " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+        vocabulary = _WORD_RE.findall(content) or ["stub"]
+        rng = random.Random(hashlib.md5(content.encode("utf-8")).digest())
+        words = ["Stub", "answer:"] + [rng.choice(vocabulary) for _ in range(max(0, self.server.answer_tokens - 2))]
+        max_tokens = int(body.get("max_tokens", len(words)))
+        if len(words) > max_tokens:
+            return content, words[:max(1, max_tokens)], "max_tokens"
+        return content, words, "end_turn"
+
+    def _write_chunk(self, data: bytes):
+        # One HTTP chunk per write; an empty one ends the response
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _send(self, status: int, payload: dict, error_type: str = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if error_type:
+            self.send_header("x-amzn-ErrorType", error_type)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _rate_delay(tokens: int, tokens_per_s: float) -> float:
+    return tokens / tokens_per_s if tokens_per_s > 0 else 0.0
+
+
+def encode_event(headers: dict, payload: bytes) -> bytes:
+    """One message of the AWS event-stream framing, with string-valued headers
+
+    Layout: total length, headers length, prelude CRC32, headers, payload,
+    message CRC32 (all integers big-endian).
+    """
+    encoded_headers = b""
+    for name, value in headers.items():
+        name, value = name.encode("utf-8"), value.encode("utf-8")
+        encoded_headers += struct.pack(">B", len(name)) + name + struct.pack(">BH", 7, len(value)) + value
+    prelude = struct.pack(">II", 16 + len(encoded_headers) + len(payload), len(encoded_headers))
+    message = prelude + struct.pack(">I", zlib.crc32(prelude)) + encoded_headers + payload
+    return message + struct.pack(">I", zlib.crc32(message))
+
+
+def encode_chunk_event(event: dict) -> bytes:
+    """A response-stream "chunk" event carrying one Claude streaming event"""
+    data = base64.b64encode(json.dumps(event).encode("utf-8")).decode("ascii")
+    return encode_event(CHUNK_HEADERS, json.dumps({"bytes": data}).encode("utf-8"))
+
+
+def deterministic_embedding(text: str, dimension: int = EMBEDDING_DIMENSION) -> np.ndarray:
+    """Unit-length float32 vector seeded by the text hash"""
+    seed = int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, throttle_rate: float = 0.0,
+                      llm_latency_ms: float = None, latency_dist: str = "fixed", latency_spread: float = 0.5,
+                      input_tokens_per_s: float = 0.0, output_tokens_per_s: float = 0.0, answer_tokens: int = 8,
+                      max_concurrency: int = 0, error_rate: float = 0.0, seed: int = None):
+    """Start the stub in a daemon thread and return (server, endpoint_url)
+
+    latency_ms is the median latency of embedding calls, llm_latency_ms
+    (default: the same) the median time to first token of completions,
+    both drawn from latency_dist. throttle_rate and error_rate can be
+    changed on the returned server while it runs.
+    """
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer((host, port), StubBedrockHandler)
+    server.daemon_threads = True
+    server.rng = random.Random(seed)
+    server.latency = LatencyModel(latency_ms, latency_dist, latency_spread, server.rng)
+    server.llm_latency = LatencyModel(latency_ms if llm_latency_ms is None else llm_latency_ms,
+                                      latency_dist, latency_spread, server.rng)
+    server.input_tokens_per_s = input_tokens_per_s
+    server.output_tokens_per_s = output_tokens_per_s
+    server.answer_tokens = answer_tokens
+    server.throttle_rate = throttle_rate
+    server.error_rate = error_rate
+    server.max_concurrency = max_concurrency
+    server.in_flight = 0
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="median latency of embedding calls")
+    parser.add_argument("--llm-latency-ms", type=float, default=None, help="median time to first token (default: --latency-ms)")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="width of the latency distribution (see LatencyModel)")
+    parser.add_argument("--input-tokens-per-s", type=float, default=0.0, help="prefill rate; 0 adds no prompt-length delay")
+    parser.add_argument("--output-tokens-per-s", type=float, default=0.0, help="generation rate; 0 sends the answer at once")
+    parser.add_argument("--answer-tokens", type=int, default=8, help="answer length before max_tokens applies")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=0, help="throttle calls beyond this many in flight; 0 is unlimited")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls failing with 503")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.host, args.port, args.latency_ms, args.throttle_rate, args.llm_latency_ms,
+                                    args.latency_dist, args.latency_spread, args.input_tokens_per_s,
+                                    args.output_tokens_per_s, args.answer_tokens, args.max_concurrency,
+                                    args.error_rate, args.seed)
+    print(f"Stub Bedrock endpoint listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Synthetic nested JSON knowledge bases of a given size
+
+Builds a document shaped like sample_data.json (company info, products,
+customers, support articles) with nested objects and arrays, sized by
+its number of leaves, i.e. the chunks DocumentProcessor makes of it.
+Records are generated from a seeded RNG, so a size and seed always give
+the same document; the leaf count lands within one record of the target.
+
+generate_kb builds the document in memory; write_kb streams the same
+document to a file one record at a time, for sizes that do not fit in
+memory as Python objects.
+
+    python benchmarks/synthetic_kb.py --leaves 1000000 --output kb_1m.json
+"""
+
+import argparse
+import json
+import random
+
+ADJECTIVES = ("Cloud", "Data", "Secure", "Smart", "Rapid", "Quantum", "Hyper", "Open", "Edge", "Nova", "Stream", "Core")
+NOUNS = ("Sync", "Vault", "Chat", "Insight", "Flow", "Guard", "Hub", "Pilot", "Forge", "Lens", "Desk", "Mesh")
+CATEGORIES = ("Cloud Storage", "Business Intelligence", "Communication", "Security", "Developer Tools", "Networking")
+FEATURES = ("Real-time sync", "End-to-end encryption", "Custom reports", "Single sign-on", "Audit logging",
+            "Offline mode", "Role-based access", "Automated backups", "REST API", "Mobile apps", "Data export",
+            "Interactive dashboards")
+WORDS = ("secure fast reliable scalable automated encrypted realtime team enterprise analytics storage backup "
+         "compliance workflow integration dashboard mobile desktop network latency throughput policy").split()
+FIRST_NAMES = ("Sarah", "Michael", "Emily", "David", "Priya", "Kenji", "Amara", "Lucas", "Fatima", "Oliver")
+LAST_NAMES = ("Johnson", "Chen", "Rodriguez", "Okafor", "Novak", "Tanaka", "Silva", "Kumar", "Schmidt", "Haddad")
+PLANS = ("Starter", "Team", "Business", "Enterprise")
+REGIONS = ("North America", "Europe", "Asia Pacific", "Latin America", "Middle East", "Africa")
+
+COMPANY_INFO = {
+    "name": "Synthetic Systems Inc",
+    "founded": "2015",
+    "industry": "Technology",
+    "headquarters": "Austin, TX",
+    "employee_count": 1200,
+    "revenue": "$84M"
+}
+
+# Leaves per record of each section, and each section's share of the leaves
+LEAVES_PER_RECORD = {"products": 18, "customers": 8, "support_articles": 8}
+SECTION_SHARES = {"products": 0.5, "customers": 0.35, "support_articles": 0.15}
+
+
+def product_name(i: int) -> str:
+    return f"{ADJECTIVES[i % len(ADJECTIVES)]} {NOUNS[i // len(ADJECTIVES) % len(NOUNS)]} {i}"
+
+
+def customer_name(i: int) -> str:
+    return f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)]} {i}"
+
+
+def section_sizes(leaves: int) -> dict:
+    """Records per section for a document of about `leaves` leaves"""
+    remaining = max(0, leaves - len(COMPANY_INFO))
+    return {section: max(1, round(remaining * share / LEAVES_PER_RECORD[section]))
+            for section, share in SECTION_SHARES.items()}
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _product(rng: random.Random, i: int) -> dict:
+    price = round(rng.uniform(9, 2000), 2)
+    return {
+        "name": product_name(i),
+        "category": rng.choice(CATEGORIES),
+        "price": price,
+        "sku": f"SKU-{i:08d}",
+        "launch_date": f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "description": f"{product_name(i)} is a {_sentence(rng, 16).lower()}",
+        "features": rng.sample(FEATURES, 3),
+        "specs": {
+            "weight_kg": round(rng.uniform(0.1, 20), 2),
+            "warranty": f"{rng.randint(1, 5)} years",
+            "dimensions": {"width_cm": rng.randint(5, 120), "height_cm": rng.randint(5, 120), "depth_cm": rng.randint(5, 120)}
+        },
+        "pricing": [
+            {"tier": "monthly", "price": price},
+            {"tier": "annual", "price": round(price * 10, 2)}
+        ]
+    }
+
+
+def _customer(rng: random.Random, i: int) -> dict:
+    return {
+        "id": f"C{i:08d}",
+        "name": customer_name(i),
+        "plan": rng.choice(PLANS),
+        "region": rng.choice(REGIONS),
+        "since": str(rng.randint(2015, 2025)),
+        "satisfaction": round(rng.uniform(60, 100), 1),
+        "contact": {"email": f"customer{i}@example.com", "phone": f"+1-555-{i % 10000:04d}"}
+    }
+
+
+def _article(rng: random.Random, i: int, products: int) -> dict:
+    return {
+        "title": f"How to configure {rng.choice(FEATURES).lower()} ({i})",
+        "category": rng.choice(CATEGORIES),
+        "body": _sentence(rng, 40),
+        "tags": rng.sample(WORDS, 3),
+        "related_products": [product_name(rng.randrange(products)) for _ in range(2)]
+    }
+
+
+def iter_records(section: str, sizes: dict, seed: int = 0):
+    """The records of one section, in document order"""
+    rng = random.Random(f"{seed}:{section}")
+    for i in range(sizes[section]):
+        if section == "products":
+            yield _product(rng, i)
+        elif section == "customers":
+            yield _customer(rng, i)
+        else:
+            yield _article(rng, i, sizes["products"])
+
+
+def generate_kb(leaves: int, seed: int = 0) -> dict:
+    """Knowledge base of about `leaves` leaves, built in memory"""
+    sizes = section_sizes(leaves)
+    document = {"company_info": dict(COMPANY_INFO)}
+    for section in SECTION_SHARES:
+        document[section] = list(iter_records(section, sizes, seed))
+    return document
+
+
+def write_kb(file, leaves: int, seed: int = 0) -> int:
+    """Stream the document generate_kb(leaves, seed) would build to a text file; returns characters written"""
+    sizes = section_sizes(leaves)
+    written = file.write('{"company_info": ' + json.dumps(COMPANY_INFO))
+    for section in SECTION_SHARES:
+        written += file.write(f', "{section}": [')
+        for i, record in enumerate(iter_records(section, sizes, seed)):
+            written += file.write((", " if i else "") + json.dumps(record))
+        written += file.write("]")
+    return written + file.write("}")
+
+
+def sample_questions(leaves: int, count: int, seed: int = 1) -> list:
+    """Mixed lookup, listing and open questions about a document of `leaves` leaves"""
+    sizes = section_sizes(leaves)
+    rng = random.Random(seed)
+    templates = [
+        lambda: f"What is the price of {product_name(rng.randrange(sizes['products']))}?",
+        lambda: f"How long is the warranty on {product_name(rng.randrange(sizes['products']))}?",
+        lambda: f"List the features of {product_name(rng.randrange(sizes['products']))}",
+        lambda: f"Which plan is {customer_name(rng.randrange(sizes['customers']))} on?",
+        lambda: f"Which products offer {rng.choice(FEATURES).lower()}?",
+        lambda: f"Tell me about {rng.choice(CATEGORIES).lower()} products that are {rng.choice(WORDS)}",
+    ]
+    return [rng.choice(templates)() for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic JSON knowledge base")
+    parser.add_argument("--leaves", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    with open(args.output, "w") as f:
+        written = write_kb(f, args.leaves, args.seed)
+    print(f"Wrote {args.output}: about {args.leaves} leaves, {written / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
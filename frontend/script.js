@@ -4,6 +4,7 @@ const API_BASE_URL = 'http://localhost:8000';
 // Global state
 let isConnected = false;
 let knowledgeBaseLoaded = false;
+let sessionId = null;
 
 // DOM Elements
 const statusIndicator = document.getElementById('statusIndicator');
@@ -118,9 +119,15 @@ async function uploadFile(file) {
         });
         
         if (response.ok) {
-            const result = await response.json();
-            showKnowledgeBaseStatus(result);
-            addMessage('bot', 'Knowledge base uploaded successfully! You can now ask questions about the data.');
+            // Indexing runs as a background job; poll it until it finishes
+            const accepted = await response.json();
+            const job = await waitForJob(accepted.job_id);
+            if (job.state === 'succeeded') {
+                await checkKnowledgeBaseStatus();
+                addMessage('bot', 'Knowledge base uploaded successfully! You can now ask questions about the data.');
+            } else {
+                showError(`Upload failed: ${job.error}`);
+            }
         } else {
             const error = await response.json();
             showError(`Upload failed: ${error.detail}`);
@@ -133,6 +140,21 @@ async function uploadFile(file) {
     hideLoading();
 }
 
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+        const job = await response.json();
+        if (job.state === 'succeeded' || job.state === 'failed') {
+            return job;
+        }
+        const percent = job.progress !== null ? ` ${Math.round(job.progress * 100)}%` : '';
+        const eta = job.eta_seconds !== null ? `, about ${Math.ceil(job.eta_seconds)}s left` : '';
+        hideLoading();
+        showLoading(`Indexing knowledge base...${percent}${eta}`);
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 // Knowledge Base Status
 async function checkKnowledgeBaseStatus() {
     try {
@@ -179,20 +201,15 @@ async function sendMessage() {
     setInputEnabled(false);
     
     try {
-        const response = await fetch(`${API_BASE_URL}/chat`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                message: message,
-                use_rag: ragToggle.checked
-            })
-        });
+        let response = await postChatMessage(message);
+        if (response.status === 404) {
+            // The session expired on the server; continue in a new one
+            sessionId = null;
+            response = await postChatMessage(message);
+        }
         
         if (response.ok) {
-            const result = await response.json();
-            addBotMessage(result.response, result.sources, result.confidence, result.processing_time);
+            await renderChatStream(response);
         } else {
             const error = await response.json();
             addMessage('bot', `Error: ${error.detail}`);
@@ -205,6 +222,94 @@ async function sendMessage() {
     setInputEnabled(true);
 }
 
+// Send a message within this page's chat session, starting one if needed
+async function postChatMessage(message) {
+    if (!sessionId) {
+        const session = await fetch(`${API_BASE_URL}/sessions`, { method: 'POST' });
+        sessionId = (await session.json()).session_id;
+    }
+    return fetch(`${API_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            message: message,
+            use_rag: ragToggle.checked,
+            session_id: sessionId
+        })
+    });
+}
+
+// Render a server-sent event stream from /chat/stream into one bot message
+async function renderChatStream(response) {
+    const botMessage = createStreamingBotMessage();
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let sources = [];
+    let confidence = 0;
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line; keep any partial event for the next read
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        
+        for (const rawEvent of events) {
+            if (!rawEvent.startsWith('data: ')) continue;
+            const event = JSON.parse(rawEvent.slice(6));
+            
+            if (event.type === 'sources') {
+                sources = event.sources;
+                confidence = event.confidence;
+            } else if (event.type === 'token') {
+                botMessage.appendText(event.text);
+            } else if (event.type === 'done') {
+                botMessage.finish(sources, confidence, event.processing_time);
+            } else if (event.type === 'error') {
+                botMessage.appendText(`Error: ${event.detail}`);
+            }
+        }
+    }
+}
+
+function createStreamingBotMessage() {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message bot-message';
+    messageDiv.innerHTML = `
+        <div class="message-content">
+            <i class="fas fa-robot"></i>
+            <div class="text"><div class="loading"></div></div>
+        </div>
+    `;
+    chatMessages.appendChild(messageDiv);
+    scrollToBottom();
+    
+    const textDiv = messageDiv.querySelector('.text');
+    let text = '';
+    
+    return {
+        appendText(delta) {
+            text += delta;
+            textDiv.textContent = text;
+            scrollToBottom();
+        },
+        finish(sources, confidence, processingTime) {
+            if (!text) {
+                textDiv.textContent = '';
+            }
+            if (sources && sources.length > 0) {
+                textDiv.insertAdjacentHTML('beforeend', `<div class="response-details" onclick="showResponseDetails('${escapeHtml(JSON.stringify({sources, confidence, processing_time: processingTime}))}')">View details</div>`);
+            }
+            scrollToBottom();
+        }
+    };
+}
+
 function addMessage(type, text) {
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${type}-message`;